@@ -0,0 +1,169 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import expand_product_categories, load_product_alignment
+
+CATEGORY_CELLS = ['ULIP', 'Term', 'Endowment', 'Group', 'Annuity', 'Rider', 'non_par', 'PAR', 'ulip_pension', 'All', 'Health', 'Combi']
+STATUS_CELLS = ['Yes', 'No', '-', 'NA', 'All', '']
+
+
+# expand_product_categories as it was before the patterns and category lookup were precompiled, kept
+# as the timing baseline. Its nested status scan is lifted out unchanged so
+# tests/test_expand_product_categories.py can compare it with extract_product_impact_status
+def legacy_extract_impact_status(text, product_alignment):
+    impact_status = {}
+    lines = text.split('\n')
+    
+    # More specific indicators
+    positive_indicators = ['yes', 'y', 'true', '1', 'impacted', 'affected']
+    negative_indicators = ['no', 'n', 'false', '0', 'not impacted', 'not affected', 'na', 'n/a']
+    
+    for line in lines:
+        if '---' in line or '===' in line:
+            continue
+            
+        if '|' in line:
+            cells = [cell.strip() for cell in line.split('|')]
+            cells = [cell for cell in cells if cell]
+            
+            if len(cells) >= 2:
+                category_cell = cells[0].lower().strip()
+                
+                # CRITICAL: Skip "All" or "ALL" completely
+                if category_cell in ['all', 'all products', 'all categories']:
+                    continue
+                
+                # Check for exact matches with JSON keys
+                matched_category = None
+                for json_key in product_alignment.keys():
+                    if json_key.lower() == category_cell:
+                        matched_category = json_key
+                        break
+                    elif json_key.lower() in category_cell:
+                        matched_category = json_key
+                        break
+                    elif category_cell == 'endowment' and json_key == 'endowment_plans':
+                        matched_category = json_key
+                        break
+                
+                if matched_category:
+                    # Check status in subsequent cells
+                    category_status = False
+                    for status_cell in cells[1:]:
+                        status_lower = status_cell.lower().strip()
+                        if any(indicator in status_lower for indicator in positive_indicators):
+                            category_status = True
+                            break
+                        elif any(indicator in status_lower for indicator in negative_indicators):
+                            category_status = False
+                            break
+                    
+                    impact_status[matched_category] = category_status
+    
+    return impact_status
+
+
+def legacy_expand_product_categories(impacted_products_text, product_alignment):
+    if not product_alignment or not impacted_products_text:
+        return impacted_products_text
+    
+    # Extract impact status
+    impact_status = legacy_extract_impact_status(impacted_products_text, product_alignment)
+    
+    # Sanitize the "### 2.1 Impacted Products" section: keep only the first markdown table, drop any lists/headings that LLM may have added
+    try:
+        lower_text = impacted_products_text.lower()
+        start_tokens = ["### 2.1 impacted products", "## 2.1 impacted products"]
+        end_tokens = ["### 2.2", "## 2.2", "### 2.2 applications impacted", "## 2.2 applications impacted"]
+        start_idx = -1
+        for t in start_tokens:
+            si = lower_text.find(t)
+            if si != -1:
+                start_idx = si
+                break
+        if start_idx != -1:
+            end_idx = len(impacted_products_text)
+            for t in end_tokens:
+                ei = lower_text.find(t, start_idx + 1)
+                if ei != -1:
+                    end_idx = min(end_idx, ei)
+            section = impacted_products_text[start_idx:end_idx]
+            section_lines = section.split('\n')
+            kept = []
+            table_started = False
+            table_ended = False
+            for ln in section_lines:
+                if not table_started:
+                    kept.append(ln)
+                    if '|' in ln:
+                        table_started = True
+                else:
+                    if ('|' in ln) and not table_ended:
+                        kept.append(ln)
+                    else:
+                        # once a non-table line appears after table has started, stop keeping further lines
+                        table_ended = True
+                
+            sanitized_section = '\n'.join(kept)
+            impacted_products_text = impacted_products_text[:start_idx] + sanitized_section + impacted_products_text[end_idx:]
+    except Exception:
+        pass
+    
+    # Only expand categories with explicit "Yes" status
+    expanded_sections = []
+    for category, products in product_alignment.items():
+        if products and impact_status.get(category, False):  # Only if explicitly True
+            if impact_status[category] == "Yes" or impact_status[category] == "All":
+                product_list = '\n'.join([f"  - {product}" for product in products])
+                category_display = category.upper().replace('_', ' ')
+                category_section = f"\n\n**{category_display} Products (Impacted - Yes):**\n{product_list}"
+                expanded_sections.append(category_section)
+    
+    # Append expansions to sanitized text
+    if expanded_sections:
+        return impacted_products_text + ''.join(expanded_sections)
+    else:
+        return impacted_products_text
+
+
+def build_chain1_output(table_rows, filler_paragraphs, seed=7):
+    rng = random.Random(seed)
+    lines = ["## 1.0 Introduction", "", "### 1.1 Purpose"]
+    lines += [f"Requirement paragraph {i} describing the change in detail." for i in range(filler_paragraphs)]
+    lines += ["", "## 2.0 Impact Analysis", "", "### 2.1 Impacted Products", "",
+              "| Product Category | Impact Status |", "|------------------|---------------|"]
+    lines += [f"| {rng.choice(CATEGORY_CELLS)} | {rng.choice(STATUS_CELLS)} |" for _ in range(table_rows)]
+    lines += ["", "- Note the LLM added after the table", "", "### 2.2 Applications Impacted", "",
+              "| Application Name | High level Description |", "|---|---|", "| OPUS | Impacted |",
+              "", "### 2.3 List of APIs required", "", "| S. No | API Name | API Description |", "|---|---|---|"]
+    lines += [f"| {i} | GET /Endpoint{i} | Description {i} |" for i in range(table_rows // 4)]
+    return "\n".join(lines)
+
+
+def median_seconds(function, text, product_alignment, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text, product_alignment)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def bench(table_rows, filler_paragraphs, repeat=20):
+    product_alignment = load_product_alignment()
+    text = build_chain1_output(table_rows, filler_paragraphs)
+    baseline = median_seconds(legacy_expand_product_categories, text, product_alignment, repeat)
+    current = median_seconds(expand_product_categories, text, product_alignment, repeat)
+    return len(text), baseline, current
+
+
+if __name__ == "__main__":
+    print(f"{'table rows':>10} {'chars':>10} {'baseline ms':>12} {'current ms':>11} {'speedup':>8}")
+    for table_rows, filler_paragraphs in [(20, 50), (200, 500), (2000, 5000), (20000, 20000)]:
+        chars, baseline, current = bench(table_rows, filler_paragraphs)
+        print(f"{table_rows:>10} {chars:>10,} {baseline * 1000:>12.2f} {current * 1000:>11.2f} {baseline / current:>7.1f}x")
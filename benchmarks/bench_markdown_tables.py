@@ -0,0 +1,29 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import parse_markdown_table
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "llm_tables.md")
+
+
+def load_corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [block for block in f.read().split("\n\n") if block.strip()]
+
+
+def bench(corpus, repeat=2000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for table_text in corpus:
+            parse_markdown_table(table_text)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(corpus))
+
+
+if __name__ == "__main__":
+    # Parser correctness, including the fuzzed corpus, is covered by tests/test_markdown_tables.py
+    corpus = load_corpus()
+    print(f"parse_markdown_table: {bench(corpus) * 1e6:.1f} us per table ({len(corpus)} corpus tables)")
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+import pdfplumber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import estimate_token_count, extract_content_from_pdf
+
+# 20 requirement groups with a gridded table each, a running header and a page-number footer
+DEFAULT_PDF_PATHS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "spec_tables.pdf")]
+
+
+def extract_unprocessed(pdf_path):
+    # Page text plus every table, as extracted before any PDF post-processing
+    content = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                content.append(page_text)
+            for table in page.extract_tables():
+                if table:
+                    content.append("TABLE:")
+                    content.append("\n".join(" | ".join(str(cell) if cell else "" for cell in row) for row in table))
+    return "\n".join(content)
+
+
+def bench(pdf_path):
+    start = time.perf_counter()
+    baseline = extract_unprocessed(pdf_path)
+    baseline_seconds = time.perf_counter() - start
+
+    report = {}
+    start = time.perf_counter()
+    processed = extract_content_from_pdf(pdf_path, report)
+    processed_seconds = time.perf_counter() - start
+
+    return {
+        "baseline_chars": len(baseline),
+        "processed_chars": len(processed),
+        "baseline_tokens": estimate_token_count(baseline),
+        "processed_tokens": estimate_token_count(processed),
+        "baseline_seconds": baseline_seconds,
+        "processed_seconds": processed_seconds,
+        "report": {key: value for key, value in report.items() if key != "blocks"}
+    }
+
+
+if __name__ == "__main__":
+    for pdf_path in sys.argv[1:] or DEFAULT_PDF_PATHS:
+        result = bench(pdf_path)
+        reduction = 1 - result["processed_chars"] / max(result["baseline_chars"], 1)
+        print(f"{os.path.basename(pdf_path)}: {result['baseline_chars']:,} -> {result['processed_chars']:,} chars "
+              f"(~{result['baseline_tokens']:,} -> ~{result['processed_tokens']:,} tokens, {reduction:.1%} smaller), "
+              f"{result['baseline_seconds']:.2f}s -> {result['processed_seconds']:.2f}s")
+        print(f"  {result['report']}")
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from io import BytesIO
+
+from docx import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import SilentUI, collect_requirements, open_upload_file
+
+UPLOAD_MB = 50
+DEFAULT_UPLOAD_COUNT = 4
+
+
+def make_large_docx(path, index, size_mb=UPLOAD_MB):
+    # A short requirement document carrying a large embedded attachment, the usual shape of a 50 MB upload
+    doc = Document()
+    doc.add_heading(f"Change request {index}", level=1)
+    for line in range(20):
+        doc.add_paragraph(f"Requirement {index}.{line}: agents in region {index} must complete module {line} before selling.")
+    doc.save(path)
+    with zipfile.ZipFile(path, "a", compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr(f"word/embeddings/attachment{index}.bin", os.urandom(size_mb * 1024 * 1024))
+
+
+def load_copied(paths):
+    # How job inputs were loaded before: each file read into its own BytesIO
+    uploaded_files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            uploaded_file = BytesIO(f.read())
+        uploaded_file.name = os.path.basename(path)
+        uploaded_files.append(uploaded_file)
+    return uploaded_files
+
+
+def load_mapped(paths):
+    return [open_upload_file(path) for path in paths]
+
+
+def bench(paths, loader):
+    tracemalloc.start()
+    start = time.perf_counter()
+    uploaded_files = loader(paths)
+    requirements, _, _ = collect_requirements("", uploaded_files, SilentUI())
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    for uploaded_file in uploaded_files:
+        uploaded_file.close()
+    return {"peak_mb": peak / (1024 * 1024), "seconds": seconds, "requirements_chars": len(requirements)}
+
+
+if __name__ == "__main__":
+    upload_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_UPLOAD_COUNT
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = [os.path.join(temp_dir, f"change_request_{index}.docx") for index in range(upload_count)]
+        for index, path in enumerate(paths):
+            make_large_docx(path, index)
+
+        print(f"{upload_count} uploads x {UPLOAD_MB} MB")
+        for label, loader in [("copied (BytesIO)", load_copied), ("mapped (UploadBuffer)", load_mapped)]:
+            result = bench(paths, loader)
+            print(f"  {label}: peak {result['peak_mb']:,.1f} MB traced, {result['seconds']:.2f}s, "
+                  f"{result['requirements_chars']:,} requirement chars")
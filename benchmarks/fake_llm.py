@@ -0,0 +1,95 @@
+import hashlib
+import os
+import random
+import re
+import sys
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit_app
+
+SECTION_MAJOR_PATTERN = re.compile(r'creating sections? (\d+)\.0')
+FILLER_WORDS = (
+    "system shall validate premium payment status before issuing the policy document and notify the "
+    "customer through the configured channel while recording the audit trail for operations review"
+).split()
+
+
+def fake_section_group(prompt, output_tokens):
+    # Deterministic markdown for the section group the prompt asks for: headings, prose and one
+    # table per major section, sized to roughly output_tokens
+    match = SECTION_MAJOR_PATTERN.search(prompt)
+    first_major = match.group(1) if match else "1"
+    majors = next(
+        (majors for majors in streamlit_app.SECTION_GROUP_MAJORS.values() if majors[0] == first_major),
+        [first_major]
+    )
+    rng = random.Random(hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+    target_chars = output_tokens * 4 // len(majors)
+
+    sections = []
+    for major in majors:
+        lines = [f"## {major}.0 Benchmark Section {major}", ""]
+        subsection = 0
+        while sum(len(line) + 1 for line in lines) < target_chars:
+            subsection += 1
+            lines.append(f"### {major}.{subsection} Requirement Area {subsection}")
+            lines.append(" ".join(rng.choice(FILLER_WORDS) for _ in range(60)).capitalize() + ".")
+            lines.append("")
+            lines.append("| ID | Requirement | Owner | Priority |")
+            lines.append("| --- | --- | --- | --- |")
+            for row in range(6):
+                lines.append(
+                    f"| {major}.{subsection}.{row + 1} | "
+                    f"{' '.join(rng.choice(FILLER_WORDS) for _ in range(10))} | Operations | {rng.choice(['High', 'Medium', 'Low'])} |"
+                )
+            lines.append("")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+class FakeChatModel(BaseChatModel):
+    # Local stand-in for the provider models: fixed first-token latency plus output_tokens streamed at
+    # tokens_per_second (0 means instant), with usage metadata like the OpenAI client reports
+    latency_seconds: float = 0.0
+    tokens_per_second: float = 0.0
+    output_tokens: int = 1500
+
+    @property
+    def _llm_type(self):
+        return "benchmark-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        content = fake_section_group(prompt, self.output_tokens)
+        completion_tokens = streamlit_app.estimate_token_count(content)
+
+        delay = self.latency_seconds
+        if self.tokens_per_second:
+            delay += completion_tokens / self.tokens_per_second
+        if delay:
+            time.sleep(delay)
+
+        prompt_tokens = streamlit_app.estimate_token_count(prompt)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def install_fake_llm(latency_seconds=0.0, tokens_per_second=0.0, output_tokens=1500):
+    # initialize_sequential_chains builds every tier (and routed secondary) through build_chat_model
+    def build_fake_chat_model(api_provider, api_key, azure_endpoint=None, azure_deployment=None, api_version=None, model_name=None):
+        return FakeChatModel(latency_seconds=latency_seconds, tokens_per_second=tokens_per_second, output_tokens=output_tokens)
+
+    streamlit_app.build_chat_model = build_fake_chat_model
@@ -0,0 +1,156 @@
+import struct
+import zlib
+from io import BytesIO
+
+from docx import Document
+from extract_msg.ole_writer import OleWriter
+from openpyxl import Workbook
+
+# Scale factor per fixture size; every builder grows linearly with it
+FIXTURE_SIZES = {"small": 1, "medium": 10, "large": 50}
+
+REQUIREMENT_SENTENCE = (
+    "The system shall validate the premium payment for product {product} and notify the customer "
+    "by email and SMS within {minutes} minutes of the transaction being confirmed."
+)
+PRODUCTS = ["ULIP", "TERM", "PAR", "Annuity", "Group"]
+
+
+def requirement_line(index):
+    return f"REQ-{index:05d}: " + REQUIREMENT_SENTENCE.format(product=PRODUCTS[index % len(PRODUCTS)], minutes=5 + index % 55)
+
+
+def named_buffer(data, name):
+    buffer = BytesIO(data)
+    buffer.name = name
+    return buffer
+
+
+def build_docx(scale):
+    doc = Document()
+    doc.add_heading("Change Request Specification", level=1)
+    for block in range(scale * 4):
+        doc.add_heading(f"Requirement group {block + 1}", level=2)
+        for line in range(10):
+            doc.add_paragraph(requirement_line(block * 10 + line))
+        if block % 2 == 0:
+            table = doc.add_table(rows=6, cols=4)
+            for row_idx, row in enumerate(table.rows):
+                for col_idx, cell in enumerate(row.cells):
+                    cell.text = ["Req ID", "Description", "Product", "Priority"][col_idx] if row_idx == 0 else f"R{block}-{row_idx}-{col_idx}"
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(scale, lines_per_page=40):
+    # Hand-written PDF (Helvetica text, one ruled table, running header and page-number footer per
+    # page) so no PDF authoring library is needed
+    page_count = scale * 2
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(page_count):
+        commands = ["BT /F1 8 Tf 40 815 Td (ACME Life - Internal - Requirement Specification) Tj ET"]
+        commands.append("BT /F1 9 Tf 40 790 Td 11 TL")
+        for line in range(lines_per_page):
+            commands.append(f"({escape_pdf_text(requirement_line(page * lines_per_page + line)[:110])}) Tj T*")
+        commands.append("ET")
+        for row in range(5):
+            for col in range(4):
+                x, y = 40 + col * 125, 300 - row * 18
+                commands.append(f"{x} {y} 125 18 re S")
+                label = ["Req ID", "Description", "Product", "Priority"][col] if row == 0 else f"T{page}-{row}-{col}"
+                commands.append(f"BT /F1 8 Tf {x + 4} {y + 6} Td ({label}) Tj ET")
+        commands.append(f"BT /F1 8 Tf 280 20 Td (Page {page + 1} of {page_count}) Tj ET")
+        stream = zlib.compress("\n".join(commands).encode("latin-1"))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % page_id for page_id in page_ids), page_count)
+
+    output = BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+    xref_offset = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+def build_xlsx(scale):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Requirement"
+    sheet.append(["Sr", "Detailed Requirement", "Response", "Notes"])
+    sheet.append([1, "PART B : (Mandatory) Detailed Requirement", None, None])
+    for row in range(scale * 100):
+        sheet.append([row + 2, requirement_line(row), "Yes" if row % 3 else "No", f"Note {row}"])
+    sheet.append([None, "PART C : (Mandatory) Detailed Requirement", None, None])
+    sheet.append([None, "Products Impacted", None, None])
+    sheet.append(["Type of Product", "ULIP", "TERM", "All"])
+    sheet.append(["List of products in which the change has to be done", "-", "Yes", "-"])
+    sheet.append([None, "Applications Impacted", None, None])
+    sheet.append(["Application Name", "OPUS", "INSTAB", "Other"])
+    sheet.append(["Pls select correct response", "Yes", "-", "-"])
+    sheet.append([None, "PART E : (Mandatory/Optional)", None, None])
+    sheet.append([None, "Whether the any change has to be done in communication", "Yes", None])
+    sheet.append([None, "Mode of communication", "Email", None])
+    for tab in range(scale):
+        tab_sheet = workbook.create_sheet("Test Scenarios" if tab == 0 else f"Ops Risk Assessment {tab}")
+        tab_sheet.append(["ID", "Scenario", "Expected Result", "Status"])
+        for row in range(40):
+            tab_sheet.append([f"TC{tab}-{row}", requirement_line(tab * 40 + row), "Pass", "Open"])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def utf16(text):
+    return text.encode("utf-16-le")
+
+
+def build_msg(scale):
+    # Minimal Outlook message (IPM.Note) with a docx and an xlsx attachment, written with
+    # extract_msg's own OLE writer
+    attachments = [("specification.docx", build_docx(max(scale // 2, 1))), ("requirements.xlsx", build_xlsx(max(scale // 2, 1)))]
+    body = "\n\n".join(requirement_line(index) for index in range(scale * 20))
+
+    writer = OleWriter()
+    writer.addEntry("__properties_version1.0", bytes(8) + struct.pack("<IIII", len(attachments), len(attachments), 0, len(attachments)) + bytes(8))
+    writer.addEntry("__substg1.0_001A001F", utf16("IPM.Note"))
+    writer.addEntry("__substg1.0_0037001F", utf16("Change request for premium validation"))
+    writer.addEntry("__substg1.0_1000001F", utf16(f"Hi team,\n\nPlease find the requirements below.\n\n{body}\n\nRegards"))
+    writer.addEntry("__nameid_version1.0", storage=True)
+    for stream_id in ("00020102", "00030102", "00040102"):
+        writer.addEntry(f"__nameid_version1.0/__substg1.0_{stream_id}", b"")
+    for index, (name, data) in enumerate(attachments):
+        storage = f"__attach_version1.0_#{index:08X}"
+        writer.addEntry(storage, storage=True)
+        # PR_ATTACH_METHOD = ATTACH_BY_VALUE
+        writer.addEntry(f"{storage}/__properties_version1.0", bytes(8) + struct.pack("<IIi4x", 0x37050003, 6, 1))
+        writer.addEntry(f"{storage}/__substg1.0_3707001F", utf16(name))
+        writer.addEntry(f"{storage}/__substg1.0_37010102", data)
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+FIXTURE_BUILDERS = {
+    "docx": build_docx,
+    "pdf": build_pdf,
+    "xlsx": build_xlsx,
+    "msg": build_msg
+}
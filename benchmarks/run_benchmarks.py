@@ -0,0 +1,184 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit_app
+from streamlit_app import (SilentUI, collect_requirements, create_word_document, extract_uploaded_file,
+                           generate_brd_sequentially, initialize_sequential_chains, start_run_trace)
+
+import bench_pdf_extraction
+from fake_llm import install_fake_llm
+from fixture_builders import FIXTURE_BUILDERS, FIXTURE_SIZES, named_buffer
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_PATH = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+DEFAULT_THRESHOLDS_PATH = os.path.join(BENCHMARK_DIR, "thresholds.json")
+# Thresholds are written as this multiple of the measured time, so machine noise stays under the line
+THRESHOLD_HEADROOM = 2.0
+MIN_THRESHOLD_SECONDS = 0.05
+# Cases faster than this are repeated and the best run is kept
+REPEAT_BELOW_SECONDS = 1.0
+# Completion size per section group for each fixture size; the large BRD is what stresses create_word_document
+BRD_OUTPUT_TOKENS = {"small": 1500, "medium": 6000, "large": 24000}
+
+
+def timed(function, repeat):
+    # Untimed warm-up so first-call costs (imports, the DOCX skeleton, lazily compiled patterns) do
+    # not land on whichever case happens to run first
+    function()
+    started = time.perf_counter()
+    value = function()
+    best = time.perf_counter() - started
+    if best < REPEAT_BELOW_SECONDS:
+        for _ in range(repeat - 1):
+            started = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - started)
+    return best, value
+
+
+def bench_extractors(sizes, repeat, fixtures):
+    results = {}
+    for size in sizes:
+        for kind, builder in FIXTURE_BUILDERS.items():
+            data = builder(FIXTURE_SIZES[size])
+            fixtures[(kind, size)] = data
+            seconds, content = timed(lambda: extract_uploaded_file(named_buffer(data, f"{size}.{kind}"), {}), repeat)
+            results[f"extract_{kind}_{size}"] = {
+                "seconds": round(seconds, 4),
+                "input_bytes": len(data),
+                "output_chars": len(content or "")
+            }
+    return results
+
+
+def bench_pipeline(sizes, repeat, fixtures, latency_seconds, tokens_per_second):
+    results = {}
+    for size in sizes:
+        uploads = [named_buffer(fixtures[(kind, size)], f"{size}.{kind}") for kind in FIXTURE_BUILDERS]
+        requirements, _, _ = collect_requirements("", uploads, SilentUI())
+
+        install_fake_llm(latency_seconds, tokens_per_second, BRD_OUTPUT_TOKENS[size])
+        # Chains are a cached resource; drop the ones built around the previous size's fake model
+        initialize_sequential_chains.clear()
+        chains = initialize_sequential_chains("OpenAI", "benchmark")
+
+        def generate():
+            start_run_trace()
+            return generate_brd_sequentially(chains, requirements, ui=SilentUI())
+
+        seconds, brd_content = timed(generate, repeat)
+        run_trace = streamlit_app.RUN_TRACE.entries
+        model_seconds = sum(entry["Latency (s)"] for entry in run_trace)
+        results[f"generate_brd_{size}"] = {
+            "seconds": round(seconds, 4),
+            # Everything except the fake model's own time: prompt assembly, chunking, post-processing
+            "assembly_seconds": round(max(seconds - model_seconds, 0), 4),
+            "requirements_chars": len(requirements),
+            "prompt_tokens": sum(entry["Prompt tokens"] for entry in run_trace),
+            "brd_chars": len(brd_content)
+        }
+
+        def render_word_document():
+            # Cold render: the per-section DOCX cache would otherwise serve every repeat
+            streamlit_app.DOCX_SECTION_CACHE.clear()
+            return create_word_document(brd_content)
+
+        seconds, _ = timed(render_word_document, repeat)
+        results[f"create_word_document_{size}"] = {"seconds": round(seconds, 4), "brd_chars": len(brd_content)}
+    return results
+
+
+def bench_existing(repeat):
+    pdf_path = bench_pdf_extraction.DEFAULT_PDF_PATHS[0]
+    _, result = timed(lambda: bench_pdf_extraction.bench(pdf_path), repeat)
+    return {
+        "pdf_fixture_spec_tables": {
+            "seconds": round(result["processed_seconds"], 4),
+            "processed_chars": result["processed_chars"],
+            "baseline_chars": result["baseline_chars"]
+        }
+    }
+
+
+def threshold_metric(metrics):
+    # Pipeline cases are judged on their own overhead, so a slower fake model never reads as a regression
+    return "assembly_seconds" if "assembly_seconds" in metrics else "seconds"
+
+
+def check_thresholds(results, thresholds):
+    regressions = []
+    for name, limits in thresholds.items():
+        if name not in results:
+            continue
+        for metric, limit in limits.items():
+            value = results[name].get(metric)
+            if value is not None and value > limit:
+                regressions.append({"case": name, "metric": metric, "value": value, "threshold": limit})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the BRD pipeline")
+    parser.add_argument("--sizes", default=",".join(FIXTURE_SIZES), help="comma-separated fixture sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case under one second; the best is kept")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency per call, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="fake model output throughput; 0 is instant")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS_PATH)
+    parser.add_argument("--update-thresholds", action="store_true", help=f"write thresholds at {THRESHOLD_HEADROOM}x this run")
+    args = parser.parse_args()
+
+    sizes = [size for size in args.sizes.split(",") if size]
+    fixtures = {}
+    results = {}
+    # The pipeline logs every prompt and response to stdout; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        results.update(bench_extractors(sizes, args.repeat, fixtures))
+        results.update(bench_pipeline(sizes, args.repeat, fixtures, args.latency, args.tokens_per_second))
+        results.update(bench_existing(args.repeat))
+
+    thresholds = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds, "r", encoding="utf-8") as f:
+            thresholds = json.load(f)
+    if args.update_thresholds:
+        for name, metrics in results.items():
+            metric = threshold_metric(metrics)
+            thresholds[name] = {metric: round(max(metrics[metric] * THRESHOLD_HEADROOM, MIN_THRESHOLD_SECONDS), 3)}
+        with open(args.thresholds, "w", encoding="utf-8") as f:
+            json.dump(thresholds, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    regressions = check_thresholds(results, thresholds)
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "fake_llm": {"latency_seconds": args.latency, "tokens_per_second": args.tokens_per_second},
+        "results": results,
+        "regressions": regressions
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, metrics in results.items():
+        metric = threshold_metric(metrics)
+        limit = thresholds.get(name, {}).get(metric)
+        print(f"{name:34} {metrics[metric]:9.3f}s {metric}" + (f"  (threshold {limit:.3f}s)" if limit else ""))
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']}: {regression['metric']} {regression['value']} > {regression['threshold']}")
+    print(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
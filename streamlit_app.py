@@ -10,116 +10,267 @@ from docx.oxml.shared import OxmlElement, qn
 from docx.oxml.ns import nsdecls
 from docx.oxml import parse_xml
 from io import BytesIO
+import io
+import mmap
 import os
+import pathlib
 import pdfplumber
+from pdfminer.pdftypes import resolve1
 import pandas as pd
 import extract_msg
 import re
 from docx.shared import RGBColor, Pt
 from docx.enum.text import WD_BREAK
 from docx.enum.style import WD_STYLE_TYPE
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 from langchain_openai import AzureChatOpenAI
-from openpyxl import load_workbook
 import json
-from langchain_core.runnables import RunnableSequence
+import zipfile
+from lxml import etree
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+import functools
+import gc
+import collections
+import cProfile
+import pstats
+import sys
+import copy
+import hashlib
+import threading
+import types
+import sqlite3
+import time
+import tracemalloc
+import uuid
+from contextlib import closing, contextmanager
+from langchain_core.runnables import RunnableSequence, RunnableLambda
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import html
+import shutil
+import subprocess
+import tempfile
 
-def expand_product_categories(impacted_products_text, product_alignment):
-    if not product_alignment or not impacted_products_text:
-        return impacted_products_text
+MARKDOWN_HEADING_PATTERN = re.compile(r'^\s*(#{1,6})\s+(\S.*?)\s*$')
+SECTION_NUMBER_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)')
+SECTION_TRAILING_ZERO_PATTERN = re.compile(r'(\.0)+$')
+
+def parse_markdown_sections(text):
+    # Heading-indexed view of a markdown BRD: edits touch only the affected blocks and the
+    # text is joined back once in render_markdown_sections
+    blocks = [{"level": 0, "key": None, "number": None, "heading": None, "lines": [], "removed": False}]
+    index = {}
     
-    def extract_impact_status_from_table(text):
-        impact_status = {}
-        lines = text.split('\n')
+    for line in text.split('\n'):
+        heading_match = MARKDOWN_HEADING_PATTERN.match(line)
+        if not heading_match:
+            blocks[-1]["lines"].append(line)
+            continue
         
-        # More specific indicators
-        positive_indicators = ['yes', 'y', 'true', '1', 'impacted', 'affected']
-        negative_indicators = ['no', 'n', 'false', '0', 'not impacted', 'not affected', 'na', 'n/a']
+        title = heading_match.group(2)
+        number_match = SECTION_NUMBER_PATTERN.match(title)
+        number = number_match.group(1) if number_match else None
+        key = number if number else title.lower()
         
-        for line in lines:
-            if '---' in line or '===' in line:
-                continue
-                
-            if '|' in line:
-                cells = [cell.strip() for cell in line.split('|')]
-                cells = [cell for cell in cells if cell]
-                
-                if len(cells) >= 2:
-                    category_cell = cells[0].lower().strip()
-                    
-                    # CRITICAL: Skip "All" or "ALL" completely
-                    if category_cell in ['all', 'all products', 'all categories']:
-                        continue
-                    
-                    # Check for exact matches with JSON keys
-                    matched_category = None
-                    for json_key in product_alignment.keys():
-                        if json_key.lower() == category_cell:
-                            matched_category = json_key
-                            break
-                        elif json_key.lower() in category_cell:
-                            matched_category = json_key
-                            break
-                        elif category_cell == 'endowment' and json_key == 'endowment_plans':
-                            matched_category = json_key
-                            break
-                    
-                    if matched_category:
-                        # Check status in subsequent cells
-                        category_status = False
-                        for status_cell in cells[1:]:
-                            status_lower = status_cell.lower().strip()
-                            if any(indicator in status_lower for indicator in positive_indicators):
-                                category_status = True
-                                break
-                            elif any(indicator in status_lower for indicator in negative_indicators):
-                                category_status = False
-                                break
-                        
-                        impact_status[matched_category] = category_status
+        index.setdefault(key, len(blocks))
+        blocks.append({
+            "level": len(heading_match.group(1)),
+            "key": key,
+            "number": number,
+            "heading": line,
+            "lines": [],
+            "removed": False
+        })
+    
+    return {"blocks": blocks, "index": index}
+
+def section_block_range(brd_sections, key):
+    start = brd_sections["index"].get(key)
+    if start is None:
+        return None
+    
+    blocks = brd_sections["blocks"]
+    section = blocks[start]
+    # "4.0" is the parent of 4.1, 4.2, ... so children are matched on the number without its trailing ".0"
+    parent_number = SECTION_TRAILING_ZERO_PATTERN.sub('', section["number"]) if section["number"] else None
+    end = start + 1
+    while end < len(blocks):
+        block = blocks[end]
+        if parent_number and block["number"]:
+            if block["number"] == section["number"] or not block["number"].startswith(parent_number + "."):
+                break
+        elif block["level"] <= section["level"]:
+            break
+        end += 1
+    
+    return start, end
+
+def get_section_text(brd_sections, key, include_children=True):
+    block_range = section_block_range(brd_sections, key)
+    if block_range is None:
+        return None
+    
+    start, end = block_range
+    blocks = brd_sections["blocks"]
+    lines = list(blocks[start]["lines"])
+    if include_children:
+        for block in blocks[start + 1:end]:
+            if not block["removed"]:
+                lines.append(block["heading"])
+                lines.extend(block["lines"])
+    
+    return '\n'.join(lines)
+
+def replace_section(brd_sections, key, body, include_children=True):
+    block_range = section_block_range(brd_sections, key)
+    if block_range is None:
+        return False
+    
+    start, end = block_range
+    blocks = brd_sections["blocks"]
+    
+    # Keep the blank lines that separated the old section from the next heading
+    last_block = blocks[end - 1] if include_children else blocks[start]
+    trailing_blank_lines = 0
+    for line in reversed(last_block["lines"]):
+        if line.strip():
+            break
+        trailing_blank_lines += 1
+    
+    new_lines = body.split('\n')
+    while new_lines and not new_lines[-1].strip():
+        new_lines.pop()
+    blocks[start]["lines"] = new_lines + [''] * trailing_blank_lines
+    if include_children:
+        for block in blocks[start + 1:end]:
+            block["removed"] = True
+    
+    return True
+
+def append_to_document(brd_sections, text):
+    for block in reversed(brd_sections["blocks"]):
+        if not block["removed"]:
+            if block["lines"]:
+                block["lines"][-1] += text
+            else:
+                block["lines"].append(text)
+            return
+
+def iter_section_lines(brd_sections):
+    for block in brd_sections["blocks"]:
+        if block["removed"]:
+            continue
+        if block["heading"] is not None:
+            yield block["heading"]
+        yield from block["lines"]
+
+def render_markdown_sections(brd_sections):
+    return '\n'.join(iter_section_lines(brd_sections))
+
+PRODUCT_CATEGORY_ALIASES = {
+    "endowment": "endowment_plans"
+}
+
+PRODUCT_STATUS_POSITIVE_PATTERN = re.compile('|'.join(
+    re.escape(indicator) for indicator in ['yes', 'y', 'true', '1', 'impacted', 'affected']
+))
+PRODUCT_STATUS_NEGATIVE_PATTERN = re.compile('|'.join(
+    re.escape(indicator) for indicator in ['no', 'n', 'false', '0', 'not impacted', 'not affected', 'na', 'n/a']
+))
+
+@functools.lru_cache(maxsize=16)
+def build_product_category_lookup(category_keys):
+    ordered_keys = [(json_key.lower(), json_key) for json_key in category_keys]
+    
+    # Categories are matched in alignment order (exact, substring, then alias), so
+    # "ulip_pension" still resolves to "ulip" exactly as the original key loop did
+    def resolve(category_cell):
+        for key_lower, json_key in ordered_keys:
+            if key_lower == category_cell or key_lower in category_cell:
+                return json_key
+            if PRODUCT_CATEGORY_ALIASES.get(category_cell) == json_key:
+                return json_key
+        return None
+    
+    exact_lookup = {}
+    for candidate in [key_lower for key_lower, _ in ordered_keys] + list(PRODUCT_CATEGORY_ALIASES.keys()):
+        exact_lookup[candidate] = resolve(candidate)
+    
+    key_pattern = re.compile('|'.join(re.escape(key_lower) for key_lower, _ in ordered_keys)) if ordered_keys else None
+    
+    return exact_lookup, key_pattern, resolve
+
+def extract_product_impact_status(lines, product_alignment):
+    exact_lookup, key_pattern, resolve_category = build_product_category_lookup(tuple(product_alignment.keys()))
+    
+    def match_category(category_cell):
+        if category_cell in exact_lookup:
+            return exact_lookup[category_cell]
+        if key_pattern is None or not key_pattern.search(category_cell):
+            return None
+        return resolve_category(category_cell)
+    
+    impact_status = {}
+    
+    for line in lines:
+        if '|' not in line or '---' in line or '===' in line:
+            continue
+        
+        # Empty cells are dropped anyway, so only rows with escaped pipes need the full tokenizer
+        if '\\|' in line:
+            cells = [cell for cell in tokenize_markdown_table_row(line) if cell]
+        else:
+            cells = [cell for cell in map(str.strip, line.split('|')) if cell]
+        if len(cells) < 2:
+            continue
+        
+        category_cell = cells[0].lower()
+        
+        # CRITICAL: Skip "All" or "ALL" completely
+        if category_cell in ('all', 'all products', 'all categories'):
+            continue
+        
+        matched_category = match_category(category_cell)
+        if not matched_category:
+            continue
+        
+        # Check status in subsequent cells
+        category_status = False
+        for status_cell in cells[1:]:
+            status_lower = status_cell.lower().strip()
+            if PRODUCT_STATUS_POSITIVE_PATTERN.search(status_lower):
+                category_status = True
+                break
+            elif PRODUCT_STATUS_NEGATIVE_PATTERN.search(status_lower):
+                category_status = False
+                break
         
-        return impact_status
+        impact_status[matched_category] = category_status
+    
+    return impact_status
+
+def apply_product_category_expansion(brd_sections, product_alignment):
+    if not product_alignment:
+        return
     
     # Extract impact status
-    impact_status = extract_impact_status_from_table(impacted_products_text)
+    impact_status = extract_product_impact_status(iter_section_lines(brd_sections), product_alignment)
     
-    # Sanitize the "### 2.1 Impacted Products" section: keep only the first markdown table, drop any lists/headings that LLM may have added
-    try:
-        lower_text = impacted_products_text.lower()
-        start_tokens = ["### 2.1 impacted products", "## 2.1 impacted products"]
-        end_tokens = ["### 2.2", "## 2.2", "### 2.2 applications impacted", "## 2.2 applications impacted"]
-        start_idx = -1
-        for t in start_tokens:
-            si = lower_text.find(t)
-            if si != -1:
-                start_idx = si
+    # Sanitize the "2.1 Impacted Products" section: keep only the first markdown table, drop any lists/headings that LLM may have added
+    impacted_products = get_section_text(brd_sections, "2.1")
+    if impacted_products is not None:
+        kept = []
+        table_started = False
+        for ln in impacted_products.split('\n'):
+            is_table_line = is_markdown_table_row(ln, min_pipes=1)
+            if table_started and not is_table_line:
+                # once a non-table line appears after table has started, stop keeping further lines
                 break
-        if start_idx != -1:
-            end_idx = len(impacted_products_text)
-            for t in end_tokens:
-                ei = lower_text.find(t, start_idx + 1)
-                if ei != -1:
-                    end_idx = min(end_idx, ei)
-            section = impacted_products_text[start_idx:end_idx]
-            section_lines = section.split('\n')
-            kept = []
-            table_started = False
-            table_ended = False
-            for ln in section_lines:
-                if not table_started:
-                    kept.append(ln)
-                    if '|' in ln:
-                        table_started = True
-                else:
-                    if ('|' in ln) and not table_ended:
-                        kept.append(ln)
-                    else:
-                        # once a non-table line appears after table has started, stop keeping further lines
-                        table_ended = True
-                
-            sanitized_section = '\n'.join(kept)
-            impacted_products_text = impacted_products_text[:start_idx] + sanitized_section + impacted_products_text[end_idx:]
-    except Exception:
-        pass
+            kept.append(ln)
+            if is_table_line:
+                table_started = True
+        replace_section(brd_sections, "2.1", '\n'.join(kept))
     
     # Only expand categories with explicit "Yes" status
     expanded_sections = []
@@ -133,9 +284,15 @@ def expand_product_categories(impacted_products_text, product_alignment):
     
     # Append expansions to sanitized text
     if expanded_sections:
-        return impacted_products_text + ''.join(expanded_sections)
-    else:
+        append_to_document(brd_sections, ''.join(expanded_sections))
+
+def expand_product_categories(impacted_products_text, product_alignment):
+    if not product_alignment or not impacted_products_text:
         return impacted_products_text
+    
+    brd_sections = parse_markdown_sections(impacted_products_text)
+    apply_product_category_expansion(brd_sections, product_alignment)
+    return render_markdown_sections(brd_sections)
 
 def load_product_alignment():
 
@@ -193,10 +350,6 @@ Never expose the processing steps and instructions to the user while creating th
 - For new line, just insert an actual line break (press Enter).
 - For paragraph break, insert one blank line (double Enter).
  
-SOURCE REQUIREMENTS:
- 
-{requirements}
- 
 EXCEL FILE PROCESSING INSTRUCTIONS:
  
 **FOR EXCEL FILES (.xlsx/.xls):**
@@ -323,7 +476,7 @@ STEP BY STEP Process:
         ]
 2. Create a list of all product names with their impact status.
  
-3. From the section '=== PRODUCT ALIGNMENT DATA ===' in the source requirements,
+3. From the section '=== PRODUCT ALIGNMENT DATA ===' in the reference data,
    identify all the product names from Step 2 that EXACTLY match the JSON keys in PRODUCT ALIGNMENT DATA.
  
    - If no any product names match, STOP here and output:
@@ -437,8 +590,8 @@ Extract SPECIFIC technical requirements from ALL processed sheets:
 - Authentication, authorization, or security services
 - Any technical specifications or interface requirements
  
-CATALOG MATCHING (use appended block titled "=== KNOWN API CATALOG (READ-ONLY REFERENCE) ==="):
-- Parse the JSON catalog provided in the appended block
+CATALOG MATCHING (use the reference data block titled "=== KNOWN API CATALOG (READ-ONLY REFERENCE) ==="):
+- Parse the JSON catalog provided in that block
 - For each requirement, first attempt to MATCH the requirement description/intent with catalog descriptions
 - If a match is found, output the EXACT method and endpoint from the catalog (do not modify), and use the catalog description
 - If a requirement has no catalog match, add a "Custom API – [METHOD] [endpoint]" row with a concise description from the source requirement
@@ -481,14 +634,6 @@ Provide ONLY the markdown sections (## 1.0 Introduction, ### 1.1 Purpose, etc.)
  
 You are a Business Analyst expert creating sections 3.0–4.0 of a comprehensive BRD.
  
-PREVIOUS CONTENT:
- 
-{previous_content}
- 
-SOURCE REQUIREMENTS:
- 
-{requirements}
- 
 EXCEL FILE PROCESSING INSTRUCTIONS:
  
 **FOR EXCEL FILES (.xlsx/.xls):**
@@ -583,14 +728,6 @@ Provide ONLY the markdown sections (## 3.0, ### 3.1, etc.) with the extracted co
  
 You are a Business Analyst expert creating section 5.0 of a comprehensive BRD.
  
-PREVIOUS CONTENT:
- 
-{previous_content}
- 
-SOURCE REQUIREMENTS:
- 
-{requirements}
- 
 EXCEL FILE PROCESSING INSTRUCTIONS:
  
 **FOR EXCEL FILES (.xlsx/.xls):**
@@ -716,14 +853,6 @@ Provide ONLY the markdown sections (## 5.0, ### 5.1, etc.) with the extracted co
  
 You are a Business Analyst expert creating sections 7.0–11.0 of a comprehensive BRD.
  
-PREVIOUS CONTENT:
- 
-{previous_content}
- 
-SOURCE REQUIREMENTS:
- 
-{requirements}
- 
 CRITICAL INSTRUCTIONS FOR ALL SECTIONS:
  
 - Extract information ONLY from the provided source requirements
@@ -874,6 +1003,53 @@ Provide ONLY the markdown sections (## 7.0, ### 7.1, etc.) with the extracted co
 
  
 
+SECTION_GROUP_KEYS = list(SECTION_TEMPLATES.keys())
+
+# Every chain prompt starts with the static text and reference data, then the run's requirements,
+# then the per-group instructions, and the content of earlier groups comes last. Within a run the
+# four chains share everything up to the end of the requirements, so provider-side prompt caching can
+# serve most of groups 2-4. Across runs only the static text and reference data are stable, unless the
+# same requirements are sent again (regenerating a section, an unchanged rerun). The instructions
+# stay after the requirements because they differ per group; moving them up would shrink the
+# in-run shared prefix to the reference data.
+SHARED_PROMPT_PREFIX = """
+You are a Business Analyst expert creating a comprehensive Business Requirements Document (BRD), one group of sections at a time.
+The reference data and source requirements below are the same for every section group; the instructions for the sections to create follow them.
+ 
+REFERENCE DATA:
+ 
+{reference_data}
+ 
+SOURCE REQUIREMENTS:
+ 
+{requirements}
+ 
+SECTION INSTRUCTIONS:
+"""
+
+PREVIOUS_CONTENT_SUFFIX = """
+ 
+PREVIOUS CONTENT:
+ 
+{previous_content}
+"""
+
+def build_section_prompt(template_key):
+    template = SHARED_PROMPT_PREFIX + SECTION_TEMPLATES[template_key]
+    if template_key != SECTION_GROUP_KEYS[0]:
+        template += PREVIOUS_CONTENT_SUFFIX
+    return PromptTemplate.from_template(template + "{section_focus}", partial_variables={"section_focus": ""})
+
+def postprocess_section_group(template_key, result, product_alignment=None):
+    # Each chain output is indexed once, every post-processing step edits the index
+    # and the markdown is joined back a single time
+    brd_sections = parse_markdown_sections(result)
+    
+    if template_key == "intro_impact" and product_alignment:
+        apply_product_category_expansion(brd_sections, product_alignment)
+    
+    return render_markdown_sections(brd_sections)
+
 def estimate_content_size(text):
     return len(text)
 
@@ -899,87 +1075,332 @@ def chunk_requirements(requirements, max_chunk_size=8000):
 
 
 
-@st.cache_resource
-def initialize_sequential_chains(api_provider, api_key, azure_endpoint=None, azure_deployment=None, api_version=None):
+MODEL_TIERS = {
+    "OpenAI": {
+        "large": {"model_name": "gpt-3.5-turbo-16k", "context_tokens": 16385},
+        "small": {"model_name": "gpt-3.5-turbo", "context_tokens": 16385}
+    },
+    "Groq": {
+        "large": {"model_name": "llama3-70b-8192", "context_tokens": 8192},
+        "small": {"model_name": "llama3-8b-8192", "context_tokens": 8192}
+    },
+    # Azure tiers are deployments; the small tier uses azure_small_deployment when one is configured
+    "AzureOpenAI": {
+        "large": {"model_name": None, "context_tokens": 16385},
+        "small": {"model_name": None, "context_tokens": 16385}
+    }
+}
+
+# "kind" drives the auto policy: extraction sections go to the small tier when the prompt fits it.
+# "tier" is the default routing and can be overridden per run with "auto", "large" or "small".
+SECTION_MODEL_POLICY = {
+    "intro_impact": {"kind": "analysis", "tier": "auto"},
+    "process_requirements": {"kind": "analysis", "tier": "large"},
+    "data_communication": {"kind": "extraction", "tier": "auto"},
+    "testing_final": {"kind": "analysis", "tier": "auto"}
+}
+SMALL_TIER_OUTPUT_RESERVE = 3000
+
+def estimate_token_count(text):
+    return len(text) // 4
+
+def select_model_tier(template_key, prompt_tokens, small_context_tokens, tier_override=None):
+    policy = SECTION_MODEL_POLICY[template_key]
+    tier = tier_override or policy["tier"]
+    fits_small = prompt_tokens + SMALL_TIER_OUTPUT_RESERVE <= small_context_tokens
     
+    if tier == "auto":
+        tier = "small" if policy["kind"] == "extraction" and fits_small else "large"
+    elif tier == "small" and not fits_small:
+        tier = "large"
+    return tier
+
+def resolve_model_name(api_provider, tier, azure_deployment=None, azure_small_deployment=None):
+    if api_provider == "AzureOpenAI":
+        return azure_small_deployment if tier == "small" and azure_small_deployment else azure_deployment
+    return MODEL_TIERS[api_provider][tier]["model_name"]
+
+def build_chat_model(api_provider, api_key, azure_endpoint=None, azure_deployment=None, api_version=None, model_name=None):
     if api_provider == "OpenAI":
-        model = ChatOpenAI(
+        return ChatOpenAI(
             openai_api_key=api_key,
-            model_name="gpt-3.5-turbo-16k",
+            model_name=model_name or "gpt-3.5-turbo-16k",
             temperature=0.2,
             top_p=0.2
         )
     elif api_provider == "AzureOpenAI":
-        model = AzureChatOpenAI(
+        return AzureChatOpenAI(
             azure_endpoint=azure_endpoint,
             openai_api_key=api_key,
-            azure_deployment=azure_deployment,
+            azure_deployment=model_name or azure_deployment,
             api_version=api_version,
             temperature=0.2,
             top_p=0.2
         )
     else:
-        model = ChatGroq(
+        return ChatGroq(
             groq_api_key=api_key,
-            model_name="llama3-70b-8192",
+            model_name=model_name or "llama3-70b-8192",
             temperature=0.2,
             top_p=0.2
         )
+
+PROVIDER_LATENCY_WINDOW = 200
+PROVIDER_MIN_SAMPLES = 5
+PROVIDER_LATENCY_STATS = {}
+PROVIDER_ROUTING_SPEND = {"requests": 0, "duplicates": 0, "fallbacks": 0}
+PROVIDER_ROUTING_LOCK = threading.Lock()
+
+def provider_label(api_provider, model_name=None):
+    if model_name:
+        return f"{api_provider}/{model_name}"
+    return api_provider
+
+def record_provider_call(provider, seconds, ok=True):
+    with PROVIDER_ROUTING_LOCK:
+        stats = PROVIDER_LATENCY_STATS.setdefault(provider, {
+            "latencies": collections.deque(maxlen=PROVIDER_LATENCY_WINDOW),
+            "calls": 0,
+            "errors": 0,
+            "served": 0
+        })
+        stats["calls"] += 1
+        if ok:
+            stats["latencies"].append(seconds)
+        else:
+            stats["errors"] += 1
+
+def record_provider_served(provider):
+    with PROVIDER_ROUTING_LOCK:
+        PROVIDER_LATENCY_STATS[provider]["served"] += 1
+
+def provider_latency_percentile(provider, percentile):
+    with PROVIDER_ROUTING_LOCK:
+        stats = PROVIDER_LATENCY_STATS.get(provider)
+        latencies = sorted(stats["latencies"]) if stats else []
+    if len(latencies) < PROVIDER_MIN_SAMPLES:
+        return None
+    return latencies[min(len(latencies) - 1, int(round(percentile * (len(latencies) - 1))))]
+
+def get_provider_latency_summary():
+    with PROVIDER_ROUTING_LOCK:
+        providers = list(PROVIDER_LATENCY_STATS.keys())
+        snapshot = {provider: dict(PROVIDER_LATENCY_STATS[provider]) for provider in providers}
+        spend = dict(PROVIDER_ROUTING_SPEND)
+    
+    summary = []
+    for provider in providers:
+        stats = snapshot[provider]
+        p50 = provider_latency_percentile(provider, 0.5)
+        p95 = provider_latency_percentile(provider, 0.95)
+        summary.append({
+            "Provider": provider,
+            "Calls": stats["calls"],
+            "Errors": stats["errors"],
+            "Served": stats["served"],
+            "p50 (s)": round(p50, 2) if p50 is not None else None,
+            "p95 (s)": round(p95, 2) if p95 is not None else None
+        })
+    return summary, spend
+
+def reserve_duplicate_request(duplicate_budget):
+    # Hedged duplicates are capped at a share of all routed requests
+    with PROVIDER_ROUTING_LOCK:
+        if PROVIDER_ROUTING_SPEND["duplicates"] + 1 > duplicate_budget * PROVIDER_ROUTING_SPEND["requests"]:
+            return False
+        PROVIDER_ROUTING_SPEND["duplicates"] += 1
+        return True
+
+@st.cache_resource
+def get_routing_executor():
+    # Abandoned slow calls keep a worker busy until the provider answers, so leave headroom
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-route")
+
+def build_routed_model(primary, secondary, fallback_after=60, hedge=False, duplicate_budget=0.1):
+    # primary / secondary are (label, chat model) pairs
+    executor = get_routing_executor()
+    
+    def timed_invoke(provider, model, prompt):
+        started = time.perf_counter()
+        try:
+            result = model.invoke(prompt)
+        except Exception:
+            record_provider_call(provider, time.perf_counter() - started, ok=False)
+            raise
+        record_provider_call(provider, time.perf_counter() - started)
+        return result
+    
+    def route(prompt):
+        candidates = [primary, secondary]
+        primary_p95 = provider_latency_percentile(primary[0], 0.95)
+        secondary_p95 = provider_latency_percentile(secondary[0], 0.95)
+        # Lead with the secondary once its observed tail is clearly better
+        if primary_p95 and secondary_p95 and secondary_p95 < primary_p95 / 2:
+            candidates.reverse()
+        
+        deadline = fallback_after
+        lead_p95 = provider_latency_percentile(candidates[0][0], 0.95)
+        if hedge and lead_p95:
+            deadline = min(deadline, lead_p95)
+        
+        with PROVIDER_ROUTING_LOCK:
+            PROVIDER_ROUTING_SPEND["requests"] += 1
+        
+        futures = {submit_profiled(executor, timed_invoke, candidates[0][0], candidates[0][1], prompt): candidates[0][0]}
+        pending = set(futures)
+        done, pending = wait(pending, timeout=deadline)
+        # Only an early hedge spends the duplicate budget; past fallback_after the secondary is always tried
+        hedged = False
+        if not done and deadline < fallback_after:
+            hedged = reserve_duplicate_request(duplicate_budget)
+            if not hedged:
+                done, pending = wait(pending, timeout=fallback_after - deadline)
+        if not done:
+            if not hedged:
+                with PROVIDER_ROUTING_LOCK:
+                    PROVIDER_ROUTING_SPEND["fallbacks"] += 1
+            future = submit_profiled(executor, timed_invoke, candidates[1][0], candidates[1][1], prompt)
+            futures[future] = candidates[1][0]
+            pending.add(future)
+        pending |= done
+        
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    record_provider_served(futures[future])
+                    return future.result()
+                last_error = future.exception()
+                print(f"{futures[future]} request failed: {last_error}")
+            
+            # An error on the only in-flight call falls back to the other provider
+            if not pending and len(futures) == 1:
+                future = submit_profiled(executor, timed_invoke, candidates[1][0], candidates[1][1], prompt)
+                futures[future] = candidates[1][0]
+                pending.add(future)
+        
+        raise last_error
+    
+    return RunnableLambda(route)
+
+# Per-thread list of section calls for the run in progress; the Streamlit script thread and
+# each job worker collect their own summary
+RUN_TRACE = threading.local()
+
+def start_run_trace():
+    RUN_TRACE.entries = []
+    return RUN_TRACE.entries
+
+def record_section_call(template_key, tier, model_name, seconds, prompt_tokens, response):
+    entries = getattr(RUN_TRACE, "entries", None)
+    if entries is None:
+        return
+    
+    usage = getattr(response, "usage_metadata", None) or {}
+    completion_text = response.content if hasattr(response, "content") else str(response)
+    prompt_tokens = usage.get("input_tokens", prompt_tokens)
+    # Prefix tokens the provider served from its prompt cache (OpenAI / Azure report these)
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    entries.append({
+        "Section group": SECTION_GROUP_LABELS[template_key],
+        "Tier": tier,
+        "Model": model_name,
+        "Latency (s)": round(seconds, 2),
+        "Prompt tokens": prompt_tokens,
+        "Cached prompt tokens": cached_tokens,
+        "Cache ratio": round(cached_tokens / prompt_tokens, 2) if prompt_tokens else 0.0,
+        "Completion tokens": usage.get("output_tokens", estimate_token_count(completion_text)),
+        "Token counts": "reported" if usage else "estimated"
+    })
+
+def build_section_model(template_key, tier_models, small_context_tokens, tier_override=None):
+    def invoke_section_model(prompt):
+        prompt_tokens = estimate_token_count(prompt.to_string())
+        tier = select_model_tier(template_key, prompt_tokens, small_context_tokens, tier_override)
+        model_name, model = tier_models[tier]
+        
+        started = time.perf_counter()
+        response = model.invoke(prompt)
+        record_section_call(template_key, tier, model_name, time.perf_counter() - started, prompt_tokens, response)
+        return response
+    
+    return RunnableLambda(invoke_section_model)
+
+@st.cache_resource
+def initialize_sequential_chains(api_provider, api_key, azure_endpoint=None, azure_deployment=None, api_version=None, routing=None, model_routing=None, azure_small_deployment=None):
+    
+    tier_models = {}
+    for tier in ("large", "small"):
+        model_name = resolve_model_name(api_provider, tier, azure_deployment, azure_small_deployment)
+        if tier == "small" and model_name == tier_models["large"][0]:
+            tier_models["small"] = tier_models["large"]
+            continue
+        
+        model = build_chat_model(api_provider, api_key, azure_endpoint, azure_deployment, api_version, model_name)
+        
+        if routing:
+            secondary_model_name = resolve_model_name(routing["api_provider"], tier, routing.get("azure_deployment"))
+            secondary_model = build_chat_model(
+                routing["api_provider"],
+                routing["api_key"],
+                routing.get("azure_endpoint"),
+                routing.get("azure_deployment"),
+                routing.get("api_version"),
+                secondary_model_name
+            )
+            model = build_routed_model(
+                (provider_label(api_provider, model_name), model),
+                (provider_label(routing["api_provider"], secondary_model_name), secondary_model),
+                fallback_after=routing["fallback_after"],
+                hedge=routing["hedge"],
+                duplicate_budget=routing["duplicate_budget"]
+            )
+        
+        tier_models[tier] = (model_name, model)
+    
+    small_context_tokens = MODEL_TIERS[api_provider]["small"]["context_tokens"]
+    if routing:
+        small_context_tokens = min(small_context_tokens, MODEL_TIERS[routing["api_provider"]]["small"]["context_tokens"])
+    
+    def section_model(template_key):
+        return build_section_model(template_key, tier_models, small_context_tokens, (model_routing or {}).get(template_key))
     
     output_parser = StrOutputParser()
     
     # Create chains using RunnableSequence
     chain1 = RunnableSequence(
-        PromptTemplate(
-            input_variables=['requirements'],
-            template=SECTION_TEMPLATES["intro_impact"]
-        ),
-        model,
+        build_section_prompt("intro_impact"),
+        section_model("intro_impact"),
         output_parser
     )
     
     chain2 = RunnableSequence(
-        PromptTemplate(
-            input_variables=['previous_content', 'requirements'],
-            template=SECTION_TEMPLATES["process_requirements"]
-        ),
-        model,
+        build_section_prompt("process_requirements"),
+        section_model("process_requirements"),
         output_parser
     )
     
     chain3 = RunnableSequence(
-        PromptTemplate(
-            input_variables=['previous_content', 'requirements'],
-            template=SECTION_TEMPLATES["data_communication"]
-        ),
-        model,
+        build_section_prompt("data_communication"),
+        section_model("data_communication"),
         output_parser
     )
     
     chain4 = RunnableSequence(
-        PromptTemplate(
-            input_variables=['previous_content', 'requirements'],
-            template=SECTION_TEMPLATES["testing_final"]
-        ),
-        model,
+        build_section_prompt("testing_final"),
+        section_model("testing_final"),
         output_parser
     )
     
     return [chain1, chain2, chain3, chain4]
 
-def generate_brd_sequentially(chains, requirements):
-    
-    req_chunks = chunk_requirements(requirements)
-    
-    if len(req_chunks) > 1:
-        st.info(f"Large content detected. Processing in {len(req_chunks)} chunks...")
-    
-    combined_requirements = "\n\n=== DOCUMENT BREAK ===\n\n".join(req_chunks)
-    
-    st.write("="*120)
-    st.write("📋 COMBINED REQUIREMENTS SENT TO LLM:")
-    st.write("="*120)
+def build_llm_requirements(req_chunks):
+    return "\n\n=== DOCUMENT BREAK ===\n\n".join(req_chunks)
 
+def build_reference_data():
+    # Static across runs: kept out of the requirements so it stays in the shared prompt prefix
+    reference_data = ""
     product_alignment = load_product_alignment()
     # Load API catalog and append as reference block for the LLM (prompt-only usage)
     try:
@@ -992,90 +1413,124 @@ def generate_brd_sequentially(chains, requirements):
         product_alignment_text = "\n\n=== PRODUCT ALIGNMENT DATA ===\n"
         product_alignment_text += json.dumps(product_alignment, indent=2)
         product_alignment_text += "\n" + "="*50
-        combined_requirements = combined_requirements + product_alignment_text
+        reference_data += product_alignment_text
     
     if apis_catalog_json:
-        combined_requirements += "\n\n=== KNOWN API CATALOG (READ-ONLY REFERENCE) ===\n"
-        combined_requirements += json.dumps(apis_catalog_json, indent=2)
-        combined_requirements += "\n" + "="*50
+        reference_data += "\n\n=== KNOWN API CATALOG (READ-ONLY REFERENCE) ===\n"
+        reference_data += json.dumps(apis_catalog_json, indent=2)
+        reference_data += "\n" + "="*50
+    
+    return reference_data.strip()
+
+def invoke_section_chain(chain, group_key, reference_data, combined_requirements, previous_content, section_focus=""):
+    inputs = {"reference_data": reference_data, "requirements": combined_requirements, "section_focus": section_focus}
+    if group_key != SECTION_GROUP_KEYS[0]:
+        inputs["previous_content"] = previous_content
+    return chain.invoke(inputs)
+
+def generate_brd_sequentially(chains, requirements, reuse_groups=None, ui=st, progress=None):
+    
+    req_chunks = chunk_requirements(requirements)
     
-    with st.expander("📄 View Complete Requirements Content", expanded=False):
-        st.text_area("Full Content", combined_requirements, height=400)
+    if len(req_chunks) > 1:
+        ui.info(f"Large content detected. Processing in {len(req_chunks)} chunks...")
+    
+    combined_requirements = build_llm_requirements(req_chunks)
+    reference_data = build_reference_data()
+    product_alignment = load_product_alignment()
+    
+    ui.write("="*120)
+    ui.write("📋 COMBINED REQUIREMENTS SENT TO LLM:")
+    ui.write("="*120)
     
-    st.write(f"📊 **Content Statistics:**")
-    st.write(f"- Total characters: {len(combined_requirements):,}")
+    with ui.expander("📄 View Complete Requirements Content", expanded=False):
+        ui.text_area("Full Content", combined_requirements, height=400)
+    
+    ui.write(f"📊 **Content Statistics:**")
+    ui.write(f"- Total characters: {len(combined_requirements):,}")
     lines_count = len(combined_requirements.split('\n'))
     words_count = len(combined_requirements.split())
-    st.write(f"- Total lines: {lines_count:,}")
-    st.write(f"- Total words (approx): {words_count:,}")
-    st.write(f"- Number of chunks: {len(req_chunks)}")
+    ui.write(f"- Total lines: {lines_count:,}")
+    ui.write(f"- Total words (approx): {words_count:,}")
+    ui.write(f"- Number of chunks: {len(req_chunks)}")
+    ui.write(f"- Shared reference data (product alignment, API catalog): {len(reference_data):,} characters")
     
-    st.write(f"📖 **Content Preview (First 2000 characters):**")
-    st.code(combined_requirements[:2000] + "..." if len(combined_requirements) > 2000 else combined_requirements)
+    ui.write(f"📖 **Content Preview (First 2000 characters):**")
+    ui.code(combined_requirements[:2000] + "..." if len(combined_requirements) > 2000 else combined_requirements)
     
     sections = [line for line in combined_requirements.split('\n') if line.strip().startswith('===')]
     if sections:
-        st.write(f"**Document Structure:**")
+        ui.write(f"**Document Structure:**")
         for section in sections[:10]:
-            st.write(f"- {section.strip()}")
+            ui.write(f"- {section.strip()}")
         if len(sections) > 10:
-            st.write(f"- ... and {len(sections) - 10} more sections")
+            ui.write(f"- ... and {len(sections) - 10} more sections")
     
-    st.write("="*120)
+    ui.write("="*120)
     
     previous_content = ""
     final_sections = []
     
     for i, chain in enumerate(chains):
+        if progress:
+            progress(i, f"Section group {i+1}/4: {SECTION_GROUP_LABELS[SECTION_GROUP_KEYS[i]]}")
+        
+        if reuse_groups and SECTION_GROUP_KEYS[i] in reuse_groups:
+            result = reuse_groups[SECTION_GROUP_KEYS[i]]
+            final_sections.append(result)
+            previous_content += "\n\n" + result
+            ui.write(f"♻️ **Reused section group {i+1}/4 from the previous run (no requirement changes affect it)**")
+            continue
+        
         try:
-            st.write(f"\\n🔗 **PROCESSING CHAIN {i+1}/4**")
-            st.write(f"{'='*60}")
+            ui.write(f"\\n🔗 **PROCESSING CHAIN {i+1}/4**")
+            ui.write(f"{'='*60}")
             
-            with st.expander(f"🔍 Chain {i+1} Details - Click to expand", expanded=False):
+            with ui.expander(f"🔍 Chain {i+1} Details - Click to expand", expanded=False):
                 
                 if i == 0:
-                    st.write("**Input to Chain 1 (Introduction & Impact Analysis):**")
-                    st.write(f"- Requirements length: {len(combined_requirements):,} characters")
-                    st.write("**Requirements Preview:**")
-                    st.code(combined_requirements[:1000] + "..." if len(combined_requirements) > 1000 else combined_requirements)
+                    ui.write("**Input to Chain 1 (Introduction & Impact Analysis):**")
+                    ui.write(f"- Requirements length: {len(combined_requirements):,} characters")
+                    ui.write("**Requirements Preview:**")
+                    ui.code(combined_requirements[:1000] + "..." if len(combined_requirements) > 1000 else combined_requirements)
                     
-                    st.write("**Template Used:**")
-                    st.code(SECTION_TEMPLATES["intro_impact"][:500] + "...")
+                    ui.write("**Template Used:**")
+                    ui.code(SECTION_TEMPLATES["intro_impact"][:500] + "...")
                     
-                    result = chain.invoke({"requirements": combined_requirements})
+                    result = invoke_section_chain(chain, SECTION_GROUP_KEYS[i], reference_data, combined_requirements, previous_content)
                 else:
                     chain_names = ["", "Process & Requirements", "Data & Communication", "Testing & Final"]
-                    st.write(f"**Input to Chain {i+1} ({chain_names[i]}):**")
-                    st.write(f"- Previous content length: {len(previous_content):,} characters")
-                    st.write(f"- Requirements length: {len(combined_requirements):,} characters")
+                    ui.write(f"**Input to Chain {i+1} ({chain_names[i]}):**")
+                    ui.write(f"- Previous content length: {len(previous_content):,} characters")
+                    ui.write(f"- Requirements length: {len(combined_requirements):,} characters")
                     
-                    st.write("**Previous Content Preview:**")
-                    st.code(previous_content[:800] + "..." if len(previous_content) > 800 else previous_content)
+                    ui.write("**Previous Content Preview:**")
+                    ui.code(previous_content[:800] + "..." if len(previous_content) > 800 else previous_content)
                     
-                    st.write("**Requirements Preview:**")
-                    st.code(combined_requirements[:800] + "..." if len(combined_requirements) > 800 else combined_requirements)
+                    ui.write("**Requirements Preview:**")
+                    ui.code(combined_requirements[:800] + "..." if len(combined_requirements) > 800 else combined_requirements)
                     
                     template_keys = ["", "process_requirements", "data_communication", "testing_final"]
-                    st.write(f"**Template Used ({template_keys[i]}):**")
-                    st.code(SECTION_TEMPLATES[template_keys[i]][:500] + "...")
+                    ui.write(f"**Template Used ({template_keys[i]}):**")
+                    ui.code(SECTION_TEMPLATES[template_keys[i]][:500] + "...")
                     
-                    result = chain.invoke({"previous_content":previous_content, "requirements":combined_requirements})
+                    result = invoke_section_chain(chain, SECTION_GROUP_KEYS[i], reference_data, combined_requirements, previous_content)
                 
-                st.write(f"**Chain {i+1} Output:**")
-                st.write(f"- Response length: {len(result):,} characters")
+                ui.write(f"**Chain {i+1} Output:**")
+                ui.write(f"- Response length: {len(result):,} characters")
                 result_lines = len(result.split('\n'))
                 result_words = len(result.split())
-                st.write(f"- Response lines: {result_lines:,}")
-                st.write(f"- Response words (approx): {result_words:,}")
+                ui.write(f"- Response lines: {result_lines:,}")
+                ui.write(f"- Response words (approx): {result_words:,}")
                 
                 output_sections = [line for line in result.split('\n') if line.strip().startswith('##')]
                 if output_sections:
-                    st.write("**Sections Generated:**")
+                    ui.write("**Sections Generated:**")
                     for section in output_sections:
-                        st.write(f"- {section.strip()}")
+                        ui.write(f"- {section.strip()}")
                 
-                st.write("**Response Preview:**")
-                st.code(result[:1000] + "..." if len(result) > 1000 else result)
+                ui.write("**Response Preview:**")
+                ui.code(result[:1000] + "..." if len(result) > 1000 else result)
             
             print(f"\n{'='*60}")
             print(f"CHAIN {i+1} INPUT:")
@@ -1096,10 +1551,8 @@ def generate_brd_sequentially(chains, requirements):
                 print("\nRequirements (first 500 chars):")
                 print(combined_requirements[:500] + "..." if len(combined_requirements) > 500 else combined_requirements)
 
-            if i == 0 and product_alignment:
-                result = expand_product_categories(result, product_alignment)
-            
             # Removed API injection: rely on prompt with catalog JSON only
+            result = postprocess_section_group(SECTION_GROUP_KEYS[i], result, product_alignment)
             
             print(f"\nCHAIN {i+1} OUTPUT:")
             print(f"Response length: {len(result)} characters")
@@ -1108,38 +1561,38 @@ def generate_brd_sequentially(chains, requirements):
             print(f"{'='*60}")
             
             final_sections.append(result)
-            previous_content += "\\n\\n" + result
+            previous_content += "\n\n" + result
             
-            st.write(f"✅ **Completed section group {i+1}/4**")
-            st.write(f"📈 **Cumulative content length: {len(previous_content):,} characters**")
+            ui.write(f"✅ **Completed section group {i+1}/4**")
+            ui.write(f"📈 **Cumulative content length: {len(previous_content):,} characters**")
             
         except Exception as e:
             print(f"ERROR in chain {i+1}: {str(e)}")
-            st.error(f"❌ Error in chain {i+1}: {str(e)}")
-            final_sections.append(f"## Error in section group {i+1}\\nError processing this section: {str(e)}")
+            ui.error(f"❌ Error in chain {i+1}: {str(e)}")
+            final_sections.append(f"## Error in section group {i+1}\nError processing this section: {str(e)}")
     
-    final_brd = "\\n\\n".join(final_sections)
+    final_brd = "\n\n".join(final_sections)
     
-    st.write("\\n" + "="*80)
-    st.write("📋 **FINAL BRD GENERATION COMPLETE**")
-    st.write("="*80)
+    ui.write("\\n" + "="*80)
+    ui.write("📋 **FINAL BRD GENERATION COMPLETE**")
+    ui.write("="*80)
     
-    with st.expander("📊 Final BRD Statistics & Preview", expanded=True):
-        st.write(f"**Final Statistics:**")
-        st.write(f"- Total final BRD length: {len(final_brd):,} characters")
+    with ui.expander("📊 Final BRD Statistics & Preview", expanded=True):
+        ui.write(f"**Final Statistics:**")
+        ui.write(f"- Total final BRD length: {len(final_brd):,} characters")
         final_lines = len(final_brd.split('\n'))
         final_words = len(final_brd.split())
-        st.write(f"- Total lines: {final_lines:,}")
-        st.write(f"- Total words (approx): {final_words:,}")
+        ui.write(f"- Total lines: {final_lines:,}")
+        ui.write(f"- Total words (approx): {final_words:,}")
         
         final_sections_headers = [line for line in final_brd.split('\n') if line.strip().startswith('##')]
         if final_sections_headers:
-            st.write(f"**Generated Sections ({len(final_sections_headers)}):**")
+            ui.write(f"**Generated Sections ({len(final_sections_headers)}):**")
             for section in final_sections_headers:
-                st.write(f"- {section.strip()}")
+                ui.write(f"- {section.strip()}")
         
-        st.write("**Final BRD Preview (first 2000 characters):**")
-        st.code(final_brd[:2000] + "..." if len(final_brd) > 2000 else final_brd)
+        ui.write("**Final BRD Preview (first 2000 characters):**")
+        ui.code(final_brd[:2000] + "..." if len(final_brd) > 2000 else final_brd)
     
     print("\n" + "="*80)
     print("FINAL BRD CONTENT:")
@@ -1151,6 +1604,253 @@ def generate_brd_sequentially(chains, requirements):
     
     return final_brd
 
+SECTION_GROUP_MAJORS = {
+    "intro_impact": ["1", "2"],
+    "process_requirements": ["3", "4"],
+    "data_communication": ["5", "6"],
+    "testing_final": ["7", "8", "9", "10", "11"]
+}
+
+SECTION_GROUP_LABELS = {
+    "intro_impact": "1.0–2.0 Introduction & Impact Analysis",
+    "process_requirements": "3.0–4.0 Process & Requirements",
+    "data_communication": "5.0–6.0 Data & Communication",
+    "testing_final": "7.0–11.0 Testing & Final"
+}
+
+def find_section_group(target):
+    if target in SECTION_GROUP_MAJORS:
+        return target
+    
+    major = str(target).split('.')[0]
+    for group_key, majors in SECTION_GROUP_MAJORS.items():
+        if major in majors:
+            return group_key
+    
+    return None
+
+def split_brd_by_group(brd_content):
+    brd_sections = parse_markdown_sections(brd_content)
+    group_lines = {group_key: [] for group_key in SECTION_GROUP_KEYS}
+    
+    current_group = SECTION_GROUP_KEYS[0]
+    for block in brd_sections["blocks"]:
+        if block["number"]:
+            current_group = find_section_group(block["number"]) or current_group
+        if block["heading"] is not None:
+            group_lines[current_group].append(block["heading"])
+        group_lines[current_group].extend(block["lines"])
+    
+    return {group_key: '\n'.join(lines).strip() for group_key, lines in group_lines.items()}
+
+def join_brd_groups(group_content):
+    return "\n\n".join(group_content[group_key] for group_key in SECTION_GROUP_KEYS if group_content.get(group_key))
+
+def list_regenerable_sections(brd_content):
+    brd_sections = parse_markdown_sections(brd_content)
+    options = [(group_key, SECTION_GROUP_LABELS[group_key]) for group_key in SECTION_GROUP_KEYS]
+    for key, block_idx in brd_sections["index"].items():
+        block = brd_sections["blocks"][block_idx]
+        if block["number"] and find_section_group(block["number"]):
+            options.append((key, block["heading"].strip().lstrip('#').strip()))
+    return options
+
+def regenerate_brd_section(chains, requirements, brd_content, target):
+    group_key = find_section_group(target)
+    if group_key is None:
+        raise ValueError(f"Unknown BRD section: {target}")
+    
+    group_index = SECTION_GROUP_KEYS.index(group_key)
+    combined_requirements = build_llm_requirements(chunk_requirements(requirements))
+    product_alignment = load_product_alignment()
+    
+    # Earlier section groups come from the current BRD instead of being regenerated
+    group_content = split_brd_by_group(brd_content)
+    previous_content = "".join(
+        "\n\n" + group_content[key] for key in SECTION_GROUP_KEYS[:group_index] if group_content[key]
+    )
+    
+    brd_sections = parse_markdown_sections(brd_content)
+    section_focus = ""
+    if target != group_key:
+        block_idx = brd_sections["index"].get(target)
+        if block_idx is None:
+            raise ValueError(f"Section {target} was not found in the current BRD")
+        heading = brd_sections["blocks"][block_idx]["heading"].strip()
+        section_focus = (
+            f"\n\nREGENERATION SCOPE:\nOutput ONLY the section \"{heading}\" (its heading and its content), "
+            "following the instructions above for that section. Do not output any other section."
+        )
+    
+    result = invoke_section_chain(chains[group_index], group_key, build_reference_data(), combined_requirements, previous_content, section_focus)
+    result = postprocess_section_group(group_key, result, product_alignment)
+    
+    if target == group_key:
+        group_content[group_key] = result.strip()
+        return join_brd_groups(group_content)
+    
+    new_body = get_section_text(parse_markdown_sections(result), target)
+    if new_body is None:
+        raise ValueError(f"The regenerated output did not contain section {target}")
+    
+    replace_section(brd_sections, target, new_body)
+    return render_markdown_sections(brd_sections)
+
+BLOCK_GROUP_DEPENDENCIES = {
+    "part_b": ["intro_impact", "process_requirements"],
+    "part_c": ["intro_impact"],
+    "part_e": ["data_communication"],
+    "requirement_row": ["intro_impact", "process_requirements", "data_communication", "testing_final"],
+    "test_sheet": ["testing_final"],
+    "risk_sheet": ["testing_final"]
+}
+
+BRD_CHECKPOINT_DIR = os.environ.get("BRD_CHECKPOINT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".brd_checkpoints"))
+
+def hash_block(value):
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+def normalize_source_name(source_name):
+    stem, extension = os.path.splitext(source_name.lower())
+    # "Requirements v2.xlsx", "Requirements_v3.xlsx" and "Requirements (1).xlsx" are the same source
+    stem = re.sub(r'(\s*\(\d+\)|[\s_\-]*v(er(sion)?)?[\s_\-]*\d+)$', '', stem)
+    return stem + extension
+
+def fingerprint_requirement_blocks(source_name, content, report=None):
+    fingerprints = {}
+    # Block IDs use the same normalized name as the checkpoint key, so a renamed version of a file
+    # is compared block by block with the previous one
+    source_key = normalize_source_name(source_name)
+    
+    def add_block(block_id, kind, value):
+        fingerprints[f"{source_key}::{block_id}"] = {
+            "hash": hash_block(value),
+            "groups": BLOCK_GROUP_DEPENDENCIES.get(kind, SECTION_GROUP_KEYS)
+        }
+    
+    try:
+        excel_result = json.loads(content) if content.lstrip().startswith('{') else None
+    except ValueError:
+        excel_result = None
+    
+    if isinstance(excel_result, dict) and "priority_content" in excel_result:
+        for part_key in ["part_b", "part_c", "part_e"]:
+            for entry in excel_result["priority_content"].get(part_key, []):
+                add_block(f"{part_key}::{entry.get('sheet_name')}::{entry.get('column')}::{entry.get('row')}", part_key, entry)
+        
+        for sheet in excel_result.get("sheets", []):
+            sheet_name = sheet.get("sheet_name", "")
+            sheet_name_lower = str(sheet_name).lower()
+            if "test" in sheet_name_lower:
+                row_kind = "test_sheet"
+            elif "risk" in sheet_name_lower:
+                row_kind = "risk_sheet"
+            else:
+                row_kind = "requirement_row"
+            
+            for req_column in sheet.get("detailed_requirements", []):
+                for requirement in req_column.get("requirements", []):
+                    add_block(f"req::{sheet_name}::{req_column.get('column_name')}::{requirement.get('row')}", row_kind, requirement.get("text", ""))
+            
+            for row_idx, sample_row in enumerate(sheet.get("sample_data", [])):
+                add_block(f"sample::{sheet_name}::{row_idx}", row_kind, sample_row)
+            
+            # Only the column layout is fingerprinted here: row counts and missing-value stats move with
+            # every edit and would otherwise invalidate every section group
+            sheet_structure = sheet.get("columns", {}).get("names", [])
+            add_block(f"sheet::{sheet_name}", row_kind if row_kind != "requirement_row" else None, sheet_structure)
+        
+        return fingerprints
+    
+    if report is not None and report.get("blocks"):
+        for block in report["blocks"]:
+            add_block(block["id"], block.get("kind"), block["text"])
+        return fingerprints
+    
+    for block_idx, paragraph in enumerate(p for p in re.split(r'\n\s*\n', content) if p.strip()):
+        add_block(f"paragraph::{block_idx}", None, paragraph.strip())
+    
+    return fingerprints
+
+def find_changed_section_groups(previous_fingerprints, current_fingerprints):
+    changed_groups = set()
+    for block_id in set(previous_fingerprints) | set(current_fingerprints):
+        previous_block = previous_fingerprints.get(block_id)
+        current_block = current_fingerprints.get(block_id)
+        if previous_block and current_block and previous_block["hash"] == current_block["hash"]:
+            continue
+        for block in (previous_block, current_block):
+            if block:
+                changed_groups.update(block["groups"])
+    
+    # Each group is generated with the content of every earlier group as previous_content, so a
+    # regenerated group invalidates all the groups after it
+    for group_idx, group_key in enumerate(SECTION_GROUP_KEYS):
+        if group_key in changed_groups:
+            changed_groups.update(SECTION_GROUP_KEYS[group_idx + 1:])
+            break
+    
+    return [group_key for group_key in SECTION_GROUP_KEYS if group_key in changed_groups]
+
+# Reused section groups are only valid for the prompts that produced them
+BRD_PROMPT_VERSION = hash_block({"templates": SECTION_TEMPLATES, "prefix": SHARED_PROMPT_PREFIX})
+
+def brd_checkpoint_scope(owner_id, provider_config):
+    provider = {key: value for key, value in provider_config.items() if key != "api_key"}
+    if provider.get("routing"):
+        provider["routing"] = {key: value for key, value in provider["routing"].items() if key != "api_key"}
+    return {"owner": owner_id, "provider": provider, "prompts": BRD_PROMPT_VERSION}
+
+def checkpoint_key(source_names, scope=None):
+    return hash_block({
+        "sources": sorted(normalize_source_name(source_name) for source_name in source_names),
+        "scope": scope
+    })
+
+def load_brd_checkpoint(source_names, scope=None, fallback_checkpoint=None):
+    key = checkpoint_key(source_names, scope)
+    checkpoint_path = os.path.join(BRD_CHECKPOINT_DIR, f"{key}.json")
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    # The in-session checkpoint only stands in for the same sources, owner, models and prompts
+    if fallback_checkpoint and fallback_checkpoint.get("key") == key:
+        return fallback_checkpoint
+    return None
+
+def save_brd_checkpoint(source_names, fingerprints, brd_content, scope=None):
+    key = checkpoint_key(source_names, scope)
+    checkpoint = {
+        "key": key,
+        "sources": sorted(source_names),
+        "fingerprints": fingerprints,
+        "groups": split_brd_by_group(brd_content)
+    }
+    try:
+        os.makedirs(BRD_CHECKPOINT_DIR, exist_ok=True)
+        checkpoint_path = os.path.join(BRD_CHECKPOINT_DIR, f"{key}.json")
+        with open(checkpoint_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Error saving BRD checkpoint: {str(e)}")
+    return checkpoint
+
+def plan_incremental_run(checkpoint, fingerprints):
+    if not checkpoint:
+        return None
+    
+    changed_groups = find_changed_section_groups(checkpoint.get("fingerprints", {}), fingerprints)
+    reuse_groups = {
+        group_key: content
+        for group_key, content in checkpoint.get("groups", {}).items()
+        if group_key not in changed_groups and content and not content.startswith("## Error in section group")
+    }
+    return reuse_groups
+
 def create_toc_styles(doc):
     styles = doc.styles
     
@@ -1305,77 +2005,104 @@ def add_section_with_bookmark(doc, heading_text, bookmark_name, level=1):
 
 
 
-def parse_markdown_table(table_text):
-    def clean_cell_value(cell_text):
-        if cell_text is None:
-            return ""
-        
-        str_val = str(cell_text).strip()
-        
-        if str_val.lower() == 'nan':
-            return ""
-        
-        if str_val.startswith("Unnamed"):
-            return "Insert Column Name"
-        
-        return str_val
+UNESCAPED_PIPE_PATTERN = re.compile(r'(?<!\\)\|')
+MARKDOWN_TABLE_SEPARATOR_PATTERN = re.compile(r'^[\s|:\-]+$')
+
+def count_table_pipes(line):
+    if '\\|' not in line:
+        return line.count('|')
+    return len(UNESCAPED_PIPE_PATTERN.findall(line))
+
+def is_markdown_table_row(line, min_pipes=2):
+    return '|' in line and count_table_pipes(line) >= min_pipes
+
+def tokenize_markdown_table_row(line):
+    line = line.strip()
+    if '\\|' in line:
+        cells = [cell.replace('\\|', '|') for cell in UNESCAPED_PIPE_PATTERN.split(line)]
+    else:
+        cells = line.split('|')
     
-    lines = [line.strip() for line in table_text.split('\n') if line.strip()]
+    # Leading/trailing pipes produce an empty first/last token
+    if len(cells) > 1 and line.startswith('|'):
+        cells = cells[1:]
+    if len(cells) > 1 and line.endswith('|') and not line.endswith('\\|'):
+        cells = cells[:-1]
     
-    if len(lines) < 2:
-        return None
+    return [cell.strip() for cell in cells]
+
+def parse_table_alignments(separator_line):
+    alignments = []
+    for cell in tokenize_markdown_table_row(separator_line):
+        if cell.startswith(':') and cell.endswith(':'):
+            alignments.append("center")
+        elif cell.endswith(':'):
+            alignments.append("right")
+        elif cell.startswith(':'):
+            alignments.append("left")
+        else:
+            alignments.append(None)
+    return alignments
+
+def parse_markdown_table_lines(lines):
+    table = {
+        "header": None,
+        "rows": [],
+        "alignments": [],
+        "width": 0
+    }
+    content_lines = 0
     
-    # Remove separator line (the one with ---)
-    filtered_lines = []
+    # Single pass: separators are skipped, every other row is tokenized, cleaned and
+    # normalized to the header width as soon as it is read
     for line in lines:
-        if not re.match(r'^[\s\|\-]+$', line):  # Skip lines that only contain |, -, and spaces
-            filtered_lines.append(line)
-    
-    if len(filtered_lines) < 2:  # Need at least header + 1 data row
-        return None
-    
-    table_data = []
-    
-    for line in filtered_lines:
-        # Clean up the line - remove leading/trailing pipes
-        if line.startswith('|'):
-            line = line[1:]
-        if line.endswith('|'):
-            line = line[:-1]
+        line = line.strip()
+        if not line:
+            continue
         
-        # Split by | and clean each cell
-        cells = [clean_cell_value(cell.strip()) for cell in line.split('|')]
+        if MARKDOWN_TABLE_SEPARATOR_PATTERN.match(line):
+            if not table["alignments"]:
+                table["alignments"] = parse_table_alignments(line)
+            continue
+        
+        content_lines += 1
+        cells = [
+            "" if cell.lower() == 'nan' else "Insert Column Name" if cell.startswith("Unnamed") else cell
+            for cell in tokenize_markdown_table_row(line)
+        ]
         
         # Remove empty cells from the end
         while cells and not cells[-1]:
             cells.pop()
         
-        if cells:  # Only add if there are non-empty cells
-            table_data.append(cells)
+        if not cells:
+            continue
+        
+        if table["header"] is None:
+            table["header"] = cells
+            table["width"] = len(cells)
+        elif len(cells) < table["width"]:
+            table["rows"].append(cells + [''] * (table["width"] - len(cells)))
+        else:
+            table["rows"].append(cells[:table["width"]])
     
-    if not table_data:
+    if content_lines < 2 or table["header"] is None:  # Need at least header + 1 data row
         return None
     
-    # Ensure all rows have the same number of columns as the header
-    if len(table_data) > 0:
-        max_cols = len(table_data[0])  # Use header row as reference
-        
-        # Normalize all rows to have the same number of columns
-        normalized_data = []
-        for i, row in enumerate(table_data):
-            if i == 0:  # Header row
-                normalized_row = row[:max_cols]  # Don't extend header, just truncate if needed
-            else:  # Data rows
-                # Extend with empty strings if needed, truncate if too long
-                if len(row) < max_cols:
-                    normalized_row = row + [''] * (max_cols - len(row))
-                else:
-                    normalized_row = row[:max_cols]
-            normalized_data.append(normalized_row)
-        
-        return normalized_data
+    return table
+
+def collect_markdown_table(lines, start):
+    end = start
+    while end < len(lines) and lines[end].strip() and is_markdown_table_row(lines[end], min_pipes=1):
+        end += 1
+    return parse_markdown_table_lines(lines[start:end]), end
+
+def parse_markdown_table(table_text):
+    table = parse_markdown_table_lines(table_text.split('\n'))
+    if table is None:
+        return None
     
-    return None
+    return [table["header"]] + table["rows"]
 
 def create_table_in_doc(doc, table_data):
     def clean_table_cell_value(cell_text):
@@ -1446,45 +2173,516 @@ def create_table_in_doc(doc, table_data):
     
     return table
 
+class UploadBuffer(io.RawIOBase):
+    # Read-only file over one shared buffer (upload bytes or a memory-mapped job input). Reads
+    # slice the buffer, and getbuffer() hands out views of it, so extractors and hashing never
+    # hold a second copy of the whole upload
+    def __init__(self, name, buffer, mapping=None):
+        super().__init__()
+        self.name = name
+        self._view = memoryview(buffer).cast("B")
+        self._mapping = mapping
+        self._position = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        data = bytes(self._view[self._position:end])
+        self._position = max(self._position, end)
+        return data
+    
+    def readinto(self, target):
+        data = self.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._position = offset
+        return self._position
+    
+    def tell(self):
+        return self._position
+    
+    def getbuffer(self):
+        return self._view[:]
+    
+    def close(self):
+        if not self.closed:
+            try:
+                self._view.release()
+                if self._mapping is not None:
+                    self._mapping.close()
+            except BufferError:
+                # A caller still holds a view; the mapping is freed once that view is collected
+                pass
+        super().close()
+
+def open_upload_file(path, name=None):
+    # Job inputs are mapped rather than read, so a queue of large uploads costs page cache instead of heap
+    name = name or os.path.basename(path)
+    if not os.path.getsize(path):
+        return UploadBuffer(name, b"")
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return UploadBuffer(name, mapping, mapping)
+
+def upload_digest(uploaded_file):
+    with uploaded_file.getbuffer() as view:
+        return hashlib.sha1(view).hexdigest()
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+WORD_BODY_TAG = WORD_NAMESPACE + "body"
+WORD_PARAGRAPH_TAG = WORD_NAMESPACE + "p"
+WORD_TABLE_TAG = WORD_NAMESPACE + "tbl"
+WORD_RUN_TAG = WORD_NAMESPACE + "r"
+WORD_HYPERLINK_TAG = WORD_NAMESPACE + "hyperlink"
+WORD_BREAK_TAG = WORD_NAMESPACE + "br"
+# Text equivalents of run content, as python-docx renders Run.text
+WORD_RUN_TEXT = {
+    WORD_NAMESPACE + "tab": "\t",
+    WORD_NAMESPACE + "ptab": "\t",
+    WORD_NAMESPACE + "cr": "\n",
+    WORD_NAMESPACE + "noBreakHyphen": "-"
+}
+
+def docx_run_text(run):
+    parts = []
+    for child in run:
+        if child.tag == WORD_NAMESPACE + "t":
+            parts.append(child.text or "")
+        elif child.tag == WORD_BREAK_TAG:
+            # Page and column breaks have no text
+            if child.get(WORD_NAMESPACE + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag in WORD_RUN_TEXT:
+            parts.append(WORD_RUN_TEXT[child.tag])
+    return "".join(parts)
+
+def docx_paragraph_text(paragraph):
+    parts = []
+    for child in paragraph:
+        if child.tag == WORD_RUN_TAG:
+            parts.append(docx_run_text(child))
+        elif child.tag == WORD_HYPERLINK_TAG:
+            parts.extend(docx_run_text(run) for run in child.iterchildren(WORD_RUN_TAG))
+    return "".join(parts)
+
+def docx_table_rows(table):
+    # Same layout-grid semantics as python-docx Row.cells: a cell spanning columns (gridSpan) is
+    # repeated for each column and a vertically merged cell (vMerge) repeats the cell above it
+    rows = []
+    cells_above = {}
+    for row in table.iterchildren(WORD_NAMESPACE + "tr"):
+        grid_before = row.find(f"{WORD_NAMESPACE}trPr/{WORD_NAMESPACE}gridBefore")
+        grid_offset = int(grid_before.get(WORD_NAMESPACE + "val", 0)) if grid_before is not None else 0
+        row_cells = []
+        row_cells_by_offset = {}
+        
+        for cell in row.iterchildren(WORD_NAMESPACE + "tc"):
+            grid_span = cell.find(f"{WORD_NAMESPACE}tcPr/{WORD_NAMESPACE}gridSpan")
+            span = int(grid_span.get(WORD_NAMESPACE + "val", 1)) if grid_span is not None else 1
+            vertical_merge = cell.find(f"{WORD_NAMESPACE}tcPr/{WORD_NAMESPACE}vMerge")
+            
+            if vertical_merge is not None and vertical_merge.get(WORD_NAMESPACE + "val", "continue") == "continue" and grid_offset in cells_above:
+                # The merged cell keeps the width of the cell that starts the vertical span
+                cell_text, root_span = cells_above[grid_offset]
+            else:
+                cell_text = "\n".join(docx_paragraph_text(paragraph) for paragraph in cell.iterchildren(WORD_PARAGRAPH_TAG))
+                root_span = span
+            
+            row_cells_by_offset[grid_offset] = (cell_text, root_span)
+            row_cells.extend([cell_text] * root_span)
+            grid_offset += span
+        
+        cells_above = row_cells_by_offset
+        rows.append(row_cells)
+    return rows
+
+def format_docx_table(rows):
+    return "\n".join(" | ".join(cell_text.strip() for cell_text in row) for row in rows)
+
+def stream_docx_blocks(doc_file):
+    # Reads only word/document.xml from the package, one body element at a time; media parts are
+    # never opened and each paragraph/table is dropped from the tree once it has been read
+    with zipfile.ZipFile(doc_file) as package, package.open("word/document.xml") as document_xml:
+        depth = 0
+        body_depth = None
+        for event, element in etree.iterparse(document_xml, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if element.tag == WORD_BODY_TAG and body_depth is None:
+                    body_depth = depth
+                continue
+            
+            if body_depth is not None and depth == body_depth + 1:
+                if element.tag == WORD_PARAGRAPH_TAG:
+                    yield "paragraph", docx_paragraph_text(element)
+                elif element.tag == WORD_TABLE_TAG:
+                    yield "table", docx_table_rows(element)
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+            depth -= 1
+
 def extract_content_from_docx(doc_file):
+    # Paragraphs and tables in document order; python-docx is kept as a fallback for packages
+    # the streaming reader cannot handle
+    try:
+        content = []
+        for kind, block in stream_docx_blocks(doc_file):
+            if kind == "paragraph":
+                if block.strip():
+                    content.append(block.strip())
+            elif block:
+                content.append("TABLE:")
+                content.append(format_docx_table(block))
+        return "\n".join(content)
+    except Exception as e:
+        print(f"Streaming DOCX read failed, falling back to python-docx: {str(e)}")
+        doc_file.seek(0)
+        return extract_content_from_docx_document(doc_file)
+
+def extract_content_from_docx_document(doc_file):
+    # Same document order and table layout as the streaming reader, so a fallback does not change
+    # the extracted text or its block fingerprints
     doc = Document(doc_file)
     content = []
     
-    for paragraph in doc.paragraphs:
-        if paragraph.text.strip():
-            content.append(paragraph.text.strip())
-    
-    for table in doc.tables:
-        table_content = []
-        for row in table.rows:
-            row_text = [cell.text.strip() for cell in row.cells]
-            table_content.append(" | ".join(row_text))
-        if table_content:
-            content.append("TABLE:")
-            content.append("\n".join(table_content))
+    for element in doc.element.body.iterchildren():
+        if element.tag == WORD_PARAGRAPH_TAG:
+            paragraph_text = Paragraph(element, doc).text
+            if paragraph_text.strip():
+                content.append(paragraph_text.strip())
+        elif element.tag == WORD_TABLE_TAG:
+            rows = [[cell.text for cell in row.cells] for row in Table(element, doc).rows]
+            if rows:
+                content.append("TABLE:")
+                content.append(format_docx_table(rows))
     
     return "\n".join(content)
 
-def extract_content_from_pdf(pdf_file):
+PDF_REPEAT_MIN_PAGES = 3
+PDF_REPEAT_PAGE_RATIO = 0.1
+PDF_REPEAT_BAND_RATIO = 0.15
+PDF_REPEAT_POSITION_GRID = 4
+PDF_REPEAT_DIGITS_PATTERN = re.compile(r'\d+')
+
+def pdf_line_signature(line, page_height):
+    # Running headers/footers sit in the top or bottom band at the same height on every page;
+    # digits are masked so "Page 3 of 150" matches across pages
+    if PDF_REPEAT_BAND_RATIO * page_height < line["top"] and line["bottom"] < (1 - PDF_REPEAT_BAND_RATIO) * page_height:
+        return None
+    text = PDF_REPEAT_DIGITS_PATTERN.sub("#", " ".join(line["text"].split())).lower()
+    return (text, round(line["top"] / PDF_REPEAT_POSITION_GRID))
+
+def find_repeated_pdf_lines(pages_lines):
+    if len(pages_lines) < PDF_REPEAT_MIN_PAGES:
+        return set()
+    
+    page_counts = collections.Counter()
+    for page_height, lines in pages_lines:
+        page_counts.update({pdf_line_signature(line, page_height) for line in lines} - {None})
+    
+    min_pages = max(PDF_REPEAT_MIN_PAGES, PDF_REPEAT_PAGE_RATIO * len(pages_lines))
+    return {signature for signature, count in page_counts.items() if count >= min_pages}
+
+def outside_pdf_tables(table_bboxes):
+    def keep_object(obj):
+        if obj.get("object_type") != "char":
+            return True
+        x = (obj["x0"] + obj["x1"]) / 2
+        y = (obj["top"] + obj["bottom"]) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in table_bboxes)
+    return keep_object
+
+def format_pdf_table(rows):
+    # Multi-line cells are flattened so each table row stays on one line
+    return "\n".join(" | ".join(" ".join(str(cell).split()) if cell else "" for cell in row) for row in rows)
+
+OCR_RESOLUTION = 300
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "4"))
+OCR_TIME_BUDGET_SECONDS = float(os.environ.get("OCR_TIME_BUDGET_SECONDS", "120"))
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache"))
+
+def find_ocr_engine():
+    return shutil.which("tesseract")
+
+@st.cache_resource
+def get_ocr_executor():
+    # Every page is recognised by its own tesseract process; the pool only bounds how many run at once
+    return ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="pdf-ocr")
+
+def run_page_ocr(ocr_engine, image_bytes, cache_path, deadline):
+    # The timeout is taken when the page starts, not when it was queued
+    timeout = deadline - time.perf_counter()
+    if timeout <= 0:
+        raise subprocess.TimeoutExpired(ocr_engine, 0)
+    completed = subprocess.run(
+        [ocr_engine, "stdin", "stdout"],
+        input=image_bytes,
+        check=True,
+        capture_output=True,
+        timeout=timeout
+    )
+    text = completed.stdout.decode("utf-8", errors="replace").strip()
+    
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    except OSError as e:
+        print(f"Error saving OCR cache: {str(e)}")
+    
+    return text
+
+def pdf_page_digest(page):
+    # Content streams plus the raw bytes of every image on the page: a scan uploaded again, or inside
+    # another file, hits the cache without being rendered
+    digest = hashlib.sha1(f"{OCR_RESOLUTION}\x00{page.width}x{page.height}".encode("utf-8"))
+    for content_stream in page.page_obj.contents:
+        digest.update(resolve1(content_stream).get_data())
+    for image in page.images:
+        digest.update(image["stream"].get_rawdata() or b"")
+    return digest.hexdigest()
+
+def ocr_pdf_pages(pages):
+    # Pages are rendered here, one at a time, because pdfium is not thread-safe; recognition runs in
+    # parallel and everything shares one deadline per document
+    stats = {
+        "ocr_pages": [],
+        "ocr_cached_pages": [],
+        "ocr_skipped_pages": [],
+        "ocr_timed_out_pages": [],
+        "ocr_failed_pages": [],
+        "ocr_seconds": 0.0
+    }
+    ocr_engine = find_ocr_engine()
+    if not ocr_engine:
+        stats["ocr_unavailable"] = True
+        stats["ocr_skipped_pages"] = [page_number for page_number, _ in pages]
+        return {}, stats
+    
+    start = time.perf_counter()
+    deadline = start + OCR_TIME_BUDGET_SECONDS
+    executor = get_ocr_executor()
+    page_texts = {}
+    ocr_jobs = {}
+    
+    for page_number, page in pages:
+        if deadline <= time.perf_counter():
+            stats["ocr_skipped_pages"].append(page_number)
+            continue
+        
+        cache_path = os.path.join(OCR_CACHE_DIR, f"{pdf_page_digest(page)}.txt")
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                page_texts[page_number] = f.read()
+            stats["ocr_pages"].append(page_number)
+            stats["ocr_cached_pages"].append(page_number)
+            continue
+        
+        image_buffer = BytesIO()
+        page.to_image(resolution=OCR_RESOLUTION).original.convert("L").save(image_buffer, format="PNG")
+        image_bytes = image_buffer.getvalue()
+        
+        ocr_jobs[submit_profiled(executor, run_page_ocr, ocr_engine, image_bytes, cache_path, deadline)] = page_number
+    
+    done, not_done = wait(ocr_jobs, timeout=max(deadline - time.perf_counter(), 0))
+    running = set()
+    for future in not_done:
+        if future.cancel():
+            stats["ocr_skipped_pages"].append(ocr_jobs[future])
+        else:
+            running.add(future)
+    # Running pages are killed by their tesseract timeout at the deadline, so this wait is short
+    done |= wait(running).done
+    
+    for future in done:
+        page_number = ocr_jobs[future]
+        try:
+            page_texts[page_number] = future.result()
+            stats["ocr_pages"].append(page_number)
+        except subprocess.TimeoutExpired:
+            stats["ocr_timed_out_pages"].append(page_number)
+        except Exception as e:
+            print(f"OCR failed on page {page_number}: {str(e)}")
+            stats["ocr_failed_pages"].append(page_number)
+    
+    for key in ["ocr_pages", "ocr_skipped_pages", "ocr_timed_out_pages", "ocr_failed_pages"]:
+        stats[key].sort()
+    stats["ocr_seconds"] = round(time.perf_counter() - start, 2)
+    
+    return page_texts, stats
+
+def extract_content_from_pdf(pdf_file, report=None, ocr=True):
     content = []
+    tables_extracted = 0
     with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            if page.extract_text():
-                content.append(page.extract_text())
+        # Table cells are emitted once, as rows; the running text is read from the page with the
+        # table regions cropped out. extract_text_lines joins to the same text as extract_text but
+        # keeps each line's position
+        pages_lines = []
+        pages_tables = []
+        ocr_candidates = []
+        for page_number, page in enumerate(pdf.pages, 1):
+            tables = []
+            for table in page.find_tables():
+                rows = table.extract()
+                if rows:
+                    tables.append((table.bbox, rows))
+            
+            text_page = page.filter(outside_pdf_tables([bbox for bbox, _ in tables])) if tables else page
+            page_lines = text_page.extract_text_lines(return_chars=False)
+            pages_lines.append((page.height, page_lines))
+            pages_tables.append(tables)
+            
+            # Scanned pages have no text layer at all; only those go to OCR
+            if not page_lines and not tables:
+                ocr_candidates.append((page_number, page))
+        
+        ocr_texts = {}
+        if ocr_candidates and not ocr:
+            if report is not None:
+                report["ocr_memory_skipped_pages"] = [page_number for page_number, _ in ocr_candidates]
+        elif ocr_candidates:
+            ocr_texts, ocr_stats = ocr_pdf_pages(ocr_candidates)
+            if report is not None:
+                report.update(ocr_stats)
+        
+        repeated_lines = find_repeated_pdf_lines(pages_lines)
+        lines_removed = 0
+        chars_removed = 0
+        
+        for page_number, ((page_height, lines), tables) in enumerate(zip(pages_lines, pages_tables), 1):
+            page_items = []
+            for line in lines:
+                if repeated_lines and pdf_line_signature(line, page_height) in repeated_lines:
+                    lines_removed += 1
+                    chars_removed += len(line["text"]) + 1
+                    continue
+                page_items.append((line["top"], line["text"]))
+            for bbox, rows in tables:
+                page_items.append((bbox[1], "TABLE:\n" + format_pdf_table(rows)))
+                tables_extracted += 1
+            if ocr_texts.get(page_number):
+                page_items.append((0, ocr_texts[page_number]))
+            
+            # Tables go back between the text lines at the position they occupy on the page
+            page_items.sort(key=lambda item: item[0])
+            page_content = [text for _, text in page_items]
             
-            tables = page.extract_tables()
-            for table in tables:
-                if table:
-                    table_text = []
-                    for row in table:
-                        row_text = [str(cell) if cell else "" for cell in row]
-                        table_text.append(" | ".join(row_text))
-                    if table_text:
-                        content.append("TABLE:")
-                        content.append("\n".join(table_text))
+            content.extend(page_content)
+            if report is not None and page_content:
+                report.setdefault("blocks", []).append({
+                    "id": f"page::{page_number}",
+                    "kind": "page",
+                    "text": "\n".join(page_content)
+                })
+    
+    if report is not None:
+        report["repeated_lines_removed"] = lines_removed
+        report["repeated_chars_removed"] = chars_removed
+        report["tables_extracted"] = tables_extracted
     
     return "\n".join(content)
 
+EXCEL_STREAMING_MIN_ROWS = 5000
+# Deepest row a PART C capture can reach below its marker (Applications Impacted search,
+# header search and table rows)
+EXCEL_MARKER_WINDOW_ROWS = 40
+EXCEL_MARKER_KEYS = ("part b", "part c", "part e")
+
+def scan_excel_sheet_markers(worksheet, max_rows_per_sheet):
+    # Streams the sheet once to find how many data rows the PART B/C/E captures and the summary
+    # need. Stops as soon as every marker, its capture window and the row cap have been read, so
+    # later repeats of a marker on a huge sheet are not captured
+    rows_needed = max_rows_per_sheet
+    markers_found = set()
+    row_count = 0
+    
+    for row_number, row in enumerate(worksheet.iter_rows(values_only=True)):
+        if row_number == 0:
+            continue
+        data_row = row_number - 1
+        
+        for value in row:
+            if value is None or value == "":
+                continue
+            row_count = data_row + 1
+            if isinstance(value, str):
+                value_lower = value.lower()
+                for marker in EXCEL_MARKER_KEYS:
+                    if marker in value_lower:
+                        markers_found.add(marker)
+                        rows_needed = max(rows_needed, data_row + EXCEL_MARKER_WINDOW_ROWS)
+        
+        if len(markers_found) == len(EXCEL_MARKER_KEYS) and data_row + 1 >= rows_needed:
+            return rows_needed, None
+    
+    return rows_needed, row_count
+
+def read_excel_sheet(workbook_file, sheet_name, max_rows_per_sheet):
+    # Sheets past EXCEL_STREAMING_MIN_ROWS are read only as far as the marker captures and the
+    # row cap need, which keeps memory bounded on 100k-row workbooks
+    if workbook_file.engine == "openpyxl" and max_rows_per_sheet:
+        worksheet = workbook_file.book[sheet_name]
+        declared_rows = worksheet.max_row
+        if declared_rows is None or declared_rows > EXCEL_STREAMING_MIN_ROWS:
+            # The declared dimension can be stale; read to the real end of the sheet
+            worksheet.reset_dimensions()
+            rows_needed, row_count = scan_excel_sheet_markers(worksheet, max_rows_per_sheet)
+            if row_count is None:
+                row_count = max(declared_rows - 1, rows_needed) if declared_rows else rows_needed
+            return workbook_file.parse(sheet_name, nrows=rows_needed), row_count
+    
+    df = workbook_file.parse(sheet_name)
+    return df, len(df)
+
+def build_excel_cell_index(df):
+    # Stripped text of every cell plus the sorted non-empty rows of each column, built once per
+    # sheet so the PART B/C/E windows are slices instead of df.iloc probes
+    values = df.to_numpy(dtype=object)
+    text = np.full(values.shape, "", dtype=object)
+    for row_idx, col_idx in zip(*np.nonzero(pd.notna(values))):
+        text[row_idx, col_idx] = str(values[row_idx, col_idx]).strip()
+    present = text != ""
+    
+    return {
+        "text": text,
+        "present": present,
+        "column_rows": [np.flatnonzero(present[:, col_idx]) for col_idx in range(text.shape[1])]
+    }
+
+def excel_window_rows(cell_index, col_idx, start_row, end_row):
+    rows = cell_index["column_rows"][col_idx]
+    return rows[np.searchsorted(rows, max(start_row, 0)):np.searchsorted(rows, end_row)].tolist()
+
+def excel_window_content(cell_index, col_idx, start_row, end_row, keep_empty=False):
+    if keep_empty:
+        rows = range(max(start_row, 0), min(end_row, len(cell_index["text"])))
+    else:
+        rows = excel_window_rows(cell_index, col_idx, start_row, end_row)
+    return [{"row": row_idx + 2, "text": cell_index["text"][row_idx, col_idx]} for row_idx in rows]
+
+def excel_adjacent_content(cell_index, columns, col_idx, start_row, end_row, keep_empty=False):
+    adjacent_content = []
+    for adj_col_index in (col_idx - 1, col_idx + 1):
+        if 0 <= adj_col_index < len(columns):
+            for entry in excel_window_content(cell_index, adj_col_index, start_row, end_row, keep_empty):
+                adjacent_content.append({"column": columns[adj_col_index], **entry})
+    return adjacent_content
+
 def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_rows=10, visible_only=True):
     def clean_cell_value(cell_text):
         if cell_text is None:
@@ -1500,7 +2698,7 @@ def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_row
         
         return str_val
     
-    def extract_horizontal_table(df, start_row_idx, start_col_idx, table_identifier):
+    def extract_horizontal_table(df, cell_index, start_row_idx, start_col_idx, table_identifier):
         table_data = {
             "table_type": table_identifier,
             "headers": [],
@@ -1518,10 +2716,8 @@ def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_row
             for search_row in range(current_row, max_search_rows):
                 if search_row >= len(df):
                     break
-                    
-                row_data = df.iloc[search_row].values
                 
-                non_empty_cells = [str(cell).strip() for cell in row_data if pd.notna(cell) and str(cell).strip()]
+                non_empty_cells = cell_index["text"][search_row][cell_index["present"][search_row]].tolist()
                 
                 product_indicators = ['ULIP', 'Term', 'Endowment', 'Annuity', 'Health', 'Group', 'All']
                 app_indicators = ['OPUS', 'INSTAB', 'NGIN', 'PMAC', 'CRM', 'Cashier', 'Other']
@@ -1532,16 +2728,14 @@ def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_row
                     break
             
             if found_headers and header_row_idx is not None:
-                header_row = df.iloc[header_row_idx]
                 headers = []
                 header_positions = []
                 
-                for col_idx, cell_value in enumerate(header_row):
-                    if pd.notna(cell_value) and str(cell_value).strip():
-                        clean_header = clean_cell_value(cell_value)
-                        if clean_header != "-" and not clean_header.startswith("Insert"):
-                            headers.append(clean_header)
-                            header_positions.append(col_idx)
+                for col_idx in np.flatnonzero(cell_index["present"][header_row_idx]).tolist():
+                    clean_header = clean_cell_value(cell_index["text"][header_row_idx, col_idx])
+                    if clean_header != "-" and not clean_header.startswith("Insert"):
+                        headers.append(clean_header)
+                        header_positions.append(col_idx)
                 
                 table_data["headers"] = headers
                 
@@ -1601,6 +2795,158 @@ def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_row
         
         return "\n".join([header_line, separator_line] + data_lines)
     
+    def process_sheet(sheet_name, df, original_row_count):
+        sheet_result = {
+            "part_b": [],
+            "part_c": [],
+            "part_e": [],
+            "sheet": None,
+            "detailed_requirements_found": False
+        }
+        
+        cell_index = build_excel_cell_index(df)
+        
+        for col_idx, col in enumerate(df.columns):
+            for row_idx in cell_index["column_rows"][col_idx].tolist():
+                cell_str = cell_index["text"][row_idx, col_idx]
+                cell_lower = cell_str.lower()
+                
+                if "part c" in cell_lower:
+                    part_c_entry = {
+                        "sheet_name": sheet_name,
+                        "column": col,
+                        "row": row_idx + 2,
+                        "header": cell_str,
+                        "content": excel_window_content(cell_index, col_idx, row_idx + 1, row_idx + 10),
+                        "adjacent_content": excel_adjacent_content(cell_index, df.columns, col_idx, row_idx - 2, row_idx + 8),
+                        "horizontal_tables": []
+                    }
+                    
+                    for table_identifier, search_rows in [("Products Impacted", 15), ("Applications Impacted", 20)]:
+                        for search_row in excel_window_rows(cell_index, col_idx, row_idx + 1, row_idx + search_rows):
+                            if table_identifier in cell_index["text"][search_row, col_idx]:
+                                horizontal_table = extract_horizontal_table(df, cell_index, search_row, col_idx, table_identifier)
+                                if horizontal_table["headers"]:
+                                    part_c_entry["horizontal_tables"].append(horizontal_table)
+                                break
+                    
+                    sheet_result["part_c"].append(part_c_entry)
+                
+                if "part b" in cell_lower:
+                    sheet_result["part_b"].append({
+                        "sheet_name": sheet_name,
+                        "column": col,
+                        "row": row_idx + 2,
+                        "header": cell_str,
+                        "content": excel_window_content(cell_index, col_idx, row_idx + 1, row_idx + 10),
+                        "adjacent_content": excel_adjacent_content(cell_index, df.columns, col_idx, row_idx - 2, row_idx + 8)
+                    })
+                
+                if "part e" in cell_lower:
+                    # PART E keeps exactly the next 8 rows, empty cells included, so answers stay
+                    # aligned with their questions
+                    sheet_result["part_e"].append({
+                        "sheet_name": sheet_name,
+                        "column": col,
+                        "row": row_idx + 2,
+                        "header": cell_str,
+                        "content": excel_window_content(cell_index, col_idx, row_idx + 1, row_idx + 9, keep_empty=True),
+                        "adjacent_content": excel_adjacent_content(cell_index, df.columns, col_idx, row_idx + 1, row_idx + 9, keep_empty=True),
+                        "detailed_responses": []
+                    })
+        
+        if max_rows_per_sheet and len(df) > max_rows_per_sheet:
+            df = df.head(max_rows_per_sheet)
+        
+        sheet_data = {
+            "sheet_name": sheet_name,
+            "dimensions": {
+                "rows": original_row_count,
+                "columns": len(df.columns),
+                "processed_rows": len(df)
+            },
+            "columns": {
+                "names": [clean_cell_value(col) for col in df.columns.tolist()],
+                "data_types": {clean_cell_value(col): str(dtype) for col, dtype in df.dtypes.to_dict().items()},
+                "numeric_columns": [clean_cell_value(col) for col in df.select_dtypes(include=['number']).columns.tolist()],
+                "key_columns": []
+            },
+            "sample_data": [],
+            "detailed_requirements": [],
+            "data_summary": {
+                "missing_data": {},
+                "unique_value_counts": {}
+            }
+        }
+        
+        for col in df.columns:
+            col_lower = str(col).lower()
+            if any(keyword in col_lower for keyword in ['id', 'name', 'title', 'status', 'type', 'category', 'priority', 'requirement']):
+                sheet_data["columns"]["key_columns"].append(clean_cell_value(col))
+        
+        sample_size = min(max_sample_rows, len(df))
+        if sample_size > 0:
+            display_df = df.head(sample_size)
+            
+            for _, row in display_df.iterrows():
+                row_data = {}
+                for col, val in row.items():
+                    cleaned_val = clean_cell_value(val)
+                    if len(cleaned_val) > 50:
+                        cleaned_val = cleaned_val[:47] + "..."
+                    row_data[clean_cell_value(col)] = cleaned_val
+                sheet_data["sample_data"].append(row_data)
+        
+        for col in df.columns:
+            col_str = str(col).lower()
+            if any(keyword in col_str for keyword in ['requirement', 'detailed', 'description', 'specification']):
+                req_column = {
+                    "column_name": clean_cell_value(col),
+                    "requirements": []
+                }
+                
+                for idx, cell_value in enumerate(df[col]):
+                    if pd.notna(cell_value) and str(cell_value).strip():
+                        cell_text = str(cell_value).strip()
+                        if len(cell_text) > 10:
+                            req_column["requirements"].append({
+                                "row": idx + 2,
+                                "text": cell_text
+                            })
+                
+                if req_column["requirements"]:
+                    sheet_data["detailed_requirements"].append(req_column)
+                    sheet_result["detailed_requirements_found"] = True
+        
+        for col in sheet_data["columns"]["key_columns"][:3]:
+            if col in df.columns and df[col].dtype == 'object':
+                unique_vals = df[col].dropna().unique()
+                if len(unique_vals) <= 20:
+                    sheet_data["data_summary"]["unique_value_counts"][col] = [clean_cell_value(val) for val in unique_vals[:10]]
+                else:
+                    sheet_data["data_summary"]["unique_value_counts"][col] = f"{len(unique_vals)} unique values"
+        
+        missing_data = df.isnull().sum()
+        if missing_data.sum() > 0:
+            missing_cols = missing_data[missing_data > 0].head(5)
+            sheet_data["data_summary"]["missing_data"] = {clean_cell_value(col): int(count) for col, count in missing_cols.items()}
+        
+        sheet_result["sheet"] = sheet_data
+        return sheet_result
+    
+    def merge_sheet_result(sheet_result):
+        for part in ["part_b", "part_c", "part_e"]:
+            if sheet_result[part]:
+                result["priority_content"][part].extend(sheet_result[part])
+                result["summary"][f"{part}_found"] = True
+        if sheet_result["detailed_requirements_found"]:
+            result["summary"]["detailed_requirements_found"] = True
+        
+        sheet_data = sheet_result["sheet"]
+        result["sheets"].append(sheet_data)
+        result["summary"]["total_rows_processed"] += sheet_data["dimensions"]["processed_rows"]
+        result["summary"]["total_columns_processed"] += sheet_data["dimensions"]["columns"]
+    
     result = {
         "metadata": {
             "total_sheets": 0,
@@ -1626,306 +2972,34 @@ def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_row
     }
     
     try:
-        if visible_only:
-            wb = load_workbook(excel_file)
-            visible_sheets = []
-            
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-                if sheet.sheet_state == 'visible':
-                    visible_sheets.append(sheet_name)
-            
-            if visible_sheets:
-                excel_data = pd.read_excel(excel_file, sheet_name=visible_sheets)
-            else:
-                result["metadata"]["processing_status"] = "error"
-                result["metadata"]["error"] = "No visible sheets found in the Excel file"
-                return json.dumps(result, indent=2)
-            
-            if not isinstance(excel_data, dict):
-                excel_data = {visible_sheets[0]: excel_data}
-        else:
-            excel_data = pd.read_excel(excel_file, sheet_name=None)
-        
-        result["metadata"]["total_sheets"] = len(excel_data)
-        
-        for sheet_name, df in excel_data.items():
-            if df.empty:
-                continue
-                
-            for col_idx, col in enumerate(df.columns):
-                for row_idx, cell_value in enumerate(df[col]):
-                    cell_str = str(cell_value).strip()
-                    part_c_patterns = [
-                        "PART C : (Mandatory) Detailed Requirement",
-                        "PART C (Mandatory) Detailed Requirement", 
-                        "PART C : Mandatory Detailed Requirement",
-                        "PART C Mandatory Detailed Requirement",
-                        "PART C : Detailed Requirement",
-                        "PART C Detailed Requirement",
-                        "PART C:",
-                        "Part C :",
-                        "Part C:",
-                        "PART C"
-                    ]
-                    
-                    for pattern in part_c_patterns:
-                        if pattern.lower() in cell_str.lower():
-                            part_c_entry = {
-                                "sheet_name": sheet_name,
-                                "column": col,
-                                "row": row_idx + 2,
-                                "header": cell_str,
-                                "content": [],
-                                "adjacent_content": [],
-                                "horizontal_tables": []
-                            }
-                            
-                            for next_row in range(row_idx + 1, min(row_idx + 10, len(df))):
-                                if next_row < len(df):
-                                    next_cell = df.iloc[next_row][col]
-                                    if pd.notna(next_cell) and str(next_cell).strip():
-                                        part_c_entry["content"].append({
-                                            "row": next_row + 2,
-                                            "text": str(next_cell).strip()
-                                        })
-                            
-                            for adj_col_offset in [-1, 1]:
-                                adj_col_index = col_idx + adj_col_offset
-                                if 0 <= adj_col_index < len(df.columns):
-                                    adj_col = df.columns[adj_col_index]
-                                    for adj_row in range(max(0, row_idx-2), min(row_idx + 8, len(df))):
-                                        adj_cell = df.iloc[adj_row][adj_col]
-                                        if pd.notna(adj_cell) and str(adj_cell).strip():
-                                            part_c_entry["adjacent_content"].append({
-                                                "column": adj_col,
-                                                "row": adj_row + 2,
-                                                "text": str(adj_cell).strip()
-                                            })
-                            
-
-                            for search_row in range(row_idx + 1, min(row_idx + 15, len(df))):
-                                if search_row < len(df):
-                                    search_cell = df.iloc[search_row][col]
-                                    if pd.notna(search_cell) and "Products Impacted" in str(search_cell):
-                                        products_table = extract_horizontal_table(df, search_row, col_idx, "Products Impacted")
-                                        if products_table["headers"]:
-                                            part_c_entry["horizontal_tables"].append(products_table)
-                                        break
-                            
-                            for search_row in range(row_idx + 1, min(row_idx + 20, len(df))):
-                                if search_row < len(df):
-                                    search_cell = df.iloc[search_row][col]
-                                    if pd.notna(search_cell) and "Applications Impacted" in str(search_cell):
-                                        apps_table = extract_horizontal_table(df, search_row, col_idx, "Applications Impacted")
-                                        if apps_table["headers"]:
-                                            part_c_entry["horizontal_tables"].append(apps_table)
-                                        break
-                            
-                            result["priority_content"]["part_c"].append(part_c_entry)
-                            result["summary"]["part_c_found"] = True
-                            break
-        
-        for sheet_name, df in excel_data.items():
-            if df.empty:
-                continue
+        # One read-only workbook serves the visibility check, the marker scan of large sheets and
+        # the DataFrame reads
+        with pd.ExcelFile(excel_file) as workbook_file:
+            if visible_only:
+                visible_sheets = []
                 
-            for col_idx, col in enumerate(df.columns):
-                for row_idx, cell_value in enumerate(df[col]):
-                    cell_str = str(cell_value).strip()
-                    part_b_patterns = [
-                        "PART B : (Mandatory) Detailed Requirement",
-                        "PART B (Mandatory) Detailed Requirement", 
-                        "PART B : Mandatory Detailed Requirement",
-                        "PART B Mandatory Detailed Requirement",
-                        "PART B : Detailed Requirement",
-                        "PART B Detailed Requirement",
-                        "PART B:",
-                        "Part B :",
-                        "Part B:",
-                        "PART B"
-                    ]
-                    
-                    for pattern in part_b_patterns:
-                        if pattern.lower() in cell_str.lower():
-                            part_b_entry = {
-                                "sheet_name": sheet_name,
-                                "column": col,
-                                "row": row_idx + 2,
-                                "header": cell_str,
-                                "content": [],
-                                "adjacent_content": []
-                            }
-                            
-                            for next_row in range(row_idx + 1, min(row_idx + 10, len(df))):
-                                if next_row < len(df):
-                                    next_cell = df.iloc[next_row][col]
-                                    if pd.notna(next_cell) and str(next_cell).strip():
-                                        part_b_entry["content"].append({
-                                            "row": next_row + 2,
-                                            "text": str(next_cell).strip()
-                                        })
-                            
-                            for adj_col_offset in [-1, 1]:
-                                adj_col_index = col_idx + adj_col_offset
-                                if 0 <= adj_col_index < len(df.columns):
-                                    adj_col = df.columns[adj_col_index]
-                                    for adj_row in range(max(0, row_idx-2), min(row_idx + 8, len(df))):
-                                        adj_cell = df.iloc[adj_row][adj_col]
-                                        if pd.notna(adj_cell) and str(adj_cell).strip():
-                                            part_b_entry["adjacent_content"].append({
-                                                "column": adj_col,
-                                                "row": adj_row + 2,
-                                                "text": str(adj_cell).strip()
-                                            })
-                            
-                            result["priority_content"]["part_b"].append(part_b_entry)
-                            result["summary"]["part_b_found"] = True
-                            break
-
-        part_e_patterns = [
-            "PART E : (Mandatory/Optional)",
-            "PART E (Mandatory/Optional)",
-            "PART E:",
-            "Part E :",
-            "Part E:",
-            "PART E"
-        ]
-
-        for sheet_name, df in excel_data.items():
-            if df.empty:
-                continue
-
-            for col_idx, col in enumerate(df.columns):
-                for row_idx, cell_value in enumerate(df[col]):
-                    cell_str = str(cell_value).strip()
-
-                    for pattern in part_e_patterns:
-                        if pattern.lower() in cell_str.lower():
-                            part_e_entry = {
-                                "sheet_name": sheet_name,
-                                "column": col,
-                                "row": row_idx + 2,
-                                "header": cell_str,
-                                "content": [],
-                                "adjacent_content": [],
-                                "detailed_responses": []
-                            }
-
-                            # ↓ Collect exactly next 8 rows (dynamic but fixed count)
-                            for offset in range(1, 9):
-                                next_row = row_idx + offset
-                                if next_row < len(df):
-                                    next_cell = df.iloc[next_row][col]
-                                    part_e_entry["content"].append({
-                                        "row": next_row + 2,
-                                        "text": "" if pd.isna(next_cell) else str(next_cell).strip()
-                                    })
-
-                            # ↓ Collect adjacent values for same 8 rows
-                            for adj_col_offset in [-1, 1]:
-                                adj_col_index = col_idx + adj_col_offset
-                                if 0 <= adj_col_index < len(df.columns):
-                                    adj_col = df.columns[adj_col_index]
-                                    for offset in range(1, 9):
-                                        next_row = row_idx + offset
-                                        if next_row < len(df):
-                                            adj_cell = df.iloc[next_row][adj_col]
-                                            part_e_entry["adjacent_content"].append({
-                                                "column": adj_col,
-                                                "row": next_row + 2,
-                                                "text": "" if pd.isna(adj_cell) else str(adj_cell).strip()
-                                            })
-
-                            result["priority_content"]["part_e"].append(part_e_entry)
-                            result["summary"]["part_e_found"] = True
-                            break
-
-
-        for sheet_name, df in excel_data.items():
-            if df.empty:
-                continue
-            
-            original_row_count = len(df)
-            if max_rows_per_sheet and len(df) > max_rows_per_sheet:
-                df = df.head(max_rows_per_sheet)
-            
-            sheet_data = {
-                "sheet_name": sheet_name,
-                "dimensions": {
-                    "rows": original_row_count,
-                    "columns": len(df.columns),
-                    "processed_rows": len(df)
-                },
-                "columns": {
-                    "names": [clean_cell_value(col) for col in df.columns.tolist()],
-                    "data_types": {clean_cell_value(col): str(dtype) for col, dtype in df.dtypes.to_dict().items()},
-                    "numeric_columns": [clean_cell_value(col) for col in df.select_dtypes(include=['number']).columns.tolist()],
-                    "key_columns": []
-                },
-                "sample_data": [],
-                "detailed_requirements": [],
-                "data_summary": {
-                    "missing_data": {},
-                    "unique_value_counts": {}
-                }
-            }
-            
-            for col in df.columns:
-                col_lower = str(col).lower()
-                if any(keyword in col_lower for keyword in ['id', 'name', 'title', 'status', 'type', 'category', 'priority', 'requirement']):
-                    sheet_data["columns"]["key_columns"].append(clean_cell_value(col))
-            
-            sample_size = min(max_sample_rows, len(df))
-            if sample_size > 0:
-                display_df = df.head(sample_size)
+                for sheet_name in workbook_file.book.sheetnames:
+                    sheet = workbook_file.book[sheet_name]
+                    if sheet.sheet_state == 'visible':
+                        visible_sheets.append(sheet_name)
                 
-                for _, row in display_df.iterrows():
-                    row_data = {}
-                    for col, val in row.items():
-                        cleaned_val = clean_cell_value(val)
-                        if len(cleaned_val) > 50:
-                            cleaned_val = cleaned_val[:47] + "..."
-                        row_data[clean_cell_value(col)] = cleaned_val
-                    sheet_data["sample_data"].append(row_data)
-            
-            for col in df.columns:
-                col_str = str(col).lower()
-                if any(keyword in col_str for keyword in ['requirement', 'detailed', 'description', 'specification']):
-                    req_column = {
-                        "column_name": clean_cell_value(col),
-                        "requirements": []
-                    }
-                    
-                    for idx, cell_value in enumerate(df[col]):
-                        if pd.notna(cell_value) and str(cell_value).strip():
-                            cell_text = str(cell_value).strip()
-                            if len(cell_text) > 10:
-                                req_column["requirements"].append({
-                                    "row": idx + 2,
-                                    "text": cell_text
-                                })
-                    
-                    if req_column["requirements"]:
-                        sheet_data["detailed_requirements"].append(req_column)
-                        result["summary"]["detailed_requirements_found"] = True
-            
-            for col in sheet_data["columns"]["key_columns"][:3]:
-                if col in df.columns and df[col].dtype == 'object':
-                    unique_vals = df[col].dropna().unique()
-                    if len(unique_vals) <= 20:
-                        sheet_data["data_summary"]["unique_value_counts"][col] = [clean_cell_value(val) for val in unique_vals[:10]]
-                    else:
-                        sheet_data["data_summary"]["unique_value_counts"][col] = f"{len(unique_vals)} unique values"
+                if not visible_sheets:
+                    result["metadata"]["processing_status"] = "error"
+                    result["metadata"]["error"] = "No visible sheets found in the Excel file"
+                    return json.dumps(result, indent=2)
+            else:
+                visible_sheets = workbook_file.sheet_names
             
-            missing_data = df.isnull().sum()
-            if missing_data.sum() > 0:
-                missing_cols = missing_data[missing_data > 0].head(5)
-                sheet_data["data_summary"]["missing_data"] = {clean_cell_value(col): int(count) for col, count in missing_cols.items()}
+            result["metadata"]["total_sheets"] = len(visible_sheets)
             
-            result["sheets"].append(sheet_data)
-            result["summary"]["total_rows_processed"] += len(df)
-            result["summary"]["total_columns_processed"] += len(df.columns)
+            # Each sheet is processed as soon as it is read, so only one DataFrame is alive at a time.
+            # Sheet processing is pure Python and holds the GIL; a thread pool measured no faster on
+            # a 36-tab workbook
+            for sheet_name in visible_sheets:
+                df, original_row_count = read_excel_sheet(workbook_file, sheet_name, max_rows_per_sheet)
+                if not df.empty:
+                    merge_sheet_result(process_sheet(sheet_name, df, original_row_count))
+                del df
     
     except Exception as e:
         result["metadata"]["processing_status"] = "error"
@@ -1933,27 +3007,133 @@ def extract_content_from_excel(excel_file, max_rows_per_sheet=70, max_sample_row
     
     return json.dumps(result, indent=2, ensure_ascii=False)
 
-def extract_content_from_msg(msg_file):
+MSG_CLEANUP_PATTERNS = [
+    re.compile(r'^(From|To|Cc|Subject|Sent|Date):.*?\n', re.MULTILINE),
+    re.compile(r'_{10,}[\s\S]*$'),
+    re.compile(r'-{10,}[\s\S]*$'),
+    re.compile(r'DISCLAIMER:[\s\S]*?customercare@bajajallianz\.co\.in')
+]
+MSG_ATTACHMENT_EXTENSIONS = ("docx", "pdf", "xlsx")
+MSG_ATTACHMENT_MAX_BYTES = int(os.environ.get("MSG_ATTACHMENT_MAX_MB", "20")) * 1024 * 1024
+MSG_MAX_NESTING_DEPTH = 3
+MSG_ATTACHMENT_WORKERS = int(os.environ.get("MSG_ATTACHMENT_WORKERS", "4"))
+
+@st.cache_resource
+def get_msg_attachment_executor():
+    return ThreadPoolExecutor(max_workers=MSG_ATTACHMENT_WORKERS, thread_name_prefix="msg-attachment")
+
+def clean_msg_body(body_content):
+    cleaned_body = body_content or ""
+    for pattern in MSG_CLEANUP_PATTERNS:
+        cleaned_body = pattern.sub('', cleaned_body)
+    return cleaned_body.strip()
+
+def queue_msg_attachment(attachment, source_name, depth, seen_digests, parts, attachment_log, degradation=None):
+    executor = get_msg_attachment_executor()
+    attachment_name = attachment.longFilename or attachment.shortFilename or attachment.name or "attachment"
+    attachment_data = attachment.data
+    
+    if isinstance(attachment_data, extract_msg.MSGFile):
+        label = f"{source_name} / {getattr(attachment_data, 'subject', None) or attachment_name}"
+        if depth >= MSG_MAX_NESTING_DEPTH:
+            attachment_log.append({"name": label, "status": "skipped", "reason": "nested too deep"})
+            return
+        body = clean_msg_body(getattr(attachment_data, "body", ""))
+        log_entry = {"name": label, "status": "extracted", "characters": len(body)}
+        parts.append((label, body, log_entry))
+        attachment_log.append(log_entry)
+        queue_msg_attachments(attachment_data, label, depth + 1, seen_digests, parts, attachment_log, degradation)
+        return
+    
+    label = f"{source_name} / {attachment_name}"
+    if not isinstance(attachment_data, bytes) or attachment_name.split('.')[-1].lower() not in MSG_ATTACHMENT_EXTENSIONS:
+        attachment_log.append({"name": label, "status": "skipped", "reason": "unsupported type"})
+        return
+    if len(attachment_data) > MSG_ATTACHMENT_MAX_BYTES:
+        attachment_log.append({"name": label, "status": "skipped", "reason": f"larger than {MSG_ATTACHMENT_MAX_BYTES // (1024 * 1024)} MB"})
+        return
+    
+    attachment_file = UploadBuffer(attachment_name, attachment_data)
+    digest = upload_digest(attachment_file)
+    if digest in seen_digests:
+        attachment_log.append({"name": label, "status": "skipped", "reason": f"same file as {seen_digests[digest]}"})
+        return
+    seen_digests[digest] = label
+    
+    log_entry = {"name": label, "status": "extracted"}
+    parts.append((label, submit_profiled(executor, extract_uploaded_file, attachment_file, None, None, degradation), log_entry))
+    attachment_log.append(log_entry)
+
+def queue_msg_attachments(msg, source_name, depth, seen_digests, parts, attachment_log, degradation=None):
+    # Embedded messages are unpacked in place; file attachments go to the worker pool and keep
+    # their slot in parts, so the assembled text follows the message order. An attachment
+    # extract_msg cannot read is logged and skipped, never allowed to lose the message body
     try:
-        temp_file = BytesIO(msg_file.getvalue())
-        temp_file.name = msg_file.name
-        
-        msg = extract_msg.Message(temp_file)
-        body_content = msg.body
+        attachments = list(msg.attachments)
+    except Exception as e:
+        attachment_log.append({"name": f"{source_name} / attachments", "status": "failed", "reason": str(e)})
+        return
+    
+    for attachment_idx, attachment in enumerate(attachments):
+        try:
+            queue_msg_attachment(attachment, source_name, depth, seen_digests, parts, attachment_log, degradation)
+        except Exception as e:
+            attachment_log.append({"name": f"{source_name} / attachment {attachment_idx + 1}", "status": "failed", "reason": str(e)})
+
+def extract_content_from_msg(msg_file, report=None, uploaded_digests=None, degradation=None):
+    try:
+        # olefile reads the upload in place; no copy of the message bytes is made
+        msg_file.seek(0)
+        msg = extract_msg.Message(msg_file)
         
-        cleaned_body = re.sub(r'^(From|To|Cc|Subject|Sent|Date):.*?\n', '', body_content, flags=re.MULTILINE)
-        cleaned_body = re.sub(r'_{10,}[\s\S]*$', '', cleaned_body)
-        cleaned_body = re.sub(r'-{10,}[\s\S]*$', '', cleaned_body)
+        try:
+            content = [clean_msg_body(msg.body)]
+            parts = []
+            attachment_log = []
+            # Attachments also sent as separate uploads are skipped here, as are repeats inside the thread
+            queue_msg_attachments(msg, msg_file.name, 1, dict(uploaded_digests or {}), parts, attachment_log, degradation)
+            
+            for label, part, log_entry in parts:
+                if not isinstance(part, str):
+                    try:
+                        part = (part.result() or "").strip()
+                    except Exception as e:
+                        log_entry["status"] = "failed"
+                        log_entry["reason"] = str(e)
+                        continue
+                    log_entry["characters"] = len(part)
+                if part:
+                    content.append(f"=== ATTACHMENT: {label} ===")
+                    content.append(part)
+        finally:
+            msg.close()
         
-        disclaimer_pattern = r'DISCLAIMER:[\s\S]*?customercare@bajajallianz\.co\.in'
-        cleaned_body = re.sub(disclaimer_pattern, '', cleaned_body)
+        if report is not None:
+            report["attachments"] = attachment_log
         
-        return cleaned_body.strip()
+        return "\n\n".join(section for section in content if section)
     
     except Exception as e:
         st.error(f"Error processing MSG file: {str(e)}")
         return ""
 
+def extract_uploaded_file(uploaded_file, report=None, uploaded_digests=None, degradation=None):
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    
+    if file_extension == 'txt':
+        with uploaded_file.getbuffer() as view:
+            return str(view, "utf-8")
+    elif file_extension == 'docx':
+        return extract_content_from_docx(uploaded_file)
+    elif file_extension == 'pdf':
+        return extract_content_from_pdf(uploaded_file, report, ocr=degradation is None or degradation["ocr"])
+    elif file_extension in ['xlsx', 'xls']:
+        return extract_content_from_excel(uploaded_file, **(degradation["excel"] if degradation else {}))
+    elif file_extension == 'msg':
+        return extract_content_from_msg(uploaded_file, report, uploaded_digests, degradation)
+    
+    return None
+
 def add_header_with_logo(doc, logo_bytes):
     section = doc.sections[0]
     header = section.header
@@ -1963,7 +3143,8 @@ def add_header_with_logo(doc, logo_bytes):
     logo_stream = BytesIO(logo_bytes)
     run.add_picture(logo_stream, width=Inches(1.5))
 
-def create_word_document(content):
+@st.cache_resource
+def build_docx_skeleton():
     doc = Document()
     
     # if logo_data:
@@ -2002,6 +3183,50 @@ def create_word_document(content):
     
     doc.add_page_break()
     
+    # Cover page, version/sign-off tables and TOC never change between exports, so the
+    # skeleton is built once per process and every export starts from a copy of its bytes
+    skeleton_buffer = BytesIO()
+    doc.save(skeleton_buffer)
+    
+    return skeleton_buffer.getvalue(), bookmark_mapping
+
+DOCX_SECTION_CACHE = {}
+DOCX_SECTION_CACHE_LOCK = threading.Lock()
+DOCX_SECTION_CACHE_MAX_ENTRIES = 512
+
+def append_cached_docx_section(doc, cache_key, render_section):
+    # Rendered body elements are cached per section, so re-exporting a BRD after one section
+    # was regenerated only runs python-docx for that section and copies the rest
+    body = doc.element.body
+    sect_pr = body.sectPr
+    
+    with DOCX_SECTION_CACHE_LOCK:
+        cached_elements = DOCX_SECTION_CACHE.get(cache_key)
+    
+    if cached_elements is not None:
+        for element in cached_elements:
+            element_copy = copy.deepcopy(element)
+            if sect_pr is not None:
+                sect_pr.addprevious(element_copy)
+            else:
+                body.append(element_copy)
+        return
+    
+    trailing = 1 if sect_pr is not None else 0
+    start = len(body) - trailing
+    render_section()
+    rendered_elements = [copy.deepcopy(element) for element in body[start:len(body) - trailing]]
+    
+    with DOCX_SECTION_CACHE_LOCK:
+        if len(DOCX_SECTION_CACHE) >= DOCX_SECTION_CACHE_MAX_ENTRIES:
+            DOCX_SECTION_CACHE.pop(next(iter(DOCX_SECTION_CACHE)))
+        DOCX_SECTION_CACHE[cache_key] = rendered_elements
+
+def create_word_document(content):
+    skeleton_bytes, bookmark_mapping = build_docx_skeleton()
+    doc = Document(BytesIO(skeleton_bytes))
+    bookmark_mapping = dict(bookmark_mapping)
+    
     sections = content.split('##')
     
     introduction_started = False
@@ -2028,96 +3253,1279 @@ def create_word_document(content):
                 section_name_lower = heading_text.lower()
                 if 'introduction' in section_name_lower or section_name_lower.startswith('1.0'):
                     introduction_started = True
-            
-                if level == 1 and i > 0 and not introduction_started:
-                    doc.add_page_break()
-            
-                if bookmark_name:
-                    add_section_with_bookmark(doc, heading_text, bookmark_name, level)
-                else:
-                    doc.add_heading(heading_text, level)
-            
-                j = 1
-                while j < len(lines):
-                    line = lines[j].strip()
                 
-                    if line and '|' in line and line.count('|') >= 2:
-                        table_lines = []
-                        while j < len(lines) and lines[j].strip() and '|' in lines[j]:
-                            table_lines.append(lines[j].strip())
-                            j += 1
-                    
-                        if table_lines:
-                            table_data = parse_markdown_table('\n'.join(table_lines))
-                            if table_data:
-                                create_table_in_doc(doc, table_data)
-                        continue
+                add_page_break = level == 1 and i > 0 and not introduction_started
                 
-                    if line:
-                        if line.startswith('- ') or line.startswith('* '):
-                            doc.add_paragraph(line[2:].strip(), style='List Bullet')
-                        elif re.match(r'^\d+\.', line):
-                            doc.add_paragraph(re.sub(r'^\d+\.\s*', '', line), style='List Bullet')
-                        else:
-                            doc.add_paragraph(line)
+                def render_section():
+                    if add_page_break:
+                        doc.add_page_break()
                 
-                    j += 1
+                    if bookmark_name:
+                        add_section_with_bookmark(doc, heading_text, bookmark_name, level)
+                    else:
+                        doc.add_heading(heading_text, level)
+                
+                    j = 1
+                    while j < len(lines):
+                        line = lines[j].strip()
+                    
+                        if line and is_markdown_table_row(line):
+                            table, j = collect_markdown_table(lines, j)
+                            if table:
+                                create_table_in_doc(doc, [table["header"]] + table["rows"])
+                            continue
+                    
+                        if line:
+                            if line.startswith('- ') or line.startswith('* '):
+                                doc.add_paragraph(line[2:].strip(), style='List Bullet')
+                            elif re.match(r'^\d+\.', line):
+                                doc.add_paragraph(re.sub(r'^\d+\.\s*', '', line), style='List Bullet')
+                            else:
+                                doc.add_paragraph(line)
+                    
+                        j += 1
+                
+                cache_key = hashlib.sha1(f"{add_page_break}\x00{section}".encode("utf-8")).hexdigest()
+                append_cached_docx_section(doc, cache_key, render_section)
     
     return doc
 
-def inject_apis_table_into_section(full_text: str, api_table_md: str) -> str:
+def inject_api_table(brd_sections, api_table_md):
     if not api_table_md:
-        return full_text
-    lower = full_text.lower()
-    start_markers = ["### 2.3 list of apis required", "## 2.3 list of apis required"]
-    end_markers = ["## 3.0", "### 3.0", "## 3.0 process", "### 3.0 process"]
-    start_idx = -1
-    for m in start_markers:
-        i = lower.find(m)
-        if i != -1:
-            start_idx = i
-            break
-    if start_idx == -1:
-        return full_text
-    # Find end of header line
-    header_end = full_text.find('\n', start_idx)
-    if header_end == -1:
-        header_end = start_idx
-    end_idx = len(full_text)
-    for m in end_markers:
-        j = lower.find(m, header_end + 1)
-        if j != -1:
-            end_idx = min(end_idx, j)
-    header_text = full_text[start_idx:header_end]
-    original_body = full_text[header_end:end_idx]
+        return False
+    original_body = get_section_text(brd_sections, "2.3")
+    if original_body is None:
+        return False
     # Remove default "No specific APIs" lines from original body
     cleaned_body = "\n".join([
         ln for ln in original_body.split('\n')
         if 'no specific apis' not in ln.lower()
     ]).strip()
-    new_section = header_text + "\n\n" + api_table_md + ("\n\n" + cleaned_body if cleaned_body else "") + "\n"
-    return full_text[:start_idx] + new_section + full_text[end_idx:]
+    new_body = "\n" + api_table_md + ("\n\n" + cleaned_body if cleaned_body else "") + "\n"
+    return replace_section(brd_sections, "2.3", new_body)
 
-st.title("Business Requirements Document Generator")
+def inject_apis_table_into_section(full_text: str, api_table_md: str) -> str:
+    if not api_table_md:
+        return full_text
+    brd_sections = parse_markdown_sections(full_text)
+    if not inject_api_table(brd_sections, api_table_md):
+        return full_text
+    return render_markdown_sections(brd_sections)
 
-with st.sidebar:
-    st.header("⚙️ API Configuration")
+class SilentUI:
+    # Stand-in for the streamlit module when the pipeline runs on a worker thread with no page to draw on
+    def __getattr__(self, name):
+        return self._ignore
     
-    api_provider = st.radio("Select API Provider:", ["OpenAI", "Groq", "AzureOpenAI"])
+    def _ignore(self, *args, **kwargs):
+        return self
     
-    if api_provider == "OpenAI":
-        api_key = st.text_input("Enter your OpenAI API Key:", type="password")
-        azure_endpoint = None
-        azure_deployment = None
-        api_version = None
-    elif api_provider == "AzureOpenAI":
-        api_key = st.text_input("Enter your Azure OpenAI API Key:", type="password")
-        azure_endpoint = st.text_input("Enter your Azure OpenAI Endpoint:", 
-                                       placeholder="https://your-resource.openai.azure.com/")
-        azure_deployment = st.text_input("Enter your Azure Deployment Name:", 
-                                         placeholder="gpt-35-turbo")
-        api_version = st.text_input("Enter API Version (optional):", 
-                                    value="2025-01-01-preview",
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+DEDUP_MIN_CHARS = 40
+DEDUP_NON_WORD_PATTERN = re.compile(r'\W+')
+
+def new_dedup_index():
+    return {"exact": {}}
+
+def new_dedup_report():
+    return {"blocks_removed": 0, "bytes_removed": 0, "tokens_removed": 0, "sources": {}}
+
+def normalize_dedup_text(text):
+    return " ".join(DEDUP_NON_WORD_PATTERN.sub(" ", text.lower()).split())
+
+def find_duplicate_block(dedup_index, source_name, text):
+    # Only blocks seen in an earlier source count; repeats inside one document are left alone.
+    # Matching is exact on the normalized text, so a block whose wording changed between two
+    # versions of a document is always kept
+    normalized = normalize_dedup_text(text)
+    if len(normalized) < DEDUP_MIN_CHARS:
+        return None
+    
+    exact_key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    first_source = dedup_index["exact"].setdefault(exact_key, source_name)
+    if first_source != source_name:
+        return first_source
+    return None
+
+def record_duplicate_block(dedup_report, source_name, duplicate_of):
+    source_report = dedup_report["sources"].setdefault(source_name, {"blocks_removed": 0, "duplicate_of": {}})
+    source_report["blocks_removed"] += 1
+    source_report["duplicate_of"][duplicate_of] = source_report["duplicate_of"].get(duplicate_of, 0) + 1
+    dedup_report["blocks_removed"] += 1
+
+def drop_row_numbers(value):
+    # Row numbers shift between versions of the same workbook and should not defeat matching
+    if isinstance(value, dict):
+        return {key: drop_row_numbers(item) for key, item in value.items() if key != "row"}
+    if isinstance(value, list):
+        return [drop_row_numbers(item) for item in value]
+    return value
+
+def deduplicate_json_records(dedup_index, dedup_report, source_name, value):
+    # List entries (sheets, PART B/C/E blocks, sample rows, requirement rows) are the dedup units;
+    # dict keys are kept so the extracted JSON keeps its shape
+    if isinstance(value, dict):
+        return {key: deduplicate_json_records(dedup_index, dedup_report, source_name, item) for key, item in value.items()}
+    if isinstance(value, list):
+        kept = []
+        for item in value:
+            if isinstance(item, (dict, str)):
+                record_text = item if isinstance(item, str) else json.dumps(drop_row_numbers(item), sort_keys=True, ensure_ascii=False)
+                duplicate_of = find_duplicate_block(dedup_index, source_name, record_text)
+                if duplicate_of:
+                    record_duplicate_block(dedup_report, source_name, duplicate_of)
+                    continue
+            kept.append(deduplicate_json_records(dedup_index, dedup_report, source_name, item))
+        return kept
+    return value
+
+def deduplicate_text_blocks(dedup_index, dedup_report, source_name, content):
+    # Lines are the dedup units (DOCX paragraphs and PDF text are joined one per line); the first
+    # row of each table is its header and is always kept
+    kept_lines = []
+    previous_table_row = False
+    for line in content.split('\n'):
+        table_row = is_markdown_table_row(line)
+        if not table_row or previous_table_row:
+            duplicate_of = find_duplicate_block(dedup_index, source_name, line)
+            if duplicate_of:
+                record_duplicate_block(dedup_report, source_name, duplicate_of)
+                previous_table_row = table_row
+                continue
+        previous_table_row = table_row
+        kept_lines.append(line)
+    
+    return "\n".join(kept_lines)
+
+def deduplicate_requirement_content(dedup_index, dedup_report, source_name, content):
+    blocks_before = dedup_report["blocks_removed"]
+    
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        parsed = None
+    
+    if isinstance(parsed, dict):
+        deduplicated = deduplicate_json_records(dedup_index, dedup_report, source_name, parsed)
+        if dedup_report["blocks_removed"] == blocks_before:
+            return content
+        deduplicated["deduplication"] = {
+            "note": "Records already present in other uploaded sources were removed from this file",
+            "duplicate_of": dedup_report["sources"][source_name]["duplicate_of"]
+        }
+        deduplicated = json.dumps(deduplicated, indent=2, ensure_ascii=False)
+    else:
+        deduplicated = deduplicate_text_blocks(dedup_index, dedup_report, source_name, content)
+        if dedup_report["blocks_removed"] == blocks_before:
+            return content
+        duplicate_of = dedup_report["sources"][source_name]["duplicate_of"]
+        deduplicated = deduplicated.rstrip() + (
+            f"\n\n[{dedup_report['blocks_removed'] - blocks_before} duplicate block(s) omitted; "
+            f"already present in: {', '.join(duplicate_of)}]"
+        )
+    
+    bytes_removed = max(len(content.encode("utf-8")) - len(deduplicated.encode("utf-8")), 0)
+    dedup_report["bytes_removed"] += bytes_removed
+    dedup_report["tokens_removed"] += max(estimate_token_count(content) - estimate_token_count(deduplicated), 0)
+    dedup_report["sources"][source_name]["bytes_removed"] = bytes_removed
+    return deduplicated
+
+RELEVANCE_FILTER_EXTENSIONS = ("docx", "pdf")
+RELEVANCE_UNIT_CHARS = 400
+DEFAULT_RELEVANCE_TOKEN_BUDGET = 6000
+BRD_SECTION_VOCABULARY = "\n".join(SECTION_TEMPLATES.values())
+
+RELEVANCE_SENTENCE_END_PATTERN = re.compile(r'[.:;!?]\s*$')
+
+def split_relevance_units(text, merge_wrapped_lines=False):
+    # One unit per line (a docx paragraph), or for PDFs consecutive wrapped lines up to the end of a
+    # sentence or ~RELEVANCE_UNIT_CHARS; an extracted table stays one unit
+    units = []
+    current = []
+    current_length = 0
+    in_table = False
+    
+    for line in text.split('\n'):
+        if in_table:
+            unit_complete = "|" not in line
+        elif merge_wrapped_lines:
+            unit_complete = current_length >= RELEVANCE_UNIT_CHARS or bool(current and RELEVANCE_SENTENCE_END_PATTERN.search(current[-1]))
+        else:
+            unit_complete = True
+        
+        if line == "TABLE:" or unit_complete:
+            if current:
+                units.append("\n".join(current))
+            current = []
+            current_length = 0
+            in_table = line == "TABLE:"
+        current.append(line)
+        current_length += len(line) + 1
+    
+    if current:
+        units.append("\n".join(current))
+    return units
+
+def filter_low_signal_content(text, token_budget, dropped=None, merge_wrapped_lines=False):
+    # Rank passages by TF-IDF cosine similarity to the BRD section templates and keep the best
+    # ones, in document order, until the token budget is used
+    if estimate_token_count(text) <= token_budget:
+        return text
+    
+    units = [unit for unit in split_relevance_units(text, merge_wrapped_lines) if unit.strip()]
+    try:
+        tfidf = TfidfVectorizer(stop_words="english", sublinear_tf=True).fit_transform(units + [BRD_SECTION_VOCABULARY])
+    except ValueError:
+        return text
+    scores = (tfidf[:-1] @ tfidf[-1].T).toarray().ravel()
+    
+    kept = set()
+    used_tokens = 0
+    for unit_idx in np.argsort(-scores, kind="stable"):
+        unit_tokens = estimate_token_count(units[unit_idx]) + 1
+        if used_tokens + unit_tokens <= token_budget:
+            kept.add(unit_idx)
+            used_tokens += unit_tokens
+    
+    dropped_units = [
+        {"score": round(float(scores[unit_idx]), 3), "text": units[unit_idx]}
+        for unit_idx in range(len(units)) if unit_idx not in kept
+    ]
+    if dropped is not None:
+        dropped.extend(dropped_units)
+    
+    filtered = "\n".join(units[unit_idx] for unit_idx in range(len(units)) if unit_idx in kept)
+    return filtered + f"\n[{len(dropped_units)} low-relevance passage(s) omitted to fit the token budget]"
+
+def render_dropped_content_appendix(dropped_content):
+    lines = ["# Dropped Content Appendix", ""]
+    lines.append("Passages removed from large PDF/DOCX files before generation, with their relevance score.")
+    for source_name, dropped_units in dropped_content.items():
+        lines.extend(["", f"## {source_name}", ""])
+        for unit in dropped_units:
+            lines.append(f"**Score {unit['score']}**")
+            lines.append("")
+            lines.append(unit["text"])
+            lines.append("")
+    return "\n".join(lines)
+
+def collect_requirements(manual_requirements, uploaded_files, ui=st, dedup_report=None, relevance_budget=None, dropped_content=None, memory_run=None, progress=None):
+    all_requirements = []
+    requirement_fingerprints = {}
+    source_names = [uploaded_file.name for uploaded_file in uploaded_files or []]
+    dedup_index = new_dedup_index()
+    if dedup_report is None:
+        dedup_report = new_dedup_report()
+    
+    if manual_requirements.strip():
+        all_requirements.append("=== MANUAL REQUIREMENTS ===")
+        all_requirements.append(deduplicate_requirement_content(dedup_index, dedup_report, "manual requirements", manual_requirements.strip()))
+        all_requirements.append("="*50)
+        requirement_fingerprints.update(fingerprint_requirement_blocks("manual requirements", manual_requirements.strip()))
+        source_names.append("manual requirements")
+    
+    if uploaded_files:
+        ui.info(f"Processing {len(uploaded_files)} uploaded files...")
+        uploaded_digests = {
+            upload_digest(uploaded_file): uploaded_file.name
+            for uploaded_file in uploaded_files
+            if not uploaded_file.name.lower().endswith(".msg")
+        }
+        
+        for uploaded_file in uploaded_files:
+            # Outside the try: a cancelled job must stop here, not be logged as a failed file
+            if progress:
+                progress(None, f"Extracting {uploaded_file.name}")
+            try:
+                ui.write(f"Processing: {uploaded_file.name}")
+                
+                file_extension = uploaded_file.name.split('.')[-1].lower()
+                degradation = None
+                file_budget = relevance_budget if file_extension in RELEVANCE_FILTER_EXTENSIONS else None
+                memory_level = memory_pressure_level(memory_run, uploaded_file.name)
+                if memory_level:
+                    degradation = MEMORY_DEGRADATION_OPTIONS[memory_level]
+                    if degradation["relevance_budget"] and file_extension in MEMORY_TRIM_EXTENSIONS:
+                        file_budget = min(file_budget or degradation["relevance_budget"], degradation["relevance_budget"])
+                    actions = memory_degradation_actions(memory_level, file_extension)
+                    if actions:
+                        ui.warning(
+                            f"Server process memory (RSS) is above the {MEMORY_HARD_LIMIT_MB if memory_level == 'minimal' else MEMORY_SOFT_LIMIT_MB:,} MB ceiling: "
+                            f"reading {uploaded_file.name} with {', '.join(actions)}"
+                        )
+                
+                extraction_report = {}
+                content = extract_uploaded_file(uploaded_file, extraction_report, uploaded_digests, degradation)
+                if content is None:
+                    ui.warning(f"⚠Unsupported file type: {uploaded_file.name.split('.')[-1].lower()}")
+                    continue
+                
+                if extraction_report.get("repeated_lines_removed"):
+                    ui.write(
+                        f"Stripped {extraction_report['repeated_lines_removed']} repeated header/footer line(s) "
+                        f"({extraction_report['repeated_chars_removed']:,} characters) from {uploaded_file.name}"
+                    )
+                
+                if extraction_report.get("ocr_memory_skipped_pages"):
+                    ui.warning(
+                        f"{len(extraction_report['ocr_memory_skipped_pages'])} scanned page(s) of {uploaded_file.name} "
+                        f"were not OCR'd because server memory is above the ceiling"
+                    )
+                elif extraction_report.get("ocr_unavailable"):
+                    ui.warning(
+                        f"{len(extraction_report['ocr_skipped_pages'])} page(s) of {uploaded_file.name} have no text layer "
+                        f"and tesseract is not installed, so they were left out"
+                    )
+                elif extraction_report.get("ocr_pages") or extraction_report.get("ocr_skipped_pages") or extraction_report.get("ocr_timed_out_pages"):
+                    ui.write(
+                        f"OCR read page(s) {', '.join(map(str, extraction_report['ocr_pages'])) or 'none'} of {uploaded_file.name} "
+                        f"in {extraction_report['ocr_seconds']:.1f}s ({len(extraction_report['ocr_cached_pages'])} from cache)"
+                    )
+                    if extraction_report["ocr_skipped_pages"]:
+                        ui.warning(
+                            f"OCR time budget ran out; page(s) {', '.join(map(str, extraction_report['ocr_skipped_pages']))} "
+                            f"of {uploaded_file.name} were not started and were left out"
+                        )
+                    if extraction_report["ocr_timed_out_pages"]:
+                        ui.warning(
+                            f"OCR time budget ran out while reading page(s) {', '.join(map(str, extraction_report['ocr_timed_out_pages']))} "
+                            f"of {uploaded_file.name}; they were stopped and left out"
+                        )
+                    if extraction_report["ocr_failed_pages"]:
+                        ui.warning(
+                            f"OCR failed on page(s) {', '.join(map(str, extraction_report['ocr_failed_pages']))} of {uploaded_file.name}"
+                        )
+                
+                for attachment in extraction_report.get("attachments", []):
+                    if attachment["status"] == "extracted":
+                        ui.write(f"Extracted attachment: {attachment['name']} ({attachment.get('characters', 0):,} characters)")
+                    else:
+                        ui.info(f"Attachment {attachment['name']} {attachment['status']}: {attachment['reason']}")
+                
+                if content.strip():
+                    all_requirements.append(f"=== FILE: {uploaded_file.name} ===")
+                    file_content = deduplicate_requirement_content(dedup_index, dedup_report, uploaded_file.name, content.strip())
+                    if file_budget:
+                        dropped_units = []
+                        file_content = filter_low_signal_content(file_content, file_budget, dropped_units, merge_wrapped_lines=file_extension == "pdf")
+                        if dropped_units:
+                            if dropped_content is not None:
+                                dropped_content[uploaded_file.name] = dropped_units
+                            ui.info(f"Dropped {len(dropped_units)} low-relevance passage(s) from {uploaded_file.name} to fit {file_budget:,} tokens")
+                    all_requirements.append(file_content)
+                    all_requirements.append("="*50)
+                    requirement_fingerprints.update(fingerprint_requirement_blocks(uploaded_file.name, content, extraction_report))
+                    ui.success(f"Successfully processed: {uploaded_file.name}")
+                else:
+                    ui.warning(f"No content extracted from: {uploaded_file.name}")
+                    
+            except Exception as e:
+                ui.error(f"Error processing {uploaded_file.name}: {str(e)}")
+                continue
+    
+    if dedup_report["blocks_removed"]:
+        ui.info(
+            f"Removed {dedup_report['blocks_removed']} duplicate block(s) found in more than one source: "
+            f"{dedup_report['bytes_removed']:,} bytes (~{dedup_report['tokens_removed']:,} tokens)"
+        )
+        with ui.expander("🧹 Deduplication details", expanded=False):
+            for source_name, source_report in dedup_report["sources"].items():
+                duplicate_of = ", ".join(f"{name} ({count})" for name, count in source_report["duplicate_of"].items())
+                ui.write(f"- **{source_name}**: {source_report['blocks_removed']} block(s) removed, already in {duplicate_of}")
+    print(f"Deduplication: {dedup_report['blocks_removed']} blocks, {dedup_report['bytes_removed']} bytes, ~{dedup_report['tokens_removed']} tokens removed")
+    
+    return "\n\n".join(all_requirements), requirement_fingerprints, source_names
+
+PROFILE_ENV_ENABLED = os.environ.get("BRD_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.environ.get("BRD_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".brd_profiles"))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("BRD_PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_TOP_FUNCTIONS = 20
+# Leaf frames in these modules are threads parked on a lock or an empty queue, not work
+PROFILE_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+PROFILE_LOCK = threading.Lock()
+# Per-thread set of thread ids working for the profiled stage in progress; the sampler only reads
+# those threads, so other sessions and concurrent jobs stay out of this run's profile
+PROFILE_THREADS = threading.local()
+
+def submit_profiled(executor, fn, *args):
+    stage_threads = getattr(PROFILE_THREADS, "idents", None)
+    if stage_threads is None:
+        return executor.submit(fn, *args)
+    
+    def run_for_stage():
+        thread_id = threading.get_ident()
+        previous = getattr(PROFILE_THREADS, "idents", None)
+        PROFILE_THREADS.idents = stage_threads
+        stage_threads.add(thread_id)
+        try:
+            return fn(*args)
+        finally:
+            stage_threads.discard(thread_id)
+            PROFILE_THREADS.idents = previous
+    
+    return executor.submit(run_for_stage)
+
+def start_profile_run():
+    directory = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        print(f"WARNING: Profiling disabled for this run, could not create {directory}: {str(e)}")
+        return None
+    return {"directory": directory, "stages": [], "top_functions": []}
+
+def profile_frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_thread_stacks(stop_event, stacks, stage_threads):
+    # cProfile only sees the thread that enabled it, so pool work submitted by the stage (OCR,
+    # attachments, routed LLM calls) is caught by sampling the stage's threads instead
+    thread_names = {}
+    while not stop_event.wait(PROFILE_SAMPLE_INTERVAL):
+        frames = sys._current_frames()
+        for thread_id in list(stage_threads):
+            frame = frames.get(thread_id)
+            if frame is None or os.path.basename(frame.f_code.co_filename) in PROFILE_IDLE_MODULES:
+                continue
+            if thread_id not in thread_names:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            labels = []
+            while frame is not None:
+                labels.append(profile_frame_label(frame))
+                frame = frame.f_back
+            labels.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+            stacks[";".join(reversed(labels))] += 1
+
+def start_stage_profiler():
+    # One cProfile at a time for the whole process: on Python 3.12+ cProfile is built on
+    # sys.monitoring and a second enable() raises, so overlapping stages (parallel exports, other
+    # job workers) fall back to the stack sampler alone
+    if not PROFILE_LOCK.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (a debugger, coverage) already holds the hook
+        PROFILE_LOCK.release()
+        return None
+    return profiler
+
+def save_stage_profile(profile_run, stage, profiler, stacks, seconds):
+    try:
+        # One "frame;frame;frame count" line per stack, the input flamegraph.pl and speedscope expect
+        with open(os.path.join(profile_run["directory"], f"{stage}.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(profile_run["directory"], f"{stage}.pstats"))
+            stats = pstats.Stats(profiler).sort_stats("tottime")
+            for function in stats.fcn_list[:PROFILE_TOP_FUNCTIONS]:
+                primitive_calls, total_calls, self_seconds, cumulative_seconds, _ = stats.stats[function]
+                file_name, line_number, function_name = function
+                profile_run["top_functions"].append({
+                    "Stage": stage,
+                    "Function": function_name if file_name == "~" else f"{function_name} ({os.path.basename(file_name)}:{line_number})",
+                    "Calls": total_calls,
+                    "Self (s)": round(self_seconds, 4),
+                    "Cumulative (s)": round(cumulative_seconds, 4)
+                })
+        else:
+            # Without cProfile, self time is estimated from how often a frame was on top of a sampled stack
+            leaf_counts = collections.Counter()
+            for stack, count in stacks.items():
+                leaf_counts[stack.rsplit(";", 1)[-1]] += count
+            for function, count in leaf_counts.most_common(PROFILE_TOP_FUNCTIONS):
+                profile_run["top_functions"].append({
+                    "Stage": stage,
+                    "Function": function,
+                    "Calls": None,
+                    "Self (s)": round(count * PROFILE_SAMPLE_INTERVAL, 4),
+                    "Cumulative (s)": None
+                })
+    except Exception as e:
+        print(f"WARNING: Could not save the {stage} profile: {str(e)}")
+    
+    profile_run["stages"].append({
+        "Stage": stage,
+        "Seconds": round(seconds, 2),
+        "Samples": sum(stacks.values()),
+        "Profiler": "cProfile + sampler" if profiler is not None else "sampler only"
+    })
+
+@contextmanager
+def profile_stage(profile_run, stage):
+    if profile_run is None:
+        yield
+        return
+    
+    stacks = collections.Counter()
+    stage_threads = {threading.get_ident()}
+    previous_threads = getattr(PROFILE_THREADS, "idents", None)
+    PROFILE_THREADS.idents = stage_threads
+    stop_event = threading.Event()
+    sampler = threading.Thread(target=sample_thread_stacks, args=(stop_event, stacks, stage_threads), name=f"brd-profile-{stage}", daemon=True)
+    started = time.perf_counter()
+    sampler.start()
+    profiler = start_stage_profiler()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            PROFILE_LOCK.release()
+        stop_event.set()
+        sampler.join()
+        PROFILE_THREADS.idents = previous_threads
+        save_stage_profile(profile_run, stage, profiler, stacks, time.perf_counter() - started)
+
+# tracemalloc slows allocation-heavy extraction (pdfplumber) several times over, so per-stage
+# snapshots are opt-in; the ceilings and the reported peak use the process RSS, which is cheap to read
+MEMORY_TRACEMALLOC_ENABLED = os.environ.get("BRD_MEMORY_TRACEMALLOC", "").lower() in ("1", "true", "yes")
+# Ceilings on the resident memory of the whole server process, since concurrent runs share the
+# container's limit
+MEMORY_SOFT_LIMIT_MB = int(os.environ.get("BRD_MEMORY_SOFT_LIMIT_MB", "1536"))
+MEMORY_HARD_LIMIT_MB = int(os.environ.get("BRD_MEMORY_HARD_LIMIT_MB", "3072"))
+MEMORY_REDUCED_MAX_ROWS_PER_SHEET = int(os.environ.get("BRD_MEMORY_REDUCED_MAX_ROWS", "30"))
+MEMORY_SAMPLE_INTERVAL = 0.05
+MEMORY_TOP_ALLOCATIONS = 5
+# Extraction settings per degradation level. Past the soft ceiling workbooks (also inside MSG files)
+# are read with fewer rows and no sample_data, and scanned PDF pages are not rendered for OCR, since
+# the 300 dpi page images are the largest transient allocation. Past the hard ceiling PDF, DOCX and
+# MSG text is also trimmed to a relevance budget before it joins the combined requirements
+MEMORY_DEGRADATION_OPTIONS = {
+    "reduced": {
+        "excel": {"max_rows_per_sheet": MEMORY_REDUCED_MAX_ROWS_PER_SHEET, "max_sample_rows": 0},
+        "ocr": False,
+        "relevance_budget": None
+    },
+    "minimal": {
+        "excel": {"max_rows_per_sheet": MEMORY_REDUCED_MAX_ROWS_PER_SHEET, "max_sample_rows": 0},
+        "ocr": False,
+        "relevance_budget": DEFAULT_RELEVANCE_TOKEN_BUDGET
+    }
+}
+MEMORY_TRIM_EXTENSIONS = ("pdf", "docx", "msg")
+MEMORY_STAGE_LOCK = threading.Lock()
+MEMORY_ACTIVE_STAGES = set()
+
+def to_mb(size):
+    return round(size / (1024 * 1024), 1)
+
+def process_rss_bytes():
+    # Linux only; elsewhere the ceilings are not enforced
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def start_memory_run():
+    if process_rss_bytes() is None and not MEMORY_TRACEMALLOC_ENABLED:
+        return None
+    if MEMORY_TRACEMALLOC_ENABLED and not tracemalloc.is_tracing():
+        # Tracing stays on for the life of the server process once the first run starts
+        tracemalloc.start()
+    return {"stages": [], "top_allocations": [], "degradations": [], "peak_mb": 0.0}
+
+def sample_process_rss(stop_event, peak):
+    while not stop_event.wait(MEMORY_SAMPLE_INTERVAL):
+        peak[0] = max(peak[0], process_rss_bytes() or 0)
+
+@contextmanager
+def memory_stage(memory_run, stage):
+    if memory_run is None:
+        yield
+        return
+    
+    tracing = tracemalloc.is_tracing()
+    token = object()
+    if tracing:
+        with MEMORY_STAGE_LOCK:
+            # The traced peak is process-wide, so it is only reset when no other run is mid-stage;
+            # overlapping runs then report the shared peak instead of losing theirs
+            if not MEMORY_ACTIVE_STAGES:
+                tracemalloc.reset_peak()
+            MEMORY_ACTIVE_STAGES.add(token)
+    start_rss = process_rss_bytes() or 0
+    peak = [start_rss]
+    stop_event = threading.Event()
+    sampler = threading.Thread(target=sample_process_rss, args=(stop_event, peak), name=f"brd-memory-{stage}", daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop_event.set()
+        sampler.join()
+        end_rss = process_rss_bytes() or 0
+        stage_record = {
+            "Stage": stage,
+            "Process RSS start (MB)": to_mb(start_rss),
+            "Process RSS peak (MB)": to_mb(max(peak[0], end_rss)),
+            "Process RSS end (MB)": to_mb(end_rss)
+        }
+        
+        if tracing:
+            with MEMORY_STAGE_LOCK:
+                MEMORY_ACTIVE_STAGES.discard(token)
+            stage_record["Traced peak (MB)"] = to_mb(tracemalloc.get_traced_memory()[1])
+            snapshot = tracemalloc.take_snapshot()
+            for statistic in snapshot.statistics("lineno")[:MEMORY_TOP_ALLOCATIONS]:
+                frame = statistic.traceback[0]
+                memory_run["top_allocations"].append({
+                    "Stage": stage,
+                    "Location": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                    "Size (MB)": to_mb(statistic.size),
+                    "Blocks": statistic.count
+                })
+            del snapshot
+        
+        memory_run["stages"].append(stage_record)
+        memory_run["peak_mb"] = max(memory_run["peak_mb"], stage_record["Process RSS peak (MB)"])
+
+def memory_degradation_actions(level, file_extension):
+    options = MEMORY_DEGRADATION_OPTIONS[level]
+    actions = []
+    if file_extension in ("xlsx", "xls", "msg"):
+        actions.append(f"at most {options['excel']['max_rows_per_sheet']} rows per sheet and no sample rows")
+    if file_extension in ("pdf", "msg") and not options["ocr"]:
+        actions.append("no OCR of scanned pages")
+    if file_extension in MEMORY_TRIM_EXTENSIONS and options["relevance_budget"]:
+        actions.append(f"text trimmed to {options['relevance_budget']:,} tokens")
+    return actions
+
+def memory_pressure_level(memory_run, source_name):
+    rss = process_rss_bytes() if memory_run is not None else None
+    if rss is None:
+        return None
+    
+    if rss > MEMORY_SOFT_LIMIT_MB * 1024 * 1024:
+        # Parsed PDFs and workbooks leave reference cycles behind; reclaim those before degrading
+        gc.collect()
+        rss = process_rss_bytes() or rss
+    if rss > MEMORY_HARD_LIMIT_MB * 1024 * 1024:
+        level = "minimal"
+    elif rss > MEMORY_SOFT_LIMIT_MB * 1024 * 1024:
+        level = "reduced"
+    else:
+        return None
+    memory_run["degradations"].append({
+        "Source": source_name,
+        "Level": level,
+        "Process RSS (MB)": to_mb(rss),
+        "Actions": ", ".join(memory_degradation_actions(level, source_name.split('.')[-1].lower())) or "none for this file type"
+    })
+    return level
+
+def run_brd_pipeline(chains, manual_requirements, uploaded_files, reuse_previous_run=False, fallback_checkpoint=None, ui=st, progress=None, relevance_budget=None, profile=False, checkpoint_scope=None):
+    run_summary = start_run_trace()
+    dedup_report = new_dedup_report()
+    dropped_content = {}
+    profile_run = start_profile_run() if profile else None
+    memory_run = start_memory_run()
+    with memory_stage(memory_run, "extraction"), profile_stage(profile_run, "extraction"):
+        combined_requirements, requirement_fingerprints, source_names = collect_requirements(
+            manual_requirements, uploaded_files, ui, dedup_report, relevance_budget, dropped_content, memory_run, progress
+        )
+    if not combined_requirements:
+        raise ValueError("No valid content found in uploaded files!")
+    
+    content_size = estimate_content_size(combined_requirements)
+    ui.info(f"Total content size: {content_size:,} characters")
+    
+    ui.subheader("AI Processing Progress")
+    
+    reuse_groups = None
+    if reuse_previous_run:
+        checkpoint = load_brd_checkpoint(source_names, checkpoint_scope, fallback_checkpoint)
+        reuse_groups = plan_incremental_run(checkpoint, requirement_fingerprints)
+        if reuse_groups is None:
+            ui.info("No previous run found for these files; generating all section groups.")
+        else:
+            regenerated_groups = [SECTION_GROUP_LABELS[key] for key in SECTION_GROUP_KEYS if key not in reuse_groups]
+            ui.info(
+                f"Reusing {len(reuse_groups)} section group(s) from the previous run. "
+                f"Regenerating: {', '.join(regenerated_groups) if regenerated_groups else 'nothing (no requirement changes detected)'}"
+            )
+    
+    with ui.spinner("Generating comprehensive BRD using sequential processing..."), memory_stage(memory_run, "generation"), profile_stage(profile_run, "generation"):
+        brd_content = generate_brd_sequentially(chains, combined_requirements, reuse_groups, ui=ui, progress=progress)
+    
+    if memory_run:
+        print(f"Peak process RSS: {memory_run['peak_mb']:,.1f} MB ({len(memory_run['degradations'])} degraded extraction(s))")
+    
+    if not brd_content:
+        return None
+    
+    return {
+        "brd_content": brd_content,
+        "requirements": combined_requirements,
+        "checkpoint": save_brd_checkpoint(source_names, requirement_fingerprints, brd_content, checkpoint_scope),
+        "run_summary": run_summary,
+        "dedup_report": dedup_report,
+        "dropped_content": dropped_content,
+        "profile": profile_run,
+        "memory": memory_run
+    }
+
+BRD_JOB_DIR = os.environ.get("BRD_JOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".brd_jobs"))
+# Job workers are threads in the Streamlit server process: LLM calls overlap, but extraction and
+# export are CPU-bound and share the GIL with every session on the server
+BRD_JOB_WORKERS = int(os.environ.get("BRD_JOB_WORKERS", "4"))
+BRD_JOBS_PER_USER = int(os.environ.get("BRD_JOBS_PER_USER", "2"))
+BRD_JOB_QUEUE_LIMIT = int(os.environ.get("BRD_JOB_QUEUE_LIMIT", "20"))
+BRD_JOB_POLL_SECONDS = 1.0
+BRD_JOB_RETENTION_DAYS = float(os.environ.get("BRD_JOB_RETENTION_DAYS", "7"))
+BRD_JOB_SWEEP_SECONDS = 3600
+BRD_JOB_FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+# Streamlit executes this script in a fresh namespace on every rerun and st.cache_resource can be
+# cleared, so the state shared by sessions and job workers (the start guard and the in-memory API
+# keys) lives in one module registered for the whole process
+_job_runtime = types.ModuleType("brd_job_runtime")
+_job_runtime.lock = threading.Lock()
+_job_runtime.started = False
+_job_runtime.workers = []
+_job_runtime.secrets = {}
+_job_runtime.last_sweep = 0.0
+BRD_JOB_RUNTIME = sys.modules.setdefault("brd_job_runtime", _job_runtime)
+
+# API keys never touch the job database; they live in worker memory until the job is picked up
+BRD_JOB_SECRETS = BRD_JOB_RUNTIME.secrets
+
+class JobCancelled(Exception):
+    pass
+
+def job_db_path():
+    return os.path.join(BRD_JOB_DIR, "jobs.sqlite3")
+
+def job_db_connection():
+    os.makedirs(BRD_JOB_DIR, exist_ok=True)
+    connection = sqlite3.connect(job_db_path(), timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress TEXT,
+            error TEXT,
+            params TEXT NOT NULL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    """)
+    return connection
+
+def update_job(job_id, **fields):
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    with closing(job_db_connection()) as connection, connection:
+        connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+def current_job_owner():
+    # Job ownership comes from the server, never from the URL: the signed-in account when
+    # authentication is configured, otherwise this browser session
+    try:
+        if st.user.get("is_logged_in") and st.user.get("email"):
+            return f"user:{st.user.get('email')}"
+    except Exception:
+        pass
+    if "job_owner" not in st.session_state:
+        st.session_state["job_owner"] = f"session:{uuid.uuid4().hex}"
+    return st.session_state["job_owner"]
+
+def list_user_jobs(user_id, limit=20):
+    # Nothing has been submitted on this server yet; don't create the database just to list it
+    if not os.path.exists(job_db_path()):
+        return []
+    with closing(job_db_connection()) as connection:
+        rows = connection.execute(
+            "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def submit_brd_job(user_id, provider_config, manual_requirements, uploaded_files, reuse_previous_run=False, relevance_budget=None, profile=False):
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(BRD_JOB_DIR, job_id)
+    input_dir = os.path.join(job_dir, "inputs")
+    os.makedirs(input_dir, exist_ok=True)
+    
+    file_names = []
+    input_files = []
+    for file_idx, uploaded_file in enumerate(uploaded_files or []):
+        file_name = os.path.basename(uploaded_file.name)
+        # Uploads may share a base name; the index keeps each one in its own file
+        input_file = f"{file_idx:03d}_{file_name}"
+        with open(os.path.join(input_dir, input_file), "wb") as f:
+            with uploaded_file.getbuffer() as view:
+                f.write(view)
+        file_names.append(file_name)
+        input_files.append(input_file)
+    
+    # API keys stay in memory; only the non-secret provider settings are written to disk
+    provider_params = {key: value for key, value in provider_config.items() if key != "api_key"}
+    secrets = {"api_key": provider_config["api_key"]}
+    if provider_config.get("routing"):
+        provider_params["routing"] = {key: value for key, value in provider_config["routing"].items() if key != "api_key"}
+        secrets["routing_api_key"] = provider_config["routing"]["api_key"]
+    
+    params = {
+        "provider": provider_params,
+        "manual_requirements": manual_requirements,
+        "file_names": file_names,
+        "input_files": input_files,
+        "reuse_previous_run": reuse_previous_run,
+        "relevance_budget": relevance_budget,
+        "profile": profile
+    }
+    BRD_JOB_SECRETS[job_id] = secrets
+    
+    try:
+        with closing(job_db_connection()) as connection, connection:
+            # The write lock is taken before counting, so two submissions cannot both pass the limit
+            connection.execute("BEGIN IMMEDIATE")
+            active_jobs = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')", (user_id,)
+            ).fetchone()[0]
+            if active_jobs >= BRD_JOBS_PER_USER:
+                raise RuntimeError(f"You already have {active_jobs} BRD job(s) in progress (limit {BRD_JOBS_PER_USER}). Wait for one to finish or cancel it.")
+            # Without sign-in every browser session is a new owner, so the server-wide cap is the real bound
+            queued_jobs = connection.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if queued_jobs >= BRD_JOB_QUEUE_LIMIT:
+                raise RuntimeError(f"The server already has {queued_jobs} BRD job(s) in progress (limit {BRD_JOB_QUEUE_LIMIT}). Try again later.")
+            connection.execute(
+                "INSERT INTO jobs (id, user_id, status, progress, params, created_at) VALUES (?, ?, 'queued', 'Queued', ?, ?)",
+                (job_id, user_id, json.dumps(params), time.time())
+            )
+    except Exception:
+        BRD_JOB_SECRETS.pop(job_id, None)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    
+    get_job_workers()
+    return job_id
+
+def cancel_brd_job(job_id, user_id):
+    with closing(job_db_connection()) as connection, connection:
+        cancelled = connection.execute(
+            "UPDATE jobs SET status = 'cancelled', progress = 'Cancelled', finished_at = ? WHERE id = ? AND user_id = ? AND status = 'queued'",
+            (time.time(), job_id, user_id)
+        ).rowcount
+        connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND user_id = ? AND status = 'running'", (job_id, user_id))
+    if cancelled:
+        BRD_JOB_SECRETS.pop(job_id, None)
+
+def load_job_result(job_id):
+    job_dir = os.path.join(BRD_JOB_DIR, job_id)
+    with open(os.path.join(job_dir, "brd.md"), "r", encoding="utf-8") as f:
+        brd_content = f.read()
+    with open(os.path.join(job_dir, "requirements.txt"), "r", encoding="utf-8") as f:
+        requirements = f.read()
+    run_summary = []
+    if os.path.exists(os.path.join(job_dir, "run_summary.json")):
+        with open(os.path.join(job_dir, "run_summary.json"), "r", encoding="utf-8") as f:
+            run_summary = json.load(f)
+    dropped_content = {}
+    if os.path.exists(os.path.join(job_dir, "dropped_content.json")):
+        with open(os.path.join(job_dir, "dropped_content.json"), "r", encoding="utf-8") as f:
+            dropped_content = json.load(f)
+    profile_run = None
+    if os.path.exists(os.path.join(job_dir, "profile.json")):
+        with open(os.path.join(job_dir, "profile.json"), "r", encoding="utf-8") as f:
+            profile_run = json.load(f)
+    memory_run = None
+    if os.path.exists(os.path.join(job_dir, "memory.json")):
+        with open(os.path.join(job_dir, "memory.json"), "r", encoding="utf-8") as f:
+            memory_run = json.load(f)
+    return {
+        "brd_content": brd_content,
+        "requirements": requirements,
+        "run_summary": run_summary,
+        "dropped_content": dropped_content,
+        "profile": profile_run,
+        "memory": memory_run
+    }
+
+def claim_next_job():
+    with closing(job_db_connection()) as connection, connection:
+        row = connection.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+        if row is None:
+            return None
+        claimed = connection.execute(
+            "UPDATE jobs SET status = 'running', progress = 'Extracting requirements', started_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), row["id"])
+        ).rowcount
+        if not claimed:
+            return None
+        job = connection.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+    return dict(job)
+
+def run_brd_job(job):
+    job_id = job["id"]
+    params = json.loads(job["params"])
+    secrets = BRD_JOB_SECRETS.pop(job_id, None)
+    if not secrets:
+        update_job(job_id, status="failed", error="The server restarted before this job started; please submit it again.", finished_at=time.time())
+        return
+    
+    def progress(chain_index, message):
+        with closing(job_db_connection()) as connection:
+            cancel_requested = connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        if cancel_requested:
+            raise JobCancelled()
+        update_job(job_id, progress=message)
+    
+    uploaded_files = []
+    try:
+        input_dir = os.path.join(BRD_JOB_DIR, job_id, "inputs")
+        for input_file, file_name in zip(params.get("input_files", params["file_names"]), params["file_names"]):
+            uploaded_files.append(open_upload_file(os.path.join(input_dir, input_file), file_name))
+        
+        provider_params = params["provider"]
+        checkpoint_scope = brd_checkpoint_scope(job["user_id"], provider_params)
+        if provider_params.get("routing"):
+            provider_params["routing"]["api_key"] = secrets["routing_api_key"]
+        chains = initialize_sequential_chains(api_key=secrets["api_key"], **provider_params)
+        pipeline_result = run_brd_pipeline(
+            chains,
+            params["manual_requirements"],
+            uploaded_files,
+            reuse_previous_run=params["reuse_previous_run"],
+            ui=SilentUI(),
+            progress=progress,
+            relevance_budget=params.get("relevance_budget"),
+            profile=params.get("profile", False),
+            checkpoint_scope=checkpoint_scope
+        )
+        if not pipeline_result:
+            raise RuntimeError("Failed to generate BRD content!")
+        
+        job_dir = os.path.join(BRD_JOB_DIR, job_id)
+        with open(os.path.join(job_dir, "brd.md"), "w", encoding="utf-8") as f:
+            f.write(pipeline_result["brd_content"])
+        with open(os.path.join(job_dir, "requirements.txt"), "w", encoding="utf-8") as f:
+            f.write(pipeline_result["requirements"])
+        with open(os.path.join(job_dir, "run_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(pipeline_result["run_summary"], f)
+        with open(os.path.join(job_dir, "dropped_content.json"), "w", encoding="utf-8") as f:
+            json.dump(pipeline_result["dropped_content"], f)
+        if pipeline_result["profile"]:
+            with open(os.path.join(job_dir, "profile.json"), "w", encoding="utf-8") as f:
+                json.dump(pipeline_result["profile"], f)
+        if pipeline_result["memory"]:
+            with open(os.path.join(job_dir, "memory.json"), "w", encoding="utf-8") as f:
+                json.dump(pipeline_result["memory"], f)
+        
+        update_job(job_id, status="done", progress="Completed", finished_at=time.time())
+    except JobCancelled:
+        update_job(job_id, status="cancelled", progress="Cancelled", finished_at=time.time())
+    except Exception as e:
+        print(f"ERROR in BRD job {job_id}: {str(e)}")
+        update_job(job_id, status="failed", error=str(e), finished_at=time.time())
+    finally:
+        for uploaded_file in uploaded_files:
+            uploaded_file.close()
+
+def sweep_expired_jobs():
+    # Finished jobs (their inputs, results and database row) are kept for BRD_JOB_RETENTION_DAYS
+    cutoff = time.time() - BRD_JOB_RETENTION_DAYS * 86400
+    with closing(job_db_connection()) as connection, connection:
+        expired_ids = [
+            row["id"] for row in connection.execute(
+                f"SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(BRD_JOB_FINISHED_STATUSES))}) AND finished_at < ?",
+                (*BRD_JOB_FINISHED_STATUSES, cutoff)
+            ).fetchall()
+        ]
+        connection.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired_ids])
+    for job_id in expired_ids:
+        shutil.rmtree(os.path.join(BRD_JOB_DIR, job_id), ignore_errors=True)
+    if expired_ids:
+        print(f"Removed {len(expired_ids)} BRD job(s) older than {BRD_JOB_RETENTION_DAYS:g} day(s)")
+
+def sweep_expired_jobs_if_due():
+    with BRD_JOB_RUNTIME.lock:
+        if time.time() - BRD_JOB_RUNTIME.last_sweep < BRD_JOB_SWEEP_SECONDS:
+            return
+        BRD_JOB_RUNTIME.last_sweep = time.time()
+    try:
+        sweep_expired_jobs()
+    except Exception as e:
+        print(f"ERROR removing expired BRD jobs: {str(e)}")
+
+def job_worker_loop():
+    while True:
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            print(f"ERROR claiming BRD job: {str(e)}")
+            job = None
+        
+        if job is None:
+            sweep_expired_jobs_if_due()
+            time.sleep(BRD_JOB_POLL_SECONDS)
+            continue
+        
+        run_brd_job(job)
+
+def get_job_workers():
+    # Runs once per process: recovery must never see the jobs of live workers, and a second set of
+    # workers would claim jobs twice as fast as configured
+    with BRD_JOB_RUNTIME.lock:
+        if BRD_JOB_RUNTIME.started:
+            return BRD_JOB_RUNTIME.workers
+        
+        # Jobs left 'running' by a previous server process can never finish
+        with closing(job_db_connection()) as connection, connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? WHERE status = 'running'",
+                (time.time(),)
+            )
+        
+        for worker_idx in range(BRD_JOB_WORKERS):
+            worker = threading.Thread(target=job_worker_loop, name=f"brd-job-worker-{worker_idx}", daemon=True)
+            worker.start()
+            BRD_JOB_RUNTIME.workers.append(worker)
+        BRD_JOB_RUNTIME.started = True
+        return BRD_JOB_RUNTIME.workers
+
+EXPORT_FORMATS = {
+    "Word (DOCX)": {
+        "label": "Download BRD (Word Document)",
+        "file_name": "Business_Requirements_Document.docx",
+        "mime": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    },
+    "PDF": {
+        "label": "Download BRD (PDF)",
+        "file_name": "Business_Requirements_Document.pdf",
+        "mime": "application/pdf"
+    },
+    "HTML": {
+        "label": "Download BRD (HTML)",
+        "file_name": "Business_Requirements_Document.html",
+        "mime": "text/html"
+    }
+}
+
+@st.cache_resource
+def get_export_executor():
+    return ThreadPoolExecutor(max_workers=len(EXPORT_FORMATS), thread_name_prefix="brd-export")
+
+def find_office_converter():
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+def render_docx_bytes(content):
+    doc = create_word_document(content)
+    doc_buffer = BytesIO()
+    doc.save(doc_buffer)
+    return doc_buffer.getvalue()
+
+def render_pdf_bytes(docx_bytes):
+    converter = find_office_converter()
+    if not converter:
+        raise RuntimeError("PDF export needs LibreOffice (soffice) on the server")
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        docx_path = os.path.join(work_dir, "Business_Requirements_Document.docx")
+        with open(docx_path, "wb") as f:
+            f.write(docx_bytes)
+        
+        # A private LibreOffice profile per conversion: with a shared one, a second concurrent
+        # soffice hands the document to the running instance and exits without writing the PDF
+        user_installation = pathlib.Path(work_dir, "profile").as_uri()
+        subprocess.run(
+            [converter, f"-env:UserInstallation={user_installation}", "--headless", "--convert-to", "pdf", "--outdir", work_dir, docx_path],
+            check=True,
+            capture_output=True,
+            timeout=300
+        )
+        
+        with open(os.path.join(work_dir, "Business_Requirements_Document.pdf"), "rb") as f:
+            return f.read()
+
+def render_html_bytes(content):
+    body = []
+    lines = content.split('\n')
+    
+    j = 0
+    while j < len(lines):
+        line = lines[j].strip()
+        
+        if line and is_markdown_table_row(line):
+            table, j = collect_markdown_table(lines, j)
+            if table:
+                body.append("<table>")
+                for row_idx, row in enumerate([table["header"]] + table["rows"]):
+                    tag = "th" if row_idx == 0 else "td"
+                    cells = "".join(f"<{tag}>{html.escape(cell)}</{tag}>" for cell in row)
+                    body.append(f"<tr>{cells}</tr>")
+                body.append("</table>")
+            continue
+        
+        if line.startswith('- ') or line.startswith('* '):
+            list_item = line[2:].strip()
+        elif re.match(r'^\d+\.', line):
+            list_item = re.sub(r'^\d+\.\s*', '', line)
+        else:
+            list_item = None
+        
+        if list_item is not None:
+            if not body or body[-1] != "</ul>":
+                body.append("<ul>")
+            else:
+                body.pop()
+            body.append(f"<li>{html.escape(list_item)}</li>")
+            body.append("</ul>")
+        elif line.startswith('#'):
+            level = min(len(line) - len(line.lstrip('#')), 6)
+            body.append(f"<h{level}>{html.escape(line.lstrip('#').strip())}</h{level}>")
+        elif line:
+            body.append(f"<p>{html.escape(line)}</p>")
+        
+        j += 1
+    
+    document = (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+        "<title>Business Requirements Document</title>\n"
+        "<style>body{font-family:Calibri,Arial,sans-serif;max-width:60em;margin:auto}"
+        "table{border-collapse:collapse;margin:1em 0}th,td{border:1px solid #444;padding:4px 8px}</style>\n"
+        "</head>\n<body>\n<h1>Business Requirements Document</h1>\n"
+        + "\n".join(body)
+        + "\n</body>\n</html>\n"
+    )
+    return document.encode("utf-8")
+
+EXPORT_RENDERERS = {
+    "Word (DOCX)": render_docx_bytes,
+    "PDF": render_pdf_bytes,
+    "HTML": render_html_bytes
+}
+
+def render_export(export_format, content, profile_run=None):
+    with profile_stage(profile_run, "export_" + re.sub(r'\W+', '_', export_format.lower()).strip("_")):
+        return EXPORT_RENDERERS[export_format](content)
+
+def submit_pdf_export(executor, docx_job, profile_run=None):
+    # The PDF is converted from the DOCX export's bytes. The conversion is queued once those are
+    # ready, so no pool thread sits blocked on another export job
+    pdf_job = Future()
+    
+    def copy_result(conversion_job):
+        if conversion_job.exception() is not None:
+            pdf_job.set_exception(conversion_job.exception())
+        else:
+            pdf_job.set_result(conversion_job.result())
+    
+    def convert(finished_docx_job):
+        try:
+            conversion_job = executor.submit(render_export, "PDF", finished_docx_job.result(), profile_run)
+        except Exception as e:
+            pdf_job.set_exception(e)
+            return
+        conversion_job.add_done_callback(copy_result)
+    
+    docx_job.add_done_callback(convert)
+    return pdf_job
+
+def submit_export_jobs(content, export_formats, profile_run=None):
+    executor = get_export_executor()
+    export_jobs = {}
+    docx_job = None
+    if "Word (DOCX)" in export_formats or "PDF" in export_formats:
+        docx_job = executor.submit(render_export, "Word (DOCX)", content, profile_run)
+    for export_format in export_formats:
+        if export_format == "Word (DOCX)":
+            export_jobs[docx_job] = export_format
+        elif export_format == "PDF":
+            export_jobs[submit_pdf_export(executor, docx_job, profile_run)] = export_format
+        else:
+            export_jobs[executor.submit(render_export, export_format, content, profile_run)] = export_format
+    return export_jobs
+
+def render_export_downloads(export_jobs):
+    # Buttons are drawn in completion order, so a fast HTML render never waits on a slow PDF conversion
+    for future in as_completed(export_jobs):
+        export_format = export_jobs[future]
+        export_spec = EXPORT_FORMATS[export_format]
+        try:
+            st.download_button(
+                label=export_spec["label"],
+                data=future.result(),
+                file_name=export_spec["file_name"],
+                mime=export_spec["mime"]
+            )
+            st.success(f"{export_format} ready for download!")
+        except Exception as e:
+            st.error(f"Error creating {export_format} export: {str(e)}")
+            st.info("You can still copy the content above manually.")
+
+JOB_STATUS_ICONS = {
+    "queued": "⏳",
+    "running": "⚙️",
+    "done": "✅",
+    "failed": "❌",
+    "cancelled": "🚫"
+}
+
+def render_job_panel(user_id):
+    jobs = list_user_jobs(user_id)
+    if not jobs:
+        return
+    
+    st.subheader("My BRD Jobs")
+    
+    for job in jobs:
+        params = json.loads(job["params"])
+        sources = params["file_names"] + (["manual requirements"] if params["manual_requirements"].strip() else [])
+        
+        info_col, status_col, action_col = st.columns([4, 4, 2])
+        info_col.write(f"**{time.strftime('%Y-%m-%d %H:%M', time.localtime(job['created_at']))}** — {', '.join(sources)}")
+        status_col.write(f"{JOB_STATUS_ICONS.get(job['status'], '')} {job['status'].title()}: {job['error'] or job['progress'] or ''}")
+        
+        if job["status"] in ("queued", "running"):
+            if action_col.button("Cancel", key=f"cancel_{job['id']}"):
+                cancel_brd_job(job["id"], user_id)
+                st.rerun()
+        elif job["status"] == "done":
+            if action_col.button("Open", key=f"open_{job['id']}"):
+                st.session_state["brd_run"] = load_job_result(job["id"])
+                st.session_state.pop("export_jobs", None)
+                st.rerun()
+
+st.title("Business Requirements Document Generator")
+
+user_id = current_job_owner()
+
+with st.sidebar:
+    st.header("⚙️ API Configuration")
+    
+    api_provider = st.radio("Select API Provider:", ["OpenAI", "Groq", "AzureOpenAI"])
+    
+    azure_small_deployment = None
+    if api_provider == "OpenAI":
+        api_key = st.text_input("Enter your OpenAI API Key:", type="password")
+        azure_endpoint = None
+        azure_deployment = None
+        api_version = None
+    elif api_provider == "AzureOpenAI":
+        api_key = st.text_input("Enter your Azure OpenAI API Key:", type="password")
+        azure_endpoint = st.text_input("Enter your Azure OpenAI Endpoint:", 
+                                       placeholder="https://your-resource.openai.azure.com/")
+        azure_deployment = st.text_input("Enter your Azure Deployment Name:", 
+                                         placeholder="gpt-35-turbo")
+        azure_small_deployment = st.text_input("Small-tier Deployment Name (optional):",
+                                               placeholder="gpt-35-turbo-mini",
+                                               help="Used for section groups routed to the small tier. Leave empty to use the main deployment.")
+        api_version = st.text_input("Enter API Version (optional):", 
+                                    value="2025-01-01-preview",
                                     placeholder="2025-01-01-preview")
     else:  # Groq
         api_key = st.text_input("Enter your Groq API Key:", type="password")
@@ -2125,7 +4533,117 @@ with st.sidebar:
         azure_deployment = None
         api_version = None
     
+    with st.expander("Model Routing per Section Group"):
+        model_routing = {}
+        for template_key in SECTION_GROUP_KEYS:
+            model_routing[template_key] = st.selectbox(
+                SECTION_GROUP_LABELS[template_key],
+                ["auto", "large", "small"],
+                index=["auto", "large", "small"].index(SECTION_MODEL_POLICY[template_key]["tier"]),
+                key=f"model_tier_{template_key}",
+                help="auto sends extraction-style sections to the small model when the prompt fits its context window."
+            )
+    
+    st.subheader("Provider Routing")
+    
+    enable_routing = st.toggle(
+        "Fall back to a secondary provider",
+        value=False,
+        help="Each request goes to the primary provider and is retried on the secondary after an error or a latency threshold."
+    )
+    routing = None
+    if enable_routing:
+        secondary_provider = st.selectbox(
+            "Secondary provider:",
+            [provider for provider in ["OpenAI", "Groq", "AzureOpenAI"] if provider != api_provider]
+        )
+        secondary_api_key = st.text_input(f"Enter your {secondary_provider} API Key (secondary):", type="password")
+        secondary_azure_endpoint = None
+        secondary_azure_deployment = None
+        secondary_api_version = None
+        if secondary_provider == "AzureOpenAI":
+            secondary_azure_endpoint = st.text_input("Secondary Azure OpenAI Endpoint:",
+                                                     placeholder="https://your-resource.openai.azure.com/")
+            secondary_azure_deployment = st.text_input("Secondary Azure Deployment Name:",
+                                                       placeholder="gpt-35-turbo")
+            secondary_api_version = st.text_input("Secondary API Version:", value="2025-01-01-preview")
+        
+        fallback_after = st.number_input("Retry on secondary after (seconds):", min_value=5, value=60, step=5)
+        hedge = st.toggle(
+            "Hedge slow requests",
+            value=False,
+            help="Fire a duplicate request on the secondary once the primary passes its observed p95 latency."
+        )
+        duplicate_budget = st.slider("Duplicate request budget (% of requests):", 0, 50, 10) / 100
+        
+        if secondary_api_key:
+            routing = {
+                "api_provider": secondary_provider,
+                "api_key": secondary_api_key,
+                "azure_endpoint": secondary_azure_endpoint,
+                "azure_deployment": secondary_azure_deployment,
+                "api_version": secondary_api_version,
+                "fallback_after": fallback_after,
+                "hedge": hedge,
+                "duplicate_budget": duplicate_budget
+            }
+        else:
+            st.caption("Enter the secondary API key to enable routing.")
+    
+    latency_summary, routing_spend = get_provider_latency_summary()
+    if latency_summary:
+        with st.expander("Provider latency"):
+            st.dataframe(pd.DataFrame(latency_summary), hide_index=True)
+            st.caption(
+                f"Hedged duplicates: {routing_spend['duplicates']}, latency fallbacks: {routing_spend['fallbacks']} "
+                f"of {routing_spend['requests']} routed requests"
+            )
+    
+    st.divider()
+    
+    st.header("📤 Export Options")
+    
+    export_format_options = list(EXPORT_FORMATS.keys())
+    if not find_office_converter():
+        export_format_options.remove("PDF")
+        st.caption("PDF export is unavailable: LibreOffice (soffice) was not found on the server.")
+    
+    export_formats = st.multiselect(
+        "Export formats:",
+        export_format_options,
+        default=["Word (DOCX)"]
+    )
+    
     st.divider()
+    
+    st.header("🧵 Execution")
+    
+    run_in_background = st.toggle(
+        "Run generation as a background job",
+        value=False,
+        help=(
+            "Background jobs keep running if the connection drops. Without sign-in they are tied to this browser "
+            "session, so they are no longer listed after a page refresh. Jobs run as threads in the server "
+            "process, so extraction and exports of concurrent jobs share one CPU core (GIL)."
+        )
+    )
+    
+    profile_run_enabled = st.checkbox(
+        "Profile pipeline stages",
+        value=PROFILE_ENV_ENABLED,
+        help=f"Records cProfile stats and sampled stacks for extraction, generation and exports. Profiles are saved under {PROFILE_DIR}."
+    )
+
+provider_config = {
+    "api_provider": api_provider,
+    "api_key": api_key,
+    "azure_endpoint": azure_endpoint,
+    "azure_deployment": azure_deployment,
+    "api_version": api_version,
+    "routing": routing,
+    "model_routing": model_routing,
+    "azure_small_deployment": azure_small_deployment
+}
 
 # st.subheader("Document Logo")
 
@@ -2149,120 +4667,192 @@ manual_requirements = st.text_area(
     placeholder="Enter your business requirements, user stories, or project specifications here..."
 )
 
+reuse_previous_run = st.checkbox(
+    "Only regenerate section groups affected by changed requirements",
+    value=False,
+    help="Compares the extracted requirement blocks with the previous run of the same files and reuses unaffected section groups."
+)
+
+filter_low_signal = st.checkbox(
+    "Trim low-relevance passages from large PDF/DOCX files",
+    value=False,
+    help="Ranks passages against the BRD section vocabulary (TF-IDF, computed locally) and keeps the most relevant ones within a token budget per file. Dropped passages are listed in an appendix."
+)
+relevance_budget = None
+if filter_low_signal:
+    relevance_budget = st.number_input(
+        "Token budget per PDF/DOCX file:",
+        min_value=500,
+        value=DEFAULT_RELEVANCE_TOKEN_BUDGET,
+        step=500
+    )
+
 if st.button("Generate BRD", type="primary"):
     if not api_key:
         st.error("Please enter your API key!")
     elif not uploaded_files and not manual_requirements.strip():
         st.error("Please upload files or enter requirements manually!")
+    elif run_in_background:
+        try:
+            job_id = submit_brd_job(
+                user_id,
+                provider_config,
+                manual_requirements,
+                uploaded_files,
+                reuse_previous_run=reuse_previous_run,
+                relevance_budget=relevance_budget,
+                profile=profile_run_enabled
+            )
+            st.success(f"BRD job queued ({job_id[:8]}). You can refresh or leave this page; the job keeps running.")
+        except Exception as e:
+            st.error(f"Could not queue BRD job: {str(e)}")
     else:
         try:
             with st.spinner("Initializing AI chains"):
-                chains = initialize_sequential_chains(api_provider=api_provider,
-            api_key=api_key,
-            azure_endpoint=azure_endpoint,
-            azure_deployment=azure_deployment,
-            api_version=api_version)
-            
-            all_requirements = []
-            
-            if manual_requirements.strip():
-                all_requirements.append("=== MANUAL REQUIREMENTS ===")
-                all_requirements.append(manual_requirements.strip())
-                all_requirements.append("="*50)
-            
-            if uploaded_files:
-                st.info(f"Processing {len(uploaded_files)} uploaded files...")
-                
-                for uploaded_file in uploaded_files:
-                    file_extension = uploaded_file.name.split('.')[-1].lower()
-                    
-                    try:
-                        st.write(f"Processing: {uploaded_file.name}")
-                        
-                        if file_extension == 'txt':
-                            content = str(uploaded_file.read(), "utf-8")
-                        elif file_extension == 'docx':
-                            content = extract_content_from_docx(uploaded_file)
-                        elif file_extension == 'pdf':
-                            content = extract_content_from_pdf(uploaded_file)
-                        elif file_extension in ['xlsx', 'xls']:
-                            content = extract_content_from_excel(uploaded_file)
-                        elif file_extension == 'msg':
-                            content = extract_content_from_msg(uploaded_file)
-                        else:
-                            st.warning(f"⚠Unsupported file type: {file_extension}")
-                            continue
-                        
-                        if content.strip():
-                            all_requirements.append(f"=== FILE: {uploaded_file.name} ===")
-                            all_requirements.append(content.strip())
-                            all_requirements.append("="*50)
-                            st.success(f"Successfully processed: {uploaded_file.name}")
-                        else:
-                            st.warning(f"No content extracted from: {uploaded_file.name}")
-                            
-                    except Exception as e:
-                        st.error(f"Error processing {uploaded_file.name}: {str(e)}")
-                        continue
+                chains = initialize_sequential_chains(**provider_config)
             
-            if not all_requirements:
-                st.error("No valid content found in uploaded files!")
-                st.stop()
+            pipeline_result = run_brd_pipeline(
+                chains,
+                manual_requirements,
+                uploaded_files,
+                reuse_previous_run=reuse_previous_run,
+                fallback_checkpoint=st.session_state.get("brd_checkpoint"),
+                relevance_budget=relevance_budget,
+                profile=profile_run_enabled,
+                checkpoint_scope=brd_checkpoint_scope(user_id, provider_config)
+            )
             
-            combined_requirements = "\n\n".join(all_requirements)
-            
-            content_size = estimate_content_size(combined_requirements)
-            st.info(f"Total content size: {content_size:,} characters")
-            
-            st.subheader("AI Processing Progress")
-            
-            with st.spinner("Generating comprehensive BRD using sequential processing..."):
-                brd_content = generate_brd_sequentially(chains, combined_requirements)
-            
-            if brd_content:
+            if pipeline_result:
+                st.session_state["brd_checkpoint"] = pipeline_result["checkpoint"]
+                st.session_state["brd_run"] = {
+                    "brd_content": pipeline_result["brd_content"],
+                    "requirements": pipeline_result["requirements"],
+                    "run_summary": pipeline_result["run_summary"],
+                    "dropped_content": pipeline_result["dropped_content"],
+                    "profile": pipeline_result["profile"],
+                    "memory": pipeline_result["memory"]
+                }
+                st.session_state["export_jobs"] = submit_export_jobs(pipeline_result["brd_content"], export_formats, pipeline_result["profile"])
                 st.success("BRD generated successfully!")
-                
-                st.subheader("Generated BRD Content")
-                
-                with st.expander("Preview Generated BRD", expanded=False):
-                    st.markdown(brd_content)
-                
-                st.subheader("Download Options")
-                
-                try:
-                    with st.spinner("Creating Word document..."):
-                        doc = create_word_document(brd_content)
-                        
-                        doc_buffer = BytesIO()
-                        doc.save(doc_buffer)
-                        doc_buffer.seek(0)
-                        
-                        st.download_button(
-                            label="Download BRD (Word Document)",
-                            data=doc_buffer.getvalue(),
-                            file_name="Business_Requirements_Document.docx",
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                        )
-                        
-                        st.success("Word document ready for download!")
-                        
-                except Exception as e:
-                    st.error(f"Error creating Word document: {str(e)}")
-                    st.info("You can still copy the content above manually.")
-                
-                try:
-                    st.download_button(
-                        label="Download BRD (Markdown)",
-                        data=brd_content,
-                        file_name="Business_Requirements_Document.md",
-                        mime="text/markdown"
-                    )
-                except Exception as e:
-                    st.error(f"Error creating markdown download: {str(e)}")
-                
             else:
                 st.error("Failed to generate BRD content!")
                 
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
             st.info("Try reducing the input size or check your API key.")
+
+has_active_jobs = any(job["status"] in ("queued", "running") for job in list_user_jobs(user_id))
+if has_active_jobs:
+    get_job_workers()
+if hasattr(st, "fragment"):
+    st.fragment(run_every=5 if has_active_jobs else None)(render_job_panel)(user_id)
+else:
+    render_job_panel(user_id)
+
+brd_run = st.session_state.get("brd_run")
+if brd_run:
+    brd_content = brd_run["brd_content"]
+    
+    st.subheader("Generated BRD Content")
+    
+    with st.expander("Preview Generated BRD", expanded=False):
+        st.markdown(brd_content)
+    
+    if brd_run.get("run_summary") or brd_run.get("memory"):
+        with st.expander("Run Summary", expanded=False):
+            if brd_run.get("run_summary"):
+                run_summary_df = pd.DataFrame(brd_run["run_summary"])
+                st.dataframe(run_summary_df, hide_index=True)
+                st.caption(
+                    f"Total latency: {run_summary_df['Latency (s)'].sum():.1f}s — "
+                    f"Prompt tokens: {run_summary_df['Prompt tokens'].sum():,} "
+                    f"({run_summary_df.get('Cached prompt tokens', pd.Series(dtype=int)).sum() / max(run_summary_df['Prompt tokens'].sum(), 1):.0%} cached) — "
+                    f"Completion tokens: {run_summary_df['Completion tokens'].sum():,}"
+                )
+            
+            memory_run = brd_run.get("memory")
+            if memory_run:
+                st.dataframe(pd.DataFrame(memory_run["stages"]), hide_index=True)
+                st.caption(
+                    f"Peak process RSS: {memory_run['peak_mb']:,.1f} MB. This is the resident memory of the whole server "
+                    f"process, shared with every other session and job running at the time, not this run's own allocation "
+                    f"(degradation ceilings {MEMORY_SOFT_LIMIT_MB:,} / {MEMORY_HARD_LIMIT_MB:,} MB)"
+                )
+                if memory_run["degradations"]:
+                    st.dataframe(pd.DataFrame(memory_run["degradations"]), hide_index=True)
+                if memory_run["top_allocations"]:
+                    st.dataframe(pd.DataFrame(memory_run["top_allocations"]), hide_index=True)
+    
+    if brd_run.get("dropped_content"):
+        dropped_appendix = render_dropped_content_appendix(brd_run["dropped_content"])
+        with st.expander("Dropped Content Appendix", expanded=False):
+            st.markdown(dropped_appendix)
+        st.download_button(
+            label="Download Dropped Content Appendix",
+            data=dropped_appendix,
+            file_name="Dropped_Content_Appendix.md",
+            mime="text/markdown"
+        )
+    
+    st.subheader("Regenerate a Section")
+    
+    regenerable_sections = list_regenerable_sections(brd_content)
+    regenerate_target = st.selectbox(
+        "Section or section group to regenerate:",
+        [key for key, _ in regenerable_sections],
+        format_func=dict(regenerable_sections).get
+    )
+    
+    if st.button("Regenerate Section"):
+        if not api_key:
+            st.error("Please enter your API key!")
+        else:
+            try:
+                chains = initialize_sequential_chains(**provider_config)
+                
+                with st.spinner(f"Regenerating {dict(regenerable_sections)[regenerate_target]}..."):
+                    brd_content = regenerate_brd_section(chains, brd_run["requirements"], brd_content, regenerate_target)
+                
+                brd_run["brd_content"] = brd_content
+                st.session_state["export_jobs"] = submit_export_jobs(brd_content, export_formats)
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error regenerating section: {str(e)}")
+    
+    st.subheader("Download Options")
+    
+    try:
+        st.download_button(
+            label="Download BRD (Markdown)",
+            data=brd_content,
+            file_name="Business_Requirements_Document.md",
+            mime="text/markdown"
+        )
+    except Exception as e:
+        st.error(f"Error creating markdown download: {str(e)}")
+    
+    export_jobs = st.session_state.get("export_jobs")
+    if export_jobs is None or set(export_jobs.values()) != set(export_formats):
+        # A freshly loaded job result gets its first exports profiled along with the run
+        export_jobs = submit_export_jobs(brd_content, export_formats, brd_run.get("profile") if export_jobs is None else None)
+        st.session_state["export_jobs"] = export_jobs
+    
+    with st.spinner("Rendering exports..."):
+        render_export_downloads(export_jobs)
+    
+    # Drawn after the exports so their stages are included
+    if brd_run.get("profile"):
+        profile_run = brd_run["profile"]
+        with st.expander("Profile", expanded=False):
+            st.dataframe(pd.DataFrame(profile_run["stages"]), hide_index=True)
+            sampler_only_stages = [stage["Stage"] for stage in profile_run["stages"] if stage.get("Profiler") == "sampler only"]
+            if sampler_only_stages:
+                st.info(
+                    f"No pstats for {', '.join(sampler_only_stages)}: another run or export held cProfile at the time, "
+                    "so these stages only have sampled stacks and estimated self time."
+                )
+            st.dataframe(pd.DataFrame(profile_run["top_functions"]), hide_index=True)
+            st.caption(
+                f"Top {PROFILE_TOP_FUNCTIONS} functions per stage by self time (cProfile on the calling thread, or estimated from stack samples when another stage held the profiler). "
+                f"pstats and collapsed-stack files (this run's threads only) are in {profile_run['directory']}"
+            )
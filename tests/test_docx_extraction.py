@@ -0,0 +1,84 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from streamlit_app import extract_content_from_docx, extract_content_from_docx_document
+
+def add_hyperlink(paragraph, text):
+    paragraph._p.append(parse_xml(
+        f'<w:hyperlink {nsdecls("w")}><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:hyperlink>'
+    ))
+
+def build_fixture_docx():
+    doc = Document()
+    doc.add_heading("1.0 Change Request", level=1)
+    paragraph = doc.add_paragraph("Purpose:")
+    paragraph.add_run().add_tab()
+    paragraph.add_run("validate nominee age")
+    paragraph.add_run().add_break()
+    paragraph.add_run("on the proposal form, see ")
+    add_hyperlink(paragraph, "the rule book")
+    paragraph.add_run().add_break(WD_BREAK.PAGE)
+    doc.add_paragraph("   ")
+
+    table = doc.add_table(rows=4, cols=3)
+    for col_idx, header in enumerate(["ID", "Requirement", "Owner"]):
+        table.cell(0, col_idx).text = header
+    table.cell(1, 0).text = "R1"
+    requirement_cell = table.cell(1, 1)
+    requirement_cell.text = "Validate nominee age"
+    requirement_cell.add_paragraph("Show an error below 18")
+    table.cell(1, 2).text = "Ops"
+    # Horizontal span across Requirement and Owner, vertical span down the ID column
+    table.cell(2, 0).merge(table.cell(3, 0)).text = "R2"
+    table.cell(2, 1).merge(table.cell(2, 2)).text = "Send policy data to CRM nightly"
+    table.cell(3, 1).text = "Retry failed batches"
+    table.cell(3, 2).text = ""
+
+    doc.add_paragraph("Between the tables.")
+    second_table = doc.add_table(rows=2, cols=2)
+    second_table.cell(0, 0).text = "Application"
+    second_table.cell(0, 1).text = "Impact"
+    second_table.cell(1, 0).text = "OPUS"
+    second_table.cell(1, 1).text = "Issuance | checks"
+    doc.add_paragraph("End of document.")
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+class DocxExtractionTest(unittest.TestCase):
+    def test_streaming_and_python_docx_paths_agree(self):
+        data = build_fixture_docx()
+
+        streamed = extract_content_from_docx(io.BytesIO(data))
+        fallback = extract_content_from_docx_document(io.BytesIO(data))
+
+        self.assertEqual(streamed, fallback)
+        self.assertEqual(streamed.split("\n"), [
+            "1.0 Change Request",
+            "Purpose:\tvalidate nominee age",
+            "on the proposal form, see the rule book",
+            "TABLE:",
+            "ID | Requirement | Owner",
+            "R1 | Validate nominee age",
+            "Show an error below 18 | Ops",
+            "R2 | Send policy data to CRM nightly | Send policy data to CRM nightly",
+            "R2 | Retry failed batches | ",
+            "Between the tables.",
+            "TABLE:",
+            "Application | Impact",
+            "OPUS | Issuance | checks",
+            "End of document."
+        ])
+
+if __name__ == "__main__":
+    unittest.main()
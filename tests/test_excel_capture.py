@@ -0,0 +1,138 @@
+import datetime
+import json
+import os
+import random
+import sys
+import unittest
+from io import BytesIO
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import extract_content_from_excel
+
+# Extraction JSON for every case, recorded before PART B/C/E capture moved to the per-sheet cell
+# index; regenerate with `python tests/test_excel_capture.py --update` only for intended changes
+EXPECTED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "excel_capture_expected.json")
+RANDOM_CASES = 20
+RANDOM_CELL_VALUES = [
+    "PART C : (Mandatory) Detailed Requirement", "Part B:", "PART E (Mandatory/Optional)", "part c and part e",
+    "Products Impacted", "Applications Impacted", "ULIP", "OPUS", "INSTAB", "Other", "   ", "nan", "Unnamed",
+    "Yes", "No", " spaced text ", "Term"
+]
+
+
+def save_workbook(workbook):
+    buffer = BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def build_marker_workbook(extra_rows=0, hidden_sheet=False):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Requirement"
+    sheet.append(["Sr", "Detailed Requirement", "Response", "Notes"])
+    sheet.append([1, "PART B : (Mandatory) Detailed Requirement", None, None])
+    sheet.append([2, "Agents must complete training before login", "Yes", None])
+    sheet.append([3, "Block agents otherwise with a message", None, None])
+    sheet.append([4, "PART C : (Mandatory) Detailed Requirement", None, None])
+    sheet.append([5, "Products Impacted", None, None])
+    sheet.append(["Type of Product", "ULIP", "TERM", "All"])
+    sheet.append(["List of products in which the change has to be done", "-", "-", "Yes"])
+    sheet.append([8, "Applications Impacted", None, None])
+    sheet.append(["Application Name", "OPUS", "INSTAB", "Other"])
+    sheet.append(["Pls select correct response", "-", "Yes", "DigiAgency"])
+    sheet.append([11, "PART E : (Mandatory/Optional)", None, None])
+    sheet.append([None, "Whether the any change has to be done in communication", "No", None])
+    sheet.append([None, "IF YES, please specify the communication list", None, None])
+    sheet.append([None, "Mode of communication", "Email", None])
+    for row in range(extra_rows):
+        sheet.append([row, f"Requirement row number {row} describing behaviour", f"v{row}", row * 1.5])
+    workbook.create_sheet("Test Scenarios").append(["Test ID", "Scenario"])
+    workbook["Test Scenarios"].append(["TC1", "Login blocked"])
+    workbook.create_sheet("Ops Risk Assessment").append(["Risk", "Impact"])
+    workbook["Ops Risk Assessment"].append(["Ops", "High"])
+    if hidden_sheet:
+        hidden = workbook.create_sheet("Hidden")
+        hidden.append(["PART B hidden marker"])
+        hidden.sheet_state = "hidden"
+    return save_workbook(workbook)
+
+
+def build_random_workbook(rng):
+    # Markers, blanks, numbers and dates scattered over a few sheets, so windows hit empty cells,
+    # sheet edges and neighbouring markers
+    workbook = Workbook()
+    for sheet_idx in range(rng.randint(1, 3)):
+        sheet = workbook.active if sheet_idx == 0 else workbook.create_sheet(f"S{sheet_idx}")
+        column_count = rng.randint(1, 7)
+        sheet.append([rng.choice(["Sr", "Name", None, "Unnamed", "Status"]) for _ in range(column_count)])
+        for row in range(rng.randint(0, 25)):
+            values = []
+            for column in range(column_count):
+                roll = rng.random()
+                if roll < 0.4:
+                    values.append(None)
+                elif roll < 0.75:
+                    values.append(rng.choice(RANDOM_CELL_VALUES))
+                elif roll < 0.85:
+                    values.append(rng.randint(0, 100))
+                elif roll < 0.9:
+                    values.append(round(rng.random(), 6))
+                elif roll < 0.95:
+                    values.append(datetime.datetime(2024, 1, rng.randint(1, 28)))
+                else:
+                    values.append(f"text {row} {column}")
+            sheet.append(values)
+        if sheet_idx and rng.random() < 0.3:
+            sheet.sheet_state = "hidden"
+    return save_workbook(workbook)
+
+
+def build_cases():
+    cases = {
+        "markers": build_marker_workbook(),
+        "markers_hidden_sheet": build_marker_workbook(hidden_sheet=True),
+        "markers_streamed": build_marker_workbook(extra_rows=6000)
+    }
+    rng = random.Random(7)
+    for case_idx in range(RANDOM_CASES):
+        cases[f"random_{case_idx:02d}"] = build_random_workbook(rng)
+    return cases
+
+
+def extract_cases():
+    results = {}
+    for name, workbook in build_cases().items():
+        for visible_only in (True, False):
+            workbook.seek(0)
+            extracted = json.loads(extract_content_from_excel(workbook, visible_only=visible_only))
+            results[f"{name}/visible_only={visible_only}"] = {
+                "priority_content": extracted["priority_content"],
+                "summary": extracted["summary"]
+            }
+    return results
+
+
+class ExcelCaptureTest(unittest.TestCase):
+    def test_capture_matches_recorded_output(self):
+        with open(EXPECTED_PATH, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        actual = extract_cases()
+
+        self.assertEqual(sorted(actual), sorted(expected))
+        for case_name, case_expected in expected.items():
+            with self.subTest(case=case_name):
+                self.assertEqual(actual[case_name], case_expected)
+
+
+if __name__ == "__main__":
+    if "--update" in sys.argv:
+        with open(EXPECTED_PATH, "w", encoding="utf-8") as f:
+            json.dump(extract_cases(), f, indent=1, sort_keys=True, ensure_ascii=False, default=str)
+            f.write("\n")
+    else:
+        unittest.main()
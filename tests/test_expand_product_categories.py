@@ -0,0 +1,71 @@
+import os
+import random
+import sys
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from bench_expand_product_categories import legacy_extract_impact_status
+from streamlit_app import (
+    expand_product_categories,
+    extract_product_impact_status,
+    get_section_text,
+    load_product_alignment,
+    parse_markdown_sections
+)
+
+STATUS_CELLS = ['Yes', 'No', '-', 'NA', 'y', 'Impacted', 'n/a', '', 'All', 'True', 'maybe']
+
+def random_chain1_output(rng, category_cells):
+    lines = ['## 1.0 Introduction', '### 1.1 Purpose', 'text']
+    if rng.random() < 0.8:
+        lines.append(rng.choice(['### 2.1 Impacted Products', '## 2.1 IMPACTED PRODUCTS', '### 2.1 impacted products list']))
+    lines += ['| Product Category | Status |', '|---|---|']
+    for _ in range(rng.randint(0, 30)):
+        lines.append(f"| {rng.choice(category_cells)} | {rng.choice(STATUS_CELLS)} | {rng.choice(STATUS_CELLS)} |")
+    if rng.random() < 0.5:
+        lines += ['- bullet', '| stray | yes |']
+    lines.append(rng.choice(['### 2.2 Applications Impacted', '## 2.2 x', '#### 2.2', '']))
+    lines += ['| OPUS | Yes |', '### 2.3 List', 'end']
+    return '\n'.join(lines)
+
+class ExpandProductCategoriesTest(unittest.TestCase):
+    # Whole outputs are not compared: the section model fixed the old sanitizer gluing the 2.2
+    # heading onto the last table row, so only the precompiled category/status matching is
+    # checked against the original loop
+    def test_impact_status_matches_original_scan(self):
+        product_alignment = load_product_alignment()
+        category_cells = list(product_alignment) + ['ULIP', 'Term', 'endowment', 'All', 'ulip pension', 'Group Term', 'Health', 'nonpar', 'PAR', 'random', 'combination']
+        rng = random.Random(1)
+        for _ in range(3000):
+            text = random_chain1_output(rng, category_cells)
+            self.assertEqual(
+                extract_product_impact_status(text.split('\n'), product_alignment),
+                legacy_extract_impact_status(text, product_alignment),
+                text
+            )
+
+    def test_impacted_products_section_keeps_only_first_table(self):
+        text = '\n'.join([
+            '### 2.1 Impacted Products',
+            '| Product Category | Status |',
+            '|---|---|',
+            '| ULIP | Yes |',
+            '- Note the LLM added after the table',
+            '| stray | yes |',
+            '### 2.2 Applications Impacted',
+            '| OPUS | Yes |'
+        ])
+
+        expanded = parse_markdown_sections(expand_product_categories(text, load_product_alignment()))
+        self.assertEqual(get_section_text(expanded, "2.1").strip().split('\n'), [
+            '| Product Category | Status |',
+            '|---|---|',
+            '| ULIP | Yes |'
+        ])
+        self.assertIn('| OPUS | Yes |', get_section_text(expanded, "2.2"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit_app
+from streamlit_app import (
+    SECTION_GROUP_KEYS,
+    brd_checkpoint_scope,
+    find_changed_section_groups,
+    fingerprint_requirement_blocks,
+    load_brd_checkpoint,
+    plan_incremental_run,
+    save_brd_checkpoint
+)
+
+PREVIOUS_GROUPS = {group_key: f"## {group_key}\n\nPrevious {group_key} content." for group_key in SECTION_GROUP_KEYS}
+
+def excel_content(part_e_value="Send policy data to CRM nightly"):
+    return json.dumps({
+        "priority_content": {
+            "part_b": [{"sheet_name": "BRD", "column": "B", "row": 4, "content": "Add nominee validation"}],
+            "part_c": [{"sheet_name": "BRD", "column": "B", "row": 9, "content": "Impacts the issuance team"}],
+            "part_e": [{"sheet_name": "BRD", "column": "B", "row": 15, "content": part_e_value}]
+        },
+        "sheets": [{
+            "sheet_name": "Requirements",
+            "columns": {"names": ["ID", "Requirement"]},
+            "detailed_requirements": [{
+                "column_name": "Requirement",
+                "requirements": [{"row": 2, "text": "Validate nominee age"}]
+            }],
+            "sample_data": []
+        }]
+    })
+
+class IncrementalRunTest(unittest.TestCase):
+    def setUp(self):
+        self.previous = fingerprint_requirement_blocks("Change Request v1.xlsx", excel_content())
+        self.checkpoint = {"fingerprints": self.previous, "groups": PREVIOUS_GROUPS}
+
+    def test_unchanged_input_reuses_every_group(self):
+        current = fingerprint_requirement_blocks("Change Request v2.xlsx", excel_content())
+
+        self.assertEqual(find_changed_section_groups(self.previous, current), [])
+        self.assertEqual(plan_incremental_run(self.checkpoint, current), PREVIOUS_GROUPS)
+
+    def test_changed_part_e_row_reruns_data_communication_and_later_groups(self):
+        current = fingerprint_requirement_blocks("Change Request v2.xlsx", excel_content("Send policy data to CRM hourly"))
+
+        changed_groups = find_changed_section_groups(self.previous, current)
+        self.assertEqual(changed_groups, SECTION_GROUP_KEYS[SECTION_GROUP_KEYS.index("data_communication"):])
+        self.assertEqual(
+            sorted(plan_incremental_run(self.checkpoint, current)),
+            sorted(SECTION_GROUP_KEYS[:SECTION_GROUP_KEYS.index("data_communication")])
+        )
+
+    def test_checkpoint_is_scoped_to_owner_and_provider(self):
+        provider_config = {"api_provider": "OpenAI", "api_key": "secret", "routing": None}
+        scope = brd_checkpoint_scope("session:a", provider_config)
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            original_dir = streamlit_app.BRD_CHECKPOINT_DIR
+            streamlit_app.BRD_CHECKPOINT_DIR = checkpoint_dir
+            try:
+                save_brd_checkpoint(["spec.xlsx"], self.previous, "\n\n".join(PREVIOUS_GROUPS.values()), scope)
+
+                self.assertIsNotNone(load_brd_checkpoint(["spec v2.xlsx"], scope))
+                self.assertIsNone(load_brd_checkpoint(["spec.xlsx"], brd_checkpoint_scope("session:b", provider_config)))
+                self.assertIsNone(load_brd_checkpoint(["spec.xlsx"], brd_checkpoint_scope("session:a", dict(provider_config, api_provider="Groq"))))
+            finally:
+                streamlit_app.BRD_CHECKPOINT_DIR = original_dir
+        self.assertNotIn("secret", json.dumps(scope))
+
+if __name__ == "__main__":
+    unittest.main()
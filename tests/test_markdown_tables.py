@@ -0,0 +1,127 @@
+import os
+import random
+import sys
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from streamlit_app import collect_markdown_table, parse_markdown_table, parse_markdown_table_lines
+
+CORPUS_PATH = os.path.join(ROOT_DIR, "benchmarks", "fixtures", "llm_tables.md")
+
+def load_corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [block for block in f.read().split("\n\n") if block.strip()]
+
+def mutate_table(table_text, rng):
+    lines = table_text.split("\n")
+    mutations = [
+        lambda ls: [ln.rstrip("|") for ln in ls],
+        lambda ls: [ln.lstrip("|") for ln in ls],
+        lambda ls: [ln + " | stray" for ln in ls],
+        lambda ls: [ln.replace(" | ", " \\| ", 1) for ln in ls],
+        lambda ls: [ln for ln in ls if rng.random() > 0.2],
+        lambda ls: [ln.replace("|", "||", 1) for ln in ls],
+        lambda ls: ls[:1] + [":---|---:|:---:"] + ls[1:],
+        lambda ls: [ln + "\t " for ln in ls],
+        lambda ls: [ln.replace("a", "ä") for ln in ls],
+        lambda ls: [" | ".join(["nan"] * rng.randint(1, 6))] + ls,
+    ]
+    for _ in range(rng.randint(1, 3)):
+        lines = rng.choice(mutations)(lines)
+    return "\n".join(lines)
+
+class ParseMarkdownTableTest(unittest.TestCase):
+    def test_cells_alignments_and_header(self):
+        table = parse_markdown_table_lines([
+            "| Data Category | Fields | Frequency | Purpose |",
+            "|:--------------|:------:|----------:|---------|",
+            "| Agent data | agent_id, name | Daily | Track completion |"
+        ])
+
+        self.assertEqual(table["header"], ["Data Category", "Fields", "Frequency", "Purpose"])
+        self.assertEqual(table["alignments"], ["left", "center", "right", None])
+        self.assertEqual(table["rows"], [["Agent data", "agent_id, name", "Daily", "Track completion"]])
+
+    def test_escaped_pipes_stay_inside_cells(self):
+        rows = parse_markdown_table(
+            "| Field | Rule |\n"
+            "|---|---|\n"
+            "| status | A \\| B \\| C |\n"
+            "| flag | ends with \\| |"
+        )
+
+        self.assertEqual(rows, [["Field", "Rule"], ["status", "A | B | C"], ["flag", "ends with |"]])
+
+    def test_alignment_row_is_not_data(self):
+        rows = parse_markdown_table("Name | Value\n:---: | :---:\nterm | 10")
+
+        self.assertEqual(rows, [["Name", "Value"], ["term", "10"]])
+
+    def test_ragged_rows_are_padded_or_truncated_to_header_width(self):
+        rows = parse_markdown_table(
+            "| ID | Description | Result |\n"
+            "|---|---|---|\n"
+            "| 4.1.1 | Agent must complete training |\n"
+            "| 4.1.2 | Block login | Message shown | LMS | extra |\n"
+            "| 4.1.3 | | |"
+        )
+
+        self.assertEqual(rows, [
+            ["ID", "Description", "Result"],
+            ["4.1.1", "Agent must complete training", ""],
+            ["4.1.2", "Block login", "Message shown"],
+            ["4.1.3", "", ""]
+        ])
+
+    def test_nan_and_unnamed_cells_are_cleaned(self):
+        rows = parse_markdown_table("| Unnamed: 0 | Owner |\n|---|---|\n| nan | Ops |")
+
+        self.assertEqual(rows, [["Insert Column Name", "Owner"], ["", "Ops"]])
+
+    def test_header_without_data_rows_is_not_a_table(self):
+        self.assertIsNone(parse_markdown_table("| A | B |\n|---|---|"))
+
+    def test_fuzzed_tables_stay_rectangular(self):
+        corpus = load_corpus()
+        rng = random.Random(11)
+        for table_text in corpus + [mutate_table(rng.choice(corpus), rng) for _ in range(2000)]:
+            table = parse_markdown_table_lines(table_text.split("\n"))
+            if table is None:
+                continue
+            self.assertTrue(table["header"], table_text)
+            self.assertEqual(table["width"], len(table["header"]), table_text)
+            for row in table["rows"]:
+                self.assertEqual(len(row), table["width"], table_text)
+            self.assertEqual(parse_markdown_table(table_text), [table["header"]] + table["rows"])
+
+class CollectMarkdownTableTest(unittest.TestCase):
+    def test_table_ends_at_blank_or_plain_line(self):
+        lines = [
+            "Applications in scope:",
+            "| Application | Description |",
+            "|---|---|",
+            "| OPUS | Policy issuance |",
+            "CRM | Lead tracking",
+            "",
+            "| Other | Table |",
+            "|---|---|",
+            "| x | y |"
+        ]
+
+        table, end = collect_markdown_table(lines, 1)
+        self.assertEqual(end, 5)
+        self.assertEqual(table["rows"], [["OPUS", "Policy issuance"], ["CRM", "Lead tracking"]])
+
+        table, end = collect_markdown_table(lines, 6)
+        self.assertEqual(end, len(lines))
+        self.assertEqual(table["header"], ["Other", "Table"])
+
+        lines[4] = "Plain paragraph after the table."
+        table, end = collect_markdown_table(lines, 1)
+        self.assertEqual(end, 4)
+        self.assertEqual(table["rows"], [["OPUS", "Policy issuance"]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import SECTION_GROUP_KEYS, build_reference_data, build_section_prompt
+
+def render_prompt(group_key, reference_data, requirements):
+    return build_section_prompt(group_key).format(
+        reference_data=reference_data,
+        requirements=requirements,
+        previous_content="## 1.0 Introduction\n\nEarlier group output."
+    )
+
+class PromptPrefixTest(unittest.TestCase):
+    def setUp(self):
+        self.reference_data = build_reference_data()
+        self.requirements = "=== FILE: spec.docx ===\n\n" + "\n".join(f"REQ-{idx}: validate field {idx}" for idx in range(400))
+
+    def test_groups_of_one_run_share_the_prefix_through_the_requirements(self):
+        prompts = [render_prompt(group_key, self.reference_data, self.requirements) for group_key in SECTION_GROUP_KEYS]
+        shared_prefix = os.path.commonprefix(prompts)
+
+        self.assertIn(self.reference_data, shared_prefix)
+        self.assertIn(self.requirements, shared_prefix)
+        # Everything but the group instructions and earlier output can be served from the cache
+        for prompt in prompts[1:]:
+            self.assertGreater(len(shared_prefix) / len(prompt), 0.5)
+
+    def test_runs_with_other_requirements_share_only_the_static_prefix(self):
+        group_key = SECTION_GROUP_KEYS[1]
+        first_run = render_prompt(group_key, self.reference_data, self.requirements)
+        second_run = render_prompt(group_key, self.reference_data, self.requirements.replace("spec.docx", "spec_v2.docx"))
+        shared_prefix = os.path.commonprefix([first_run, second_run])
+
+        self.assertIn(self.reference_data, shared_prefix)
+        self.assertNotIn(self.requirements, shared_prefix)
+
+if __name__ == "__main__":
+    unittest.main()
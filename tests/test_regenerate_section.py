@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import get_section_text, parse_markdown_sections, regenerate_brd_section
+
+BRD = """## 3.0 Process Flow
+
+Old process intro.
+
+## 4.0 Functional Requirements
+
+Old functional intro.
+
+### 4.1 Validation
+
+Old validation text.
+
+### 4.2 Notifications
+
+Old notification text.
+
+## 5.0 Data Requirements
+
+Data text stays.
+"""
+
+REGENERATED_GROUP = """## 3.0 Process Flow
+
+Regenerated process intro.
+
+## 4.0 Functional Requirements
+
+New functional intro.
+
+### 4.1 Validation
+
+New validation text.
+
+### 4.2 Notifications
+
+New notification text.
+"""
+
+
+class FakeChain:
+    def __init__(self, output):
+        self.output = output
+        self.inputs = None
+
+    def invoke(self, inputs):
+        self.inputs = inputs
+        return self.output
+
+
+class RegenerateSectionTest(unittest.TestCase):
+    def test_top_level_section_owns_its_subsections(self):
+        brd_sections = parse_markdown_sections(BRD)
+        section_text = get_section_text(brd_sections, "4.0")
+        self.assertIn("### 4.1 Validation", section_text)
+        self.assertIn("### 4.2 Notifications", section_text)
+        self.assertNotIn("5.0", section_text)
+
+    def test_regenerating_top_level_section_replaces_subsections(self):
+        chains = [FakeChain("") for _ in range(4)]
+        chains[1] = FakeChain(REGENERATED_GROUP)
+
+        result = regenerate_brd_section(chains, "REQ-1: validate premium payment", BRD, "4.0")
+
+        self.assertIn("New functional intro.", result)
+        self.assertIn("New validation text.", result)
+        self.assertIn("New notification text.", result)
+        self.assertNotIn("Old", result.split("## 5.0")[0].split("## 4.0")[1])
+        self.assertEqual(result.count("### 4.1 Validation"), 1)
+        # Sections outside the target are left as they were
+        self.assertIn("Old process intro.", result)
+        self.assertIn("Data text stays.", result)
+
+    def test_regenerating_subsection_keeps_siblings(self):
+        chains = [FakeChain("") for _ in range(4)]
+        chains[1] = FakeChain(REGENERATED_GROUP)
+
+        result = regenerate_brd_section(chains, "REQ-1: validate premium payment", BRD, "4.1")
+
+        self.assertIn("New validation text.", result)
+        self.assertIn("Old functional intro.", result)
+        self.assertIn("Old notification text.", result)
+
+
+if __name__ == "__main__":
+    unittest.main()